@@ -12,6 +12,7 @@ from logger import colorlogger
 from torch.nn.parallel.data_parallel import DataParallel
 from config import cfg
 from model import get_model
+from utils.checkpoint import load_network
 from data.pov_surgery.pov_surgery import POVSURGERY
 # dynamic dataset import
 exec('from ' + cfg.trainset + ' import ' + cfg.trainset)
@@ -36,6 +37,12 @@ class Base(object):
     def _make_batch_generator(self):
         return
 
+    def _wrap_model(self, model):
+        # DataParallel over the visible GPUs, or the bare model on the CPU
+        if cfg.device == 'cpu':
+            return model.to('cpu')
+        return DataParallel(model).cuda()
+
     @abc.abstractmethod
     def _make_model(self):
         return
@@ -92,7 +99,8 @@ class Trainer(Base):
         # data load and construct batch generator
         self.logger.info("Creating dataset...")
         # train_dataset = eval(cfg.trainset)(transforms.ToTensor(), "train")
-        train_dataset = POVSURGERY(transforms.ToTensor(), "train")
+        train_dataset = POVSURGERY(transforms.ToTensor(), "train", shard_dir=cfg.pov_shard_dir, batch_aug=cfg.batch_aug)
+        self.batch_augmentation = train_dataset.batch_augmentation
         self.itr_per_epoch = math.ceil(len(train_dataset) / cfg.num_gpus / cfg.train_batch_size)
         self.batch_generator = DataLoader(dataset=train_dataset, batch_size=cfg.num_gpus*cfg.train_batch_size, shuffle=True, num_workers=cfg.num_thread, pin_memory=True)
 
@@ -101,7 +109,7 @@ class Trainer(Base):
         self.logger.info("Creating graph and optimizer...")
         model = get_model('train')
 
-        model = DataParallel(model).cuda()
+        model = self._wrap_model(model)
         optimizer = self.get_optimizer(model)
         print('load FROM DEMO!')
         ckpt = torch.load(cfg.pretrained_chpt)
@@ -120,7 +128,7 @@ class Trainer(Base):
         self.logger.info("Creating graph and optimizer...")
         model = get_model('train')
 
-        model = DataParallel(model).cuda()
+        model = self._wrap_model(model)
         optimizer = self.get_optimizer(model)
         print('load FROM checkponit!')
         if True:
@@ -181,24 +189,26 @@ class MY_VAL(Base):
         # data load and construct batch generator
         self.logger.info("Creating dataset...")
         # train_dataset = eval(cfg.trainset)(transforms.ToTensor(), "train")
-        train_dataset = POVSURGERY(transforms.ToTensor(), "validation")
+        train_dataset = POVSURGERY(transforms.ToTensor(), "validation", shard_dir=cfg.pov_shard_dir, batch_aug=cfg.batch_aug)
+        self.batch_augmentation = train_dataset.batch_augmentation
         # train_dataset = POVSURGERY(transforms.ToTensor(), "demo")
         self.itr_per_epoch = math.ceil(len(train_dataset) / cfg.num_gpus / cfg.train_batch_size)
-        self.batch_generator = DataLoader(dataset=train_dataset, batch_size=1,
-                                          shuffle=False, num_workers=cfg.num_thread, pin_memory=True)
+        # the metrics are batched, see utils.metrics
+        self.batch_generator = DataLoader(dataset=train_dataset, batch_size=cfg.num_gpus*cfg.test_batch_size,
+                                          shuffle=False, num_workers=cfg.num_thread, pin_memory=cfg.device != 'cpu')
 
     def _make_model(self, check_path):
         # prepare network
         self.logger.info("Creating graph and optimizer...")
         model = get_model('train')
 
-        model = DataParallel(model).cuda()
+        model = self._wrap_model(model)
         optimizer = self.get_optimizer(model)
         print('load FROM TEST!')# model_path = './snapshot_demo.pth.tar'
 
         # ckpt = torch.load('../demo/snapshot_demo.pth.tar')
-        ckpt = torch.load(check_path)
-        model.load_state_dict(ckpt['network'], strict=False)
+        ckpt = torch.load(check_path, map_location='cpu')
+        load_network(model, ckpt['network'])
         if cfg.continue_train:
             start_epoch, model, optimizer = self.load_model(model, optimizer)
         else:
@@ -219,7 +229,7 @@ class Tester(Base):
         # data load and construct batch generator
         self.logger.info("Creating dataset...")
         self.test_dataset = eval(cfg.testset)(transforms.ToTensor(), "test")
-        self.batch_generator = DataLoader(dataset=self.test_dataset, batch_size=cfg.num_gpus*cfg.test_batch_size, shuffle=False, num_workers=cfg.num_thread, pin_memory=True)
+        self.batch_generator = DataLoader(dataset=self.test_dataset, batch_size=cfg.num_gpus*cfg.test_batch_size, shuffle=False, num_workers=cfg.num_thread, pin_memory=cfg.device != 'cpu')
        
     def _make_model(self):
         model_path = os.path.join(cfg.model_dir, 'snapshot_%d.pth.tar' % self.test_epoch)
@@ -229,9 +239,9 @@ class Tester(Base):
         # prepare network
         self.logger.info("Creating graph...")
         model = get_model('test')
-        model = DataParallel(model).cuda()
-        ckpt = torch.load(model_path)
-        model.load_state_dict(ckpt['network'], strict=False)
+        model = self._wrap_model(model)
+        ckpt = torch.load(model_path, map_location='cpu')
+        load_network(model, ckpt['network'])
         model.eval()
 
         self.model = model
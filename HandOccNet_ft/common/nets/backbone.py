@@ -4,6 +4,7 @@ import torch.utils.model_zoo as model_zoo
 
 from torchvision import ops
 import torch
+from torch.quantization import QuantStub, DeQuantStub, fuse_modules
 
 from nets.cbam import SpatialGate
 
@@ -37,11 +38,27 @@ class FPN(nn.Module):
 
         self.pool = nn.AvgPool2d(2, stride=2)
 
-    def _upsample_add(self, x, y):
+        # int8 static quantisation (main/quantize.py) covers everything up to the attention module,
+        # the stubs and the functional adds are identities in fp32, one add per level so each gets its own scale
+        self.quant = QuantStub()
+        self.dequant = DeQuantStub()
+        self.skip_add4 = nn.quantized.FloatFunctional()
+        self.skip_add3 = nn.quantized.FloatFunctional()
+        self.skip_add2 = nn.quantized.FloatFunctional()
+
+    def fuse_model(self):
+        # conv + bn, the LeakyReLUs cannot be fused and are quantised on their own
+        fuse_modules(self.layer0, [['0', '1']], inplace=True)
+        for layer in [self.layer1, self.layer2, self.layer3, self.layer4]:
+            for block in layer[0]:
+                block.fuse_model()
+
+    def _upsample_add(self, x, y, skip_add):
         _, _, H, W = y.size()
-        return F.interpolate(x, size=(H,W), mode='bilinear', align_corners=False) + y
+        return skip_add.add(F.interpolate(x, size=(H,W), mode='bilinear', align_corners=False), y)
 
     def forward(self, x):
+        x = self.quant(x)
         # Bottom-up
         c1 = self.layer0(x)
         c2 = self.layer1(c1)
@@ -50,9 +67,9 @@ class FPN(nn.Module):
         c5 = self.layer4(c4)
         # Top-down
         p5 = self.toplayer(c5)
-        p4 = self._upsample_add(p5, self.latlayer1(c4))
-        p3 = self._upsample_add(p4, self.latlayer2(c3))
-        p2 = self._upsample_add(p3, self.latlayer3(c2))
+        p4 = self._upsample_add(p5, self.latlayer1(c4), self.skip_add4)
+        p3 = self._upsample_add(p4, self.latlayer2(c3), self.skip_add3)
+        p2 = self._upsample_add(p3, self.latlayer3(c2), self.skip_add2)
         # Smooth
         #p4 = self.smooth1(p4)
         p3 = self.smooth2(p3)
@@ -60,6 +77,7 @@ class FPN(nn.Module):
         
         # Attention
         p2 = self.pool(p2)
+        p2 = self.dequant(p2)
         primary_feats, secondary_feats = self.attention_module(p2)
         
         return primary_feats, secondary_feats
@@ -178,10 +196,19 @@ class Bottleneck(nn.Module):
             planes, planes * self.expansion, kernel_size=1, bias=False
         )
         self.bn3 = nn.BatchNorm2d(planes * self.expansion)
+        # one activation module per call site, each gets its own output scale when quantised
         self.leakyrelu = nn.LeakyReLU(inplace=True)
+        self.leakyrelu2 = nn.LeakyReLU(inplace=True)
+        self.leakyrelu_out = nn.LeakyReLU(inplace=True)
+        self.skip_add = nn.quantized.FloatFunctional()
         self.downsample = downsample
         self.stride = stride
 
+    def fuse_model(self):
+        fuse_modules(self, [['conv1', 'bn1'], ['conv2', 'bn2'], ['conv3', 'bn3']], inplace=True)
+        if self.downsample is not None:
+            fuse_modules(self.downsample, [['0', '1']], inplace=True)
+
     def forward(self, x):
         residual = x
 
@@ -191,7 +218,7 @@ class Bottleneck(nn.Module):
 
         out = self.conv2(out)
         out = self.bn2(out)
-        out = self.leakyrelu(out)
+        out = self.leakyrelu2(out)
 
         out = self.conv3(out)
         out = self.bn3(out)
@@ -199,7 +226,7 @@ class Bottleneck(nn.Module):
         if self.downsample is not None:
             residual = self.downsample(x)
 
-        out += residual
-        out = self.leakyrelu(out)
+        out = self.skip_add.add(out, residual)
+        out = self.leakyrelu_out(out)
 
         return out
\ No newline at end of file
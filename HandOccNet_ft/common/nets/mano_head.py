@@ -171,6 +171,25 @@ def mat2aa(rotation_matrix):
     return aa
 
 
+def canonical_gt_mano(mano_layer, mano_param, all_addition_g, all_addition_t_no_transl, coord_change_mat):
+    """
+    GT MANO verts and joints of a batch in the camera frame of POV-Surgery, before the rotation
+    augmentation, in meters and relative to the wrist. The pose in mano_param uses the flat hand mean
+    of the annotations and is shifted to the mean of mano_layer, so the predictions and GT share one layer.
+    """
+    pose_size = 16 * 3
+    gt_mano_pose = mano_param[:, :pose_size].float()
+    gt_mano_pose = torch.cat([gt_mano_pose[:, :3], gt_mano_pose[:, 3:] - mano_layer.th_hands_mean], 1)
+    gt_verts, gt_joints = mano_layer(th_pose_coeffs=gt_mano_pose, th_betas=mano_param[:, pose_size:].float())
+
+    all_addition_g, all_addition_t_no_transl = all_addition_g.float(), all_addition_t_no_transl.float()
+    gt_verts = (gt_verts / 1000) @ all_addition_g + all_addition_t_no_transl
+    gt_joints = (gt_joints / 1000) @ all_addition_g + all_addition_t_no_transl
+    gt_verts = gt_verts @ coord_change_mat.T
+    gt_joints = gt_joints @ coord_change_mat.T
+    gt_root = gt_joints[:, [0], :]
+    return gt_verts - gt_root, gt_joints - gt_root
+
 class mano_regHead(nn.Module):
     def __init__(self, mano_layer=mano.layer, feature_size=1024, mano_neurons=[1024, 512]):
         super(mano_regHead, self).__init__()
@@ -192,13 +211,20 @@ class mano_regHead(nn.Module):
         # Shape layers
         self.shape_reg = nn.Linear(mano_base_neurons[-1], 10)
 
-        self.mano_layer = mano.get_layer()
-        self.mano_layer_gt = mano.get_layer_gt()
+        # one MANO layer for the predictions and the GT
+        self.mano_layer = mano_layer
+
+        # constants follow the device of the module
+        rot_unique = trimesh.transformations.rotation_matrix(
+            np.radians(-90), [0, 1, 0])
+        self.register_buffer('rot_only', torch.from_numpy(rot_unique[:3, :3]).float(), persistent=False)
+        coord_change_mat = np.array([[1., 0., 0.], [0, -1., 0.], [0., 0., -1.]], dtype=np.float32)
+        self.register_buffer('coord_change_mat', torch.from_numpy(coord_change_mat), persistent=False)
 
     def forward(self, features, GT_mano_params=None):
         # for key, val in enumerate(GT_mano_params):
         #     GT_mano_params[key] = GT_mano_params[key].float()
-        gt_mano_params = GT_mano_params['mano_param']
+        gt_mano_params = GT_mano_params['mano_param'] if GT_mano_params is not None else None
         mano_features = self.mano_base_layer(features)
         pred_mano_pose_6d = self.pose_reg(mano_features)
         
@@ -211,12 +237,8 @@ class mano_regHead(nn.Module):
 
         pred_verts /= 1000
         pred_joints /= 1000
+        pred_new_pelv = pred_joints[:,[0],:]
 
-# vis
-        rot_unique = trimesh.transformations.rotation_matrix(
-            np.radians(-90), [0, 1, 0])
-        rot_only = rot_unique[:3,:3]
-        rot_only = torch.from_numpy(rot_only).float().cuda()
         if gt_mano_params is not None:
 
             gt_mano_shape = gt_mano_params[:, self.mano_pose_size:].float()
@@ -224,33 +246,23 @@ class mano_regHead(nn.Module):
 
             gt_mano_pose = gt_mano_params[:, :self.mano_pose_size].contiguous().float()
             gt_mano_pose_rotmat = batch_rodrigues(gt_mano_pose.view(-1, 3)).view(-1, 16, 3, 3)
-            gt_verts, gt_joints = self.mano_layer_gt(th_pose_coeffs=gt_mano_pose, th_betas=gt_mano_shape)
-
-            gt_verts /= 1000
-            gt_joints /= 1000
-
-            coord_change_mat = np.array([[1., 0., 0.], [0, -1., 0.], [0., 0., -1.]], dtype=np.float32)
-            # gt_joints = gt_joints @ rot_only.T
-
-
-            gts_new =  gt_joints @ GT_mano_params['all_addition_g'] + GT_mano_params['all_addition_t_no_transl']
-            coord_change_mat = torch.from_numpy(coord_change_mat).float().cuda()
-
-            gts_new = gts_new @ coord_change_mat.T  #rot_only
-            # gts_new = torch.bmm(gts_new, rot_aug.T)
-            gts_new = torch.einsum('bij,bjk->bik', gts_new, torch.transpose(GT_mano_params['rot_aug'], 1, 2))
-
-            # gts_new = gts_new[:, jointsMapManoToSimple,:]
-            gts_new_perl = gts_new[:,[0],:]
-
-            gt_verts = gt_verts  @ GT_mano_params['all_addition_g'] + GT_mano_params['all_addition_t_no_transl']
-            gt_verts = gt_verts @ coord_change_mat.T #@ rot_only
-            gt_verts   =  torch.einsum('bij,bjk->bik', gt_verts, torch.transpose(GT_mano_params['rot_aug'], 1, 2))
-            pred_new_pelv = pred_joints[:,[0],:]
-            vert_gt_o = gt_verts - gts_new_perl
+            if 'mano_verts' in GT_mano_params:
+                # precomputed once per sample by main/pack_pov_surgery.py
+                gt_verts = GT_mano_params['mano_verts'].float()
+                gt_joints = GT_mano_params['mano_joints'].float()
+            else:
+                gt_verts, gt_joints = canonical_gt_mano(self.mano_layer, gt_mano_params,
+                                                        GT_mano_params['all_addition_g'],
+                                                        GT_mano_params['all_addition_t_no_transl'],
+                                                        self.coord_change_mat)
+
+            # only the rotation augmentation depends on the step
+            rot_aug_t = torch.transpose(GT_mano_params['rot_aug'], 1, 2)
+            gt_verts = torch.einsum('bij,bjk->bik', gt_verts, rot_aug_t)
+            gt_joints = torch.einsum('bij,bjk->bik', gt_joints, rot_aug_t)
             gt_mano_results = {
-                "verts3d": gt_verts - gts_new_perl,
-                "joints3d": gts_new - gts_new_perl,
+                "verts3d": gt_verts,
+                "joints3d": gt_joints,
                 "mano_shape": gt_mano_shape,
                 "mano_pose": gt_mano_pose_rotmat}
 
@@ -1,7 +1,6 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from einops import repeat
 
 class Transformer(nn.Module):
     def __init__(self, inp_res=32, dim=256, depth=2, num_heads=4, mlp_ratio=4., injection=True):
@@ -116,8 +115,9 @@ class Block(nn.Module):
 
     def forward(self, query, key, query_embed=None, key_embed=None):
         b, c, h, w = query.shape
-        query_embed = repeat(self.q_embedding, '() n c d -> b n c d', b = b)
-        key_embed = repeat(self.k_embedding, '() n c d -> b n c d', b = b)
+        # expand keeps the batch size symbolic when the graph is traced
+        query_embed = self.q_embedding.expand(b, -1, -1, -1)
+        key_embed = self.k_embedding.expand(b, -1, -1, -1)
 
         q_embed = self.with_pos_embed(query, query_embed)
         k_embed = self.with_pos_embed(key, key_embed)
@@ -0,0 +1,9 @@
+from torch.nn.parallel.data_parallel import DataParallel
+
+
+def load_network(model, state_dict):
+    """Loads a snapshot's 'network' state dict into model, wrapped in DataParallel or not."""
+    # checkpoints are saved from DataParallel, whose parameter names start with 'module.'
+    if not isinstance(model, DataParallel):
+        state_dict = {k[len('module.'):] if k.startswith('module.') else k: v for k, v in state_dict.items()}
+    model.load_state_dict(state_dict, strict=False)
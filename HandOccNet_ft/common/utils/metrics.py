@@ -0,0 +1,59 @@
+import numpy as np
+import torch
+from utils.transforms import batch_rigid_align
+
+METRIC_NAMES = {'joints3d': 'MPJPE', 'joints3d_pa': 'PA-MPJPE', 'verts3d': 'MPVPE', 'verts3d_pa': 'PA-MPVPE',
+                'joints2d': 'J2D'}
+# np.trapz is deprecated since numpy 2.0 in favour of np.trapezoid
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+def pose_errors(pred_mano_results, gt_mano_results, pred_joints2d=None, gt_joints2d=None, scale_img=None):
+    """
+    Per-point errors of a batch: 3D joints and verts in mm, before and after Procrustes alignment,
+    and, when given, 2D joints in pixels of the original image (the crop coordinates times scale_img).
+    """
+    errors = {}
+    for key in ['joints3d', 'verts3d']:
+        pred, gt = pred_mano_results[key], gt_mano_results[key]
+        errors[key] = 1000 * torch.sqrt(((pred - gt) ** 2).sum(dim=-1))
+        errors[key + '_pa'] = 1000 * torch.sqrt(((batch_rigid_align(pred, gt) - gt) ** 2).sum(dim=-1))
+    if pred_joints2d is not None:
+        scale_img = scale_img.to(pred_joints2d.dtype).view(-1, 1, 1)
+        errors['joints2d'] = torch.sqrt((((pred_joints2d - gt_joints2d) * scale_img) ** 2).sum(dim=-1))
+    return errors
+
+class EvalAccumulator(object):
+    """
+    Streaming evaluation over batches of pose_errors: the mean per-sample error of every metric and
+    the PCK curves of the aligned 3D errors, whose AUC is taken over auc_range mm as in the HO3D
+    evaluation. Sums stay on the device of the errors, so updates do not synchronise with the GPU.
+    """
+    def __init__(self, auc_range=(0., 50.), auc_steps=100):
+        self.thresholds = torch.linspace(auc_range[0], auc_range[1], auc_steps)
+        self.num_samples = 0
+        self.sums = {}
+        self.pck_counts = {}
+        self.num_points = {}
+
+    def update(self, errors):
+        for key, err in errors.items():
+            err = err.detach()
+            self.sums[key] = self.sums.get(key, 0) + err.mean(dim=-1).sum()
+            if key.endswith('_pa'):
+                thresholds = self.thresholds.to(err.device)
+                # bins[i] counts errors in (thresholds[i - 1], thresholds[i]]
+                bins = torch.bucketize(err.flatten(), thresholds)
+                counts = torch.bincount(bins, minlength=len(thresholds) + 1)[:len(thresholds)]
+                self.pck_counts[key] = self.pck_counts.get(key, 0) + counts.cumsum(0)
+                self.num_points[key] = self.num_points.get(key, 0) + err.numel()
+        self.num_samples += next(iter(errors.values())).shape[0]
+
+    def summary(self):
+        result = {}
+        for key, total in self.sums.items():
+            result[METRIC_NAMES.get(key, key)] = float(total) / self.num_samples
+        thresholds = self.thresholds.numpy()
+        for key, counts in self.pck_counts.items():
+            pck = counts.cpu().numpy() / self.num_points[key]
+            result['AUC ' + METRIC_NAMES.get(key, key)] = _trapezoid(pck, thresholds) / (thresholds[-1] - thresholds[0])
+        return result
@@ -0,0 +1,99 @@
+import os
+import os.path as osp
+import queue
+import random
+import threading
+import cv2
+import numpy as np
+import scipy.io as sio
+import matplotlib.pyplot as plt
+import open3d as o3d
+
+KPS_LINES = [[0, 1], [1, 2], [2, 3], [3, 4],
+             [0, 5], [5, 6], [6, 7], [7, 8],
+             [0, 9], [9, 10], [10, 11], [11, 12],
+             [0, 13], [13, 14], [14, 15], [15, 16],
+             [0, 17], [17, 18], [18, 19], [19, 20]]
+
+def save_skeleton_overlay(image, kp, fname):
+    """Draws the 21 2D joints kp (pixels, Simple order) over the RGB image and writes it to fname."""
+    img = np.ascontiguousarray(image[:, :, ::-1]).astype(np.int16)
+    kps = np.ones((3, 21))
+    kps[0] = np.clip(kp[:, 0], 0, 512 - 1)
+    kps[1] = np.clip(kp[:, 1], 0, 512 - 1)
+    kp_thresh = 0.4
+    alpha = 1
+
+    # Convert from plt 0-1 RGBA colors to 0-255 BGR colors for opencv.
+    cmap = plt.get_cmap('rainbow')
+    colors = [cmap(i) for i in np.linspace(0, 1, len(KPS_LINES) + 2)]
+    colors = [(c[2] * 255, c[1] * 255, c[0] * 255) for c in colors]
+
+    # Perform the drawing on a copy of the image, to allow for blending.
+    kp_mask = np.copy(img)
+    for l, (i1, i2) in enumerate(KPS_LINES):
+        p1 = kps[0, i1].astype(np.int32), kps[1, i1].astype(np.int32)
+        p2 = kps[0, i2].astype(np.int32), kps[1, i2].astype(np.int32)
+        if kps[2, i1] > kp_thresh and kps[2, i2] > kp_thresh:
+            cv2.line(kp_mask, p1, p2, color=colors[l], thickness=4, lineType=cv2.LINE_AA)
+        if kps[2, i1] > kp_thresh:
+            cv2.circle(kp_mask, p1, radius=6, color=colors[l], thickness=-1, lineType=cv2.LINE_AA)
+        if kps[2, i2] > kp_thresh:
+            cv2.circle(kp_mask, p2, radius=6, color=colors[l], thickness=-1, lineType=cv2.LINE_AA)
+
+    # Blend the keypoints.
+    o_img = cv2.addWeighted(img, 1.0 - alpha, kp_mask, alpha, 0)
+    cv2.imwrite(fname, o_img)
+
+def save_mesh(verts, faces, fname):
+    mesh = o3d.geometry.TriangleMesh()
+    mesh.vertices = o3d.utility.Vector3dVector(verts)
+    mesh.triangles = o3d.utility.Vector3iVector(faces)
+    o3d.io.write_triangle_mesh(fname, mesh)
+
+class SnapshotWriter(object):
+    """
+    Debug snapshots of the training and validation loops, written by a background thread.
+    The loop asks wants() whether to take one, runs Model.forward with snapshot=True and passes the
+    returned detached tensors to submit(); the copy to the host, the skeleton overlays and the PLY
+    meshes all happen on the writer thread. Snapshots are dropped when max_pending are waiting.
+    """
+    def __init__(self, out_dir, face_file, train_prob=0.01, val_every=10, max_pending=8):
+        self.out_dir = out_dir
+        self.train_prob = train_prob
+        self.val_every = val_every
+        self.faces = sio.loadmat(face_file)['rh_face']
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def wants(self, mode, step):
+        if mode == 'train':
+            return self.train_prob > 0 and random.random() < self.train_prob
+        return self.val_every > 0 and step % self.val_every == 0
+
+    def submit(self, snapshot, subdir, name):
+        try:
+            self.pending.put_nowait((snapshot, subdir, name))
+        except queue.Full:
+            pass
+
+    def close(self):
+        self.pending.put((None, None, None))
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            snapshot, subdir, name = self.pending.get()
+            if snapshot is None:
+                return
+            self._write({k: v[0].cpu().numpy() for k, v in snapshot.items()}, subdir, name)
+
+    def _write(self, snapshot, subdir, name):
+        save_dir = osp.join(self.out_dir, subdir)
+        os.makedirs(save_dir, exist_ok=True)
+        img = snapshot['img'].transpose(1, 2, 0) * 255
+        save_skeleton_overlay(img, snapshot['joints2d_gt'] * 256, osp.join(save_dir, name + '_gt.png'))
+        save_skeleton_overlay(img, snapshot['joints2d_pred'] * 256, osp.join(save_dir, name + '_pred.png'))
+        save_mesh(snapshot['verts3d_gt'], self.faces, osp.join(save_dir, name + '_gt.ply'))
+        save_mesh(snapshot['verts3d_pred'], self.faces, osp.join(save_dir, name + '_pred.ply'))
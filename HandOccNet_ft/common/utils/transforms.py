@@ -45,6 +45,32 @@ def rigid_align(A, B):
     A2 = np.transpose(np.dot(c*R, np.transpose(A))) + t
     return A2
 
+def batch_rigid_align(A, B):
+    """
+    Batched torch version of rigid_align: aligns each A[i] (N x 3) to B[i] with the similarity transform
+    (scale, rotation with det 1, translation) minimising the squared error. Solved in float64 on the
+    device of the inputs, with the reflection fix applied per sample.
+    """
+    dtype = A.dtype
+    A, B = A.double(), B.double()
+    mu_A = A.mean(dim=1, keepdim=True)
+    mu_B = B.mean(dim=1, keepdim=True)
+    X_A = A - mu_A
+    X_B = B - mu_B
+    var_A = (X_A ** 2).sum(dim=(1, 2))
+
+    K = X_A.transpose(1, 2) @ X_B
+    U, _, Vh = torch.linalg.svd(K)
+    V = Vh.transpose(1, 2)
+    Z = torch.eye(3, dtype=A.dtype, device=A.device).repeat(A.shape[0], 1, 1)
+    Z[:, -1, -1] = torch.sign(torch.det(U @ Vh))
+    R = V @ Z @ U.transpose(1, 2)
+
+    scale = (R @ K).diagonal(dim1=1, dim2=2).sum(-1) / var_A
+    scale = scale[:, None, None]
+    A2 = scale * A @ R.transpose(1, 2) + (mu_B - scale * mu_A @ R.transpose(1, 2))
+    return A2.to(dtype)
+
 def transform_joint_to_other_db(src_joint, src_name, dst_name):
     src_joint_num = len(src_name)
     dst_joint_num = len(dst_name)
@@ -6,6 +6,7 @@ from torch.nn import Module
 
 from mano.webuser.smpl_handpca_wrapper_HAND_only import ready_arguments
 from manopth import rodrigues_layer, rotproj, rot6d
+from manopth.model_cache import load_cached_model
 from manopth.tensutils import (th_posemap_axisang, th_with_zeros, th_pack,
                                subtract_flat_id, make_list)
 
@@ -62,26 +63,36 @@ class ManoLayer(Module):
         elif side == 'left':
             self.mano_path = os.path.join(mano_root, 'MANO_LEFT.pkl')
 
-        smpl_data = ready_arguments(self.mano_path)
+        smpl_data = load_cached_model(self.mano_path)
+        if smpl_data is not None:
+            # Plain arrays, no chumpy or scipy objects to rebuild
+            smpl_data.setdefault(
+                'betas', np.zeros(smpl_data['shapedirs'].shape[-1]))
+            th_J_regressor = torch.Tensor(smpl_data['J_regressor'])
+        else:
+            smpl_data = ready_arguments(self.mano_path)
+            for key in ['betas', 'shapedirs', 'posedirs', 'v_template',
+                        'weights']:
+                smpl_data[key] = smpl_data[key].r
+            th_J_regressor = torch.Tensor(
+                np.array(smpl_data['J_regressor'].toarray()))
 
         hands_components = smpl_data['hands_components']
 
         self.smpl_data = smpl_data
 
         self.register_buffer('th_betas',
-                             torch.Tensor(smpl_data['betas'].r).unsqueeze(0))
+                             torch.Tensor(smpl_data['betas']).unsqueeze(0))
         self.register_buffer('th_shapedirs',
-                             torch.Tensor(smpl_data['shapedirs'].r))
+                             torch.Tensor(smpl_data['shapedirs']))
         self.register_buffer('th_posedirs',
-                             torch.Tensor(smpl_data['posedirs'].r))
+                             torch.Tensor(smpl_data['posedirs']))
         self.register_buffer(
             'th_v_template',
-            torch.Tensor(smpl_data['v_template'].r).unsqueeze(0))
-        self.register_buffer(
-            'th_J_regressor',
-            torch.Tensor(np.array(smpl_data['J_regressor'].toarray())))
+            torch.Tensor(smpl_data['v_template']).unsqueeze(0))
+        self.register_buffer('th_J_regressor', th_J_regressor)
         self.register_buffer('th_weights',
-                             torch.Tensor(smpl_data['weights'].r))
+                             torch.Tensor(smpl_data['weights']))
         self.register_buffer('th_faces',
                              torch.Tensor(smpl_data['f'].astype(np.int32)).long())
 
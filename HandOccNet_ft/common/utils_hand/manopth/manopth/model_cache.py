@@ -0,0 +1,23 @@
+import os
+
+import numpy as np
+
+
+def model_cache_path(model_path):
+    ''' Path of the pre-parsed cache of a model file, keyed on its full name,
+        e.g. MANO_RIGHT.pkl -> MANO_RIGHT.pkl.cache.npz
+        (written by pose_fusion/tools/cache_models.py)
+    '''
+    return model_path + '.cache.npz'
+
+
+def load_cached_model(model_path):
+    ''' Plain arrays of the model from its cache, or None when there is no
+        cache newer than the model file
+    '''
+    cache_path = model_cache_path(model_path)
+    if os.path.exists(cache_path) and \
+            os.path.getmtime(cache_path) >= os.path.getmtime(model_path):
+        with np.load(cache_path) as cache_data:
+            return dict(cache_data)
+    return None
@@ -0,0 +1,248 @@
+import torch
+import torch.nn.functional as F
+
+# Batched counterpart of the image part of POVSURGERY.data_aug / data_aug_val.
+#
+# The dataset only computes the per-sample affine transform (and everything
+# derived from it, i.e. the 2D targets) and returns the decoded uint8 image.
+# After collation the whole batch is warped with one grid_sample and, for
+# training, blurred and colour jittered on the device the model runs on.
+# The random parameters follow the same distributions as the PIL/OpenCV path:
+#   - gaussian blur with radius U(0, blur_radius)
+#   - motion blur along one of 4 directions with a kernel of 3, 5 or 7 pixels
+#   - brightness, saturation, hue and contrast jitter in a random order
+# Unlike the PIL path the intermediate images are not rounded to uint8.
+
+MOTION_BLUR_SIZES = (3, 5, 7)
+
+
+def motion_blur_kernels(device=None, dtype=torch.float32):
+    """(4 directions, 3 sizes, 7, 7) kernels of POVSURGERY.motion_blur, centred in a 7x7 window."""
+    k_max = max(MOTION_BLUR_SIZES)
+    kernels = torch.zeros(4, len(MOTION_BLUR_SIZES), k_max, k_max, device=device, dtype=dtype)
+    for i, size in enumerate(MOTION_BLUR_SIZES):
+        o = (k_max - size) // 2
+        line = torch.full((size,), 1. / size, device=device, dtype=dtype)
+        kernels[0, i, o + size // 2, o:o + size] = line
+        kernels[1, i, o:o + size, o + size // 2] = line
+        kernels[2, i, o:o + size, o:o + size] = torch.diag(line)
+        kernels[3, i, o:o + size, o:o + size] = torch.diag(line).flip(0)
+    return kernels
+
+
+def warp_grid(affinetrans, pts, in_size):
+    """
+    Maps output pixel coordinates to the normalised input coordinates of F.grid_sample (align_corners=False),
+    with the same convention as dataset_util.transform_img.
+
+    affinetrans: (B, 3, 3) input to output pixel transforms
+    pts: (B, H, W, 2) or (H, W, 2) output pixel coordinates, pixel centres at +0.5
+    in_size: (W, H) of the input images
+    """
+    inv = torch.inverse(affinetrans.double())[:, :2].to(pts.dtype)
+    if pts.dim() == 3:
+        pts = pts.unsqueeze(0).expand(inv.shape[0], -1, -1, -1)
+    src = torch.einsum('bij,bhwj->bhwi', inv[:, :, :2], pts) + inv[:, None, None, :, 2]
+    scale = torch.tensor([2. / in_size[0], 2. / in_size[1]], device=pts.device, dtype=pts.dtype)
+    return src * scale - 1
+
+
+def pixel_centres(h, w, device=None, dtype=torch.float32):
+    ys = torch.arange(h, device=device, dtype=dtype) + 0.5
+    xs = torch.arange(w, device=device, dtype=dtype) + 0.5
+    return torch.stack([xs.view(1, w).expand(h, w), ys.view(h, 1).expand(h, w)], -1)
+
+
+def grouped_conv(img, weight, padding, mode):
+    """Convolves every image of the batch with its own (B, kh, kw) kernel."""
+    B, C, H, W = img.shape
+    kh, kw = weight.shape[1:]
+    img = F.pad(img.reshape(1, B * C, H, W), padding, mode=mode)
+    weight = weight.repeat_interleave(C, 0).unsqueeze(1)
+    return F.conv2d(img, weight, groups=B * C).view(B, C, H, W)
+
+
+def gaussian_blur(img, sigma, max_sigma):
+    half = max(1, int(3 * max_sigma + 0.999))
+    x = torch.arange(-half, half + 1, device=img.device, dtype=img.dtype)
+    kernel = torch.exp(-x ** 2 / (2 * sigma.clamp(min=1e-3).unsqueeze(1) ** 2))
+    kernel = kernel / kernel.sum(1, keepdim=True)
+    # PIL extends the border pixels
+    img = grouped_conv(img, kernel.unsqueeze(1), (half, half, 0, 0), 'replicate')
+    return grouped_conv(img, kernel.unsqueeze(2), (0, 0, half, half), 'replicate')
+
+
+def rgb_to_grayscale(img):
+    r, g, b = img.unbind(1)
+    return (0.299 * r + 0.587 * g + 0.114 * b).unsqueeze(1)
+
+
+def blend(img1, img2, ratio):
+    ratio = ratio.view(-1, 1, 1, 1)
+    return (ratio * img1 + (1 - ratio) * img2).clamp(0, 1)
+
+
+def rgb_to_hsv(img):
+    r, g, b = img.unbind(1)
+    maxc = img.max(1)[0]
+    minc = img.min(1)[0]
+    eqc = maxc == minc
+    cr = maxc - minc
+    ones = torch.ones_like(maxc)
+    s = cr / torch.where(eqc, ones, maxc)
+    cr_divisor = torch.where(eqc, ones, cr)
+    rc = (maxc - r) / cr_divisor
+    gc = (maxc - g) / cr_divisor
+    bc = (maxc - b) / cr_divisor
+    hr = (maxc == r).to(img.dtype) * (bc - gc)
+    hg = ((maxc == g) & (maxc != r)).to(img.dtype) * (2.0 + rc - bc)
+    hb = ((maxc != g) & (maxc != r)).to(img.dtype) * (4.0 + gc - rc)
+    h = torch.fmod((hr + hg + hb) / 6.0 + 1.0, 1.0)
+    return torch.stack((h, s, maxc), 1)
+
+
+def hsv_to_rgb(img):
+    h, s, v = img.unbind(1)
+    i = torch.floor(h * 6.0)
+    f = h * 6.0 - i
+    i = i.long() % 6
+    p = (v * (1.0 - s)).clamp(0, 1)
+    q = (v * (1.0 - s * f)).clamp(0, 1)
+    t = (v * (1.0 - s * (1.0 - f))).clamp(0, 1)
+    candidates = torch.stack((torch.stack((v, q, p, p, t, v), 1),
+                              torch.stack((t, v, v, q, p, p), 1),
+                              torch.stack((p, p, t, v, v, q), 1)), 1)
+    index = i.unsqueeze(1).unsqueeze(1).expand(-1, 3, 1, -1, -1)
+    return candidates.gather(2, index).squeeze(2)
+
+
+def adjust_brightness(img, factor):
+    return blend(img, torch.zeros_like(img), factor)
+
+
+def adjust_saturation(img, factor):
+    return blend(img, rgb_to_grayscale(img), factor)
+
+
+def adjust_hue(img, factor):
+    hsv = rgb_to_hsv(img)
+    h = torch.fmod(hsv[:, 0] + factor.view(-1, 1, 1) + 1.0, 1.0)
+    return hsv_to_rgb(torch.stack((h, hsv[:, 1], hsv[:, 2]), 1))
+
+
+def adjust_contrast(img, factor):
+    mean = rgb_to_grayscale(img).mean(dim=(1, 2, 3), keepdim=True)
+    return blend(img, mean, factor)
+
+
+class BatchAugmentation(object):
+    def __init__(self, inp_res, train, blur_radius=0.5, brightness=0.5, contrast=0.5, saturation=0.5, hue=0.15):
+        self.inp_res = inp_res
+        self.train = train
+        self.blur_radius = blur_radius
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+        self.kernels = None
+
+    def warp(self, img, affinetrans, mode='nearest'):
+        """img: (B, C, H, W) float, affinetrans: (B, 3, 3). Returns (B, C, inp_res, inp_res)."""
+        pts = pixel_centres(self.inp_res, self.inp_res, device=img.device, dtype=img.dtype)
+        grid = warp_grid(affinetrans.to(img.device), pts, (img.shape[3], img.shape[2]))
+        return F.grid_sample(img, grid, mode=mode, padding_mode='zeros', align_corners=False)
+
+    def obj_mask(self, gray, affinetrans, bbox_obj, size=32):
+        """
+        Object mask of data_aug: the warped mask cropped to bbox_obj and resized with nearest neighbours,
+        done as one nearest grid_sample from the full resolution mask.
+
+        gray: (B, 1, H, W) thresholded mask, bbox_obj: (B, 4) in warped pixels. Returns (B, size, size) long.
+        """
+        dtype = torch.float32
+        bbox = torch.round(bbox_obj.to(gray.device, dtype))
+        cells = (torch.arange(size, device=gray.device, dtype=dtype) + 0.5) / size
+        xs = torch.floor(bbox[:, 0:1] + cells * (bbox[:, 2:3] - bbox[:, 0:1])) + 0.5
+        ys = torch.floor(bbox[:, 1:2] + cells * (bbox[:, 3:4] - bbox[:, 1:2])) + 0.5
+        pts = torch.stack([xs.unsqueeze(1).expand(-1, size, -1), ys.unsqueeze(2).expand(-1, -1, size)], -1)
+        grid = warp_grid(affinetrans.to(gray.device), pts, (gray.shape[3], gray.shape[2]))
+        mask = F.grid_sample(gray.to(dtype), grid, mode='nearest', padding_mode='zeros', align_corners=False)[:, 0]
+        # the crop of the warped image is zero padded outside of it
+        inside = ((pts >= 0) & (pts < self.inp_res)).all(-1)
+        return ((mask != 0) & inside).long()
+
+    def color_jitter(self, img):
+        B = img.shape[0]
+        rand = lambda low, high: torch.empty(B, device=img.device, dtype=img.dtype).uniform_(low, high)
+        ops = [(adjust_brightness, rand(max(0, 1 - self.brightness), 1 + self.brightness)),
+               (adjust_saturation, rand(max(0, 1 - self.saturation), 1 + self.saturation)),
+               (adjust_hue, rand(-self.hue, self.hue)),
+               (adjust_contrast, rand(max(0, 1 - self.contrast), 1 + self.contrast))]
+        # every sample applies the four adjustments in its own random order
+        order = torch.rand(B, len(ops), device=img.device).argsort(1)
+        img = img.clone()
+        for step in range(len(ops)):
+            for k, (op, factor) in enumerate(ops):
+                idx = (order[:, step] == k).nonzero().view(-1)
+                if len(idx) > 0:
+                    img[idx] = op(img[idx], factor[idx])
+        return img
+
+    def motion_blur(self, img):
+        B = img.shape[0]
+        if self.kernels is None or self.kernels.device != img.device:
+            self.kernels = motion_blur_kernels(img.device, img.dtype)
+        direction = torch.randint(4, (B,), device=img.device)
+        size = torch.randint(len(MOTION_BLUR_SIZES), (B,), device=img.device)
+        half = max(MOTION_BLUR_SIZES) // 2
+        # cv2.filter2D reflects the border without repeating the edge pixel
+        return grouped_conv(img, self.kernels[direction, size], (half, half, half, half), 'reflect')
+
+    def __call__(self, img, affinetrans):
+        """
+        img: (B, 3, H, W) uint8 images as returned by POVSURGERY with batch_aug
+        affinetrans: (B, 3, 3) meta_info['affinetrans']
+        Returns (B, 3, inp_res, inp_res) float images in [0, 1], like functional.to_tensor of data_aug.
+        """
+        img = self.warp(img.float(), affinetrans) / 255.
+        if not self.train:
+            return img
+
+        sigma = torch.rand(img.shape[0], device=img.device, dtype=img.dtype) * self.blur_radius
+        img = gaussian_blur(img, sigma, self.blur_radius)
+        img = self.motion_blur(img)
+        return self.color_jitter(img.clamp(0, 1))
+
+
+if __name__ == '__main__':
+    # compares the batched path with the PIL/OpenCV one, run from HandOccNet_ft with
+    # python -m data.pov_surgery.batch_aug
+    import numpy as np
+    import cv2
+    from PIL import Image
+    import data.pov_surgery.datautil as dataset_util
+
+    rng = np.random.RandomState(0)
+    inp_res = 256
+    aug = BatchAugmentation(inp_res, train=False)
+    imgs, transforms, warped = [], [], []
+    for _ in range(8):
+        img = Image.fromarray(rng.randint(0, 256, size=(1080, 1920, 3), dtype=np.uint8))
+        center = rng.uniform([400, 200], [1500, 900])
+        affinetrans, _ = dataset_util.get_affine_transform(center, rng.uniform(150, 600), [inp_res, inp_res], rot=1e-9)
+        imgs.append(torch.from_numpy(np.array(img)).permute(2, 0, 1))
+        transforms.append(torch.from_numpy(affinetrans))
+        warped.append(np.array(dataset_util.transform_img(img, affinetrans, [inp_res, inp_res])))
+    out = aug(torch.stack(imgs), torch.stack(transforms))
+    out = (out * 255).round().byte().permute(0, 2, 3, 1).numpy()
+    print('warp: %.4f%% of the pixels differ from PIL' % (100 * (out != np.stack(warped)).any(-1).mean()))
+
+    img = torch.from_numpy(np.stack(warped)).permute(0, 3, 1, 2).float() / 255.
+    kernels = motion_blur_kernels()
+    err = 0
+    for b, (direction, size) in enumerate(zip(rng.randint(4, size=len(img)), rng.randint(3, size=len(img)))):
+        k = kernels[direction, size].numpy().astype(np.float64)
+        ref = cv2.filter2D(img[b].permute(1, 2, 0).numpy().astype(np.float64), -1, k)
+        blurred = grouped_conv(img[b:b + 1], kernels[direction, size][None], (3, 3, 3, 3), 'reflect')
+        err = max(err, np.abs(blurred[0].permute(1, 2, 0).numpy() - ref).max())
+    print('motion blur: max abs error %.2e' % err)
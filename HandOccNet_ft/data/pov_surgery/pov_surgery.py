@@ -1,27 +1,42 @@
 import os
 import os.path as osp
+import io
 import numpy as np
 import torch
 from PIL import Image, ImageFilter
 import cv2
 from torchvision.transforms import functional
 import random
-import json
 import math
 import copy
 from pycocotools.coco import COCO
 from config import cfg
 from utils.preprocessing import load_img, get_bbox, process_bbox, generate_patch_image, augmentation
-from utils.transforms import world2cam, cam2pixel, pixel2cam, rigid_align, transform_joint_to_other_db
+from utils.transforms import world2cam, cam2pixel, pixel2cam, rigid_align
 from utils.vis import vis_keypoints, vis_mesh, save_obj, vis_keypoints_with_skeleton
 from utils.mano import MANO
 import pickle
 import data.pov_surgery.datautil as dataset_util
+from data.pov_surgery.shards import ShardReader
+from data.pov_surgery.batch_aug import BatchAugmentation
 mano = MANO()
 
+BASE_DATA = '/home/ray/code_release/pov_surgery_dataset/POV_Surgery_data'
+jointsMapManoToSimple = [0, 13, 14, 15, 16,
+                         1, 2, 3, 17,
+                         4, 5, 6, 18,
+                         10, 11, 12, 19,
+                         7, 8, 9, 20]
+
 
 class POVSURGERY(torch.utils.data.Dataset):
-    def __init__(self, transform, data_split):
+    def __init__(self, transform, data_split, shard_dir=None, batch_aug=False):
+        """
+        shard_dir: directory written by main/pack_pov_surgery.py. If given, the train and
+        validation samples are read from its packed shards instead of the loose files.
+        batch_aug: return the full uint8 image and meta_info['affinetrans'] instead of the augmented crop,
+        the image part of data_aug / data_aug_val is then done on the batch by self.batch_augmentation.
+        """
         self.transform = transform
         self.data_split = data_split
         # self.root_dir = osp.join('..', 'data', 'HO3D', 'data')
@@ -60,10 +75,23 @@ class POVSURGERY(torch.utils.data.Dataset):
                 temp_o.append(os.path.join(temp_anno[temp_i].split('ego_eval')[0],'images','6', temp_list[temp_i]))
             self.set_list = temp_o
 
+        self.batch_augmentation = None
+        if batch_aug and self.mode != 'demo':
+            self.batch_augmentation = BatchAugmentation(self.inp_res, train=self.mode == 'train',
+                                                        blur_radius=self.blur_radius, brightness=self.brightness,
+                                                        contrast=self.contrast, saturation=self.saturation, hue=self.hue)
+
+        self.shards = None
+        if shard_dir and self.mode != 'demo':
+            self.shards = ShardReader(osp.join(shard_dir, self.data_split))
+            missing = [k for k in self.set_list if k not in self.shards]
+            if missing:
+                raise ValueError('%d %s samples are not packed in %s, e.g. %s' % (
+                    len(missing), self.data_split, shard_dir, missing[0]))
 
 
-        # if self.data_split != 'train':
-        #     self.eval_result = [[], []]  # [pred_joints_list, pred_verts_list]
+        if self.data_split != 'train':
+            self.eval_result = {'keys': []}  # sample keys and one list of batch arrays per output
         self.joints_name = (
         'Wrist', 'Index_1', 'Index_2', 'Index_3', 'Middle_1', 'Middle_2', 'Middle_3', 'Pinky_1', 'Pinky_2', 'Pinky_3',
         'Ring_1', 'Ring_2', 'Ring_3', 'Thumb_1', 'Thumb_2', 'Thumb_3', 'Thumb_4', 'Index_4', 'Middle_4', 'Ring_4',
@@ -106,21 +134,24 @@ class POVSURGERY(torch.utils.data.Dataset):
     #         datalist.append(data)
     #
     #     return datalist
-    def data_aug_val(self, img, mano_param, joints_uv, K, gray, p2d):
+    def aug_coords(self, joints_uv, K, p2d, img_size, jitter):
+        """Affine crop transform of data_aug (jitter=True) or data_aug_val and the transformed 2D annotations."""
         crop_hand = dataset_util.get_bbox_joints(joints_uv, bbox_factor=1.5)
         crop_obj = dataset_util.get_bbox_joints(p2d, bbox_factor=1.5)
-        center, scale = dataset_util.fuse_bbox(crop_hand, crop_hand, img.size)
+        center, scale = dataset_util.fuse_bbox(crop_hand, crop_hand, img_size)
 
-        # Randomly jitter center
-        # center_offsets = (self.center_jittering * scale * np.random.uniform(low=-1, high=1, size=2))
-        # center = center + center_offsets
+        if jitter:
+            # Randomly jitter center
+            center_offsets = (self.center_jittering * scale * np.random.uniform(low=-1, high=1, size=2))
+            center = center + center_offsets
 
-        # Scale jittering
-        # scale_jittering = self.scale_jittering * np.random.randn() + 1
-        # scale_jittering = np.clip(scale_jittering, 1 - self.scale_jittering, 1 + self.scale_jittering)
-        # scale = scale * scale_jittering
+            # Scale jittering
+            scale_jittering = self.scale_jittering * np.random.randn() + 1
+            scale_jittering = np.clip(scale_jittering, 1 - self.scale_jittering, 1 + self.scale_jittering)
+            scale = scale * scale_jittering
 
-        rot = 1e-9#np.random.uniform(low=-self.max_rot, high=self.max_rot)
+        rot = 1e-9
+        # rot = np.random.uniform(low=-self.max_rot, high=self.max_rot)
         affinetrans, post_rot_trans, rot_mat = dataset_util.get_affine_transform(center, scale,
                                                                                  [self.inp_res, self.inp_res], rot=rot,
                                                                                  K=K)
@@ -139,6 +170,12 @@ class POVSURGERY(torch.utils.data.Dataset):
         bbox_obj = dataset_util.get_bbox_joints(p2d, bbox_factor=1.0)
         p2d = dataset_util.normalize_joints(p2d, bbox_obj)
 
+        return affinetrans, K, p2d, joints_uv, bbox_hand, bbox_obj, rot_mat
+
+    def data_aug_val(self, img, mano_param, joints_uv, K, gray, p2d):
+        affinetrans, K, p2d, joints_uv, bbox_hand, bbox_obj, rot_mat = self.aug_coords(joints_uv, K, p2d, img.size,
+                                                                                       jitter=False)
+
         # Transform and crop
         img = dataset_util.transform_img(img, affinetrans, [self.inp_res, self.inp_res])
         img = img.crop((0, 0, self.inp_res, self.inp_res))
@@ -171,38 +208,8 @@ class POVSURGERY(torch.utils.data.Dataset):
         blur_img = cv2.filter2D(img, -1, kernels[blur])
         return blur_img
     def data_aug(self, img, mano_param, joints_uv, K, gray, p2d):
-        crop_hand = dataset_util.get_bbox_joints(joints_uv, bbox_factor=1.5)
-        crop_obj = dataset_util.get_bbox_joints(p2d, bbox_factor=1.5)
-        center, scale = dataset_util.fuse_bbox(crop_hand, crop_hand, img.size)
-
-        # Randomly jitter center
-        center_offsets = (self.center_jittering * scale * np.random.uniform(low=-1, high=1, size=2))
-        center = center + center_offsets
-
-        # Scale jittering
-        scale_jittering = self.scale_jittering * np.random.randn() + 1
-        scale_jittering = np.clip(scale_jittering, 1 - self.scale_jittering, 1 + self.scale_jittering)
-        scale = scale * scale_jittering
-
-        rot = 1e-9
-        # rot = np.random.uniform(low=-self.max_rot, high=self.max_rot)
-        affinetrans, post_rot_trans, rot_mat = dataset_util.get_affine_transform(center, scale,
-                                                                                 [self.inp_res, self.inp_res], rot=rot,
-                                                                                 K=K)
-        # Change mano from openGL coordinates to normal coordinates
-        # mano_param[:3] = dataset_util.rotation_angle(mano_param[:3], rot_mat, coord_change_mat=self.coord_change_mat)
-
-        joints_uv = dataset_util.transform_coords(joints_uv, affinetrans)  # hand landmark trans
-        K = post_rot_trans.dot(K)
-
-        p2d = dataset_util.transform_coords(p2d, affinetrans)  # obj landmark trans
-        # get hand bbox and normalize landmarks to [0,1]
-        bbox_hand = dataset_util.get_bbox_joints(joints_uv, bbox_factor=1.1)
-        joints_uv = dataset_util.normalize_joints(joints_uv, bbox_hand)
-
-        # get obj bbox and normalize landmarks to [0,1]
-        bbox_obj = dataset_util.get_bbox_joints(p2d, bbox_factor=1.0)
-        p2d = dataset_util.normalize_joints(p2d, bbox_obj)
+        affinetrans, K, p2d, joints_uv, bbox_hand, bbox_obj, rot_mat = self.aug_coords(joints_uv, K, p2d, img.size,
+                                                                                       jitter=True)
 
         # Transform and crop
         img = dataset_util.transform_img(img, affinetrans, [self.inp_res, self.inp_res])
@@ -239,161 +246,138 @@ class POVSURGERY(torch.utils.data.Dataset):
     #     return len(self.set_list)
     def __len__(self):
         return len(self.set_list)
+    def sample_files(self, idx):
+        seqName, id = self.set_list[idx].split("/")
+        return (os.path.join(BASE_DATA, 'color', seqName, id + '.jpg'),
+                os.path.join(BASE_DATA, 'mask', seqName, id + '.png'))
+
+    def load_annot(self, idx):
+        seqName, id = self.set_list[idx].split("/")
+        frame_anno = pickle.load(open(os.path.join(BASE_DATA, 'annotation', seqName, id + '.pkl'), 'rb'))
+
+        joints_uv_temp = self.base_info[self.set_list[idx]]['joints_uv']
+        p2d_temp = self.base_info[self.set_list[idx]]['p2d']
+        K = np.array([[1198.4395, 0.0000, 960.0000], [0.0000, 1198.4395, 175.2000], [0.0000, 0.0000, 1.0000]])
+        p2d = np.zeros_like(p2d_temp)
+        p2d[:, 0] = p2d_temp[:, 1]
+        p2d[:, 1] = p2d_temp[:, 0]
+
+        joints_uv = np.zeros_like(joints_uv_temp)
+        # joints_uv[:,0] = 1920 - joints_uv_temp[:,1]
+        joints_uv[:, 1] = joints_uv_temp[:, 0]
+        joints_uv[:, 0] = joints_uv_temp[:, 1]
+
+        mano_param_temp = frame_anno['mano']
+        this_rot = frame_anno['cam_rot']
+        this_transl = frame_anno['cam_transl']
+        camera_pose = np.eye(4)
+        camera_pose[:3, 3] = this_transl
+        camera_pose[:3, :3] = this_rot
+        all_addition_g = frame_anno['grab2world_R'] @ np.linalg.inv(camera_pose)[:3, :3].T
+        all_addition_t = (frame_anno['grab2world_T'] @ np.linalg.inv(camera_pose)[:3, :3].T
+                          + np.linalg.inv(camera_pose)[:3, 3])
+        temp_tl = mano_param_temp['transl']
+        all_addition_t_no_transl = temp_tl @ all_addition_g + all_addition_t
+        mano_param = \
+            np.concatenate(
+                (mano_param_temp['global_orient'], mano_param_temp['hand_pose'], mano_param_temp['betas']),
+                1)[0]
+
+        return {'K': K, 'joints_uv': joints_uv, 'p2d': p2d, 'mano_param': mano_param,
+                'all_addition_g': all_addition_g, 'all_addition_t_no_transl': all_addition_t_no_transl}
+
+    def load_sample(self, idx):
+        # the packed shards hold the same encoded files and the output of load_annot
+        if self.shards is not None:
+            img_bytes, mask_bytes, annot = self.shards.read(self.set_list[idx])
+            img_file, mask_file = io.BytesIO(img_bytes), io.BytesIO(mask_bytes)
+        else:
+            img_file, mask_file = self.sample_files(idx)
+            annot = self.load_annot(idx)
+
+        img = Image.open(img_file).convert("RGB")
+
+        # object information
+        gray = Image.open(mask_file)
+        gray = np.asarray(gray)
+        gray = gray.copy()
+        # if not (np.any(gray==100) and np.any(gray==200)):
+        #     return {}
+        gray[gray > 199] = 255
+        gray[gray < 199] = 0
+        gray = Image.fromarray(np.uint8(gray))
+        return img, gray, annot
+
+    def joints_img(self, joints_uv, bbox_hand):
+        """2D joint targets of the model: reordered like its outputs, in the pixels of the crop divided by its size."""
+        joints_uv = joints_uv.astype(np.float32)[jointsMapManoToSimple]
+        return dataset_util.recover_joints(joints_uv, bbox_hand.astype(np.float32)) / self.inp_res
+
     def __getitem__(self, idx):
         sample = {}
-        BASE_DATA = '/home/ray/code_release/pov_surgery_dataset/POV_Surgery_data'
         if self.mode != 'demo':
             seqName, id = self.set_list[idx].split("/")
-            img = Image.open(os.path.join(BASE_DATA,'color', seqName, id + '.jpg')).convert("RGB")
-            frame_anno = pickle.load(open(os.path.join(BASE_DATA,'annotation', seqName, id + '.pkl'), 'rb'))
+            img, gray, annot = self.load_sample(idx)
 
             sample["seqName"] = seqName
             sample["id"] = id
-            if self.mode == 'train':
-                joints_uv_temp = self.base_info[self.set_list[idx]]['joints_uv']
-                p2d_temp = self.base_info[self.set_list[idx]]['p2d']
-                K = np.array([[1198.4395, 0.0000, 960.0000], [0.0000, 1198.4395, 175.2000], [0.0000, 0.0000, 1.0000]])
-                p2d = np.zeros_like(p2d_temp)
-                p2d[:, 0] = p2d_temp[:, 1]
-                p2d[:, 1] = p2d_temp[:, 0]
-
-                joints_uv = np.zeros_like(joints_uv_temp)
-                # joints_uv[:,0] = 1920 - joints_uv_temp[:,1]
-                joints_uv[:, 1] = joints_uv_temp[:, 0]
-                joints_uv[:, 0] = joints_uv_temp[:, 1]
-
-                # K = self.K[idx]
-                # self.vis_kp(img, joints_uv)
-
-                mano_param_temp = frame_anno['mano']
-                this_rot = frame_anno['cam_rot']
-                this_transl = frame_anno['cam_transl']
-                camera_pose = np.eye(4)
-                camera_pose[:3, 3] = this_transl
-                camera_pose[:3, :3] = this_rot
-                all_addition_g = frame_anno['grab2world_R'] @ np.linalg.inv(camera_pose)[:3, :3].T
-                all_addition_t = (frame_anno['grab2world_T'] @ np.linalg.inv(camera_pose)[:3, :3].T
-                                  + np.linalg.inv(camera_pose)[:3, 3])
-                temp_tl = mano_param_temp['transl']
-                all_addition_t_no_transl = temp_tl @ all_addition_g + all_addition_t
-                variance_list = np.random.normal(0., 0.1, size=(1, 45))
-                mano_param = \
-                np.concatenate((mano_param_temp['global_orient'], mano_param_temp['hand_pose'], mano_param_temp['betas']),
-                               1)[0]
-
-                # self.mano_params[idx]
-
-                # object information
-                gray = Image.open(os.path.join(BASE_DATA,'mask/', seqName, id + '.png'))
-                gray = np.asarray(gray)
-                gray = gray.copy()
-                # if not (np.any(gray==100) and np.any(gray==200)):
-                #     return {}
-                gray[gray > 199] = 255
-                gray[gray < 199] = 0
-                gray = Image.fromarray(np.uint8(gray))
-                if self.mode == 'train':
-                    img, mano_param, K, obj_mask, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.data_aug(img, mano_param,
-                                                                                                               joints_uv, K,
-                                                                                                               gray, p2d)
-                else:
-                    img, mano_param, K, obj_mask, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.data_aug_val(img,
-                                                                                                               mano_param,
-                                                                                                               joints_uv, K,
-                                                                                                               gray, p2d)
-                # sample["img"] = functional.to_tensor(img) /255
-                sample["bbox_hand"] = bbox_hand
-                sample["bbox_obj"] = bbox_obj
-                sample["mano_param"] = mano_param
-                sample["cam_intr"] = K
-                sample["joints2d"] = joints_uv
-                # sample["obj_p2d"] = p2d
-                # sample["obj_mask"] = obj_mask
-                sample["all_addition_g"] = all_addition_g
-                sample["all_addition_t_no_transl"] = all_addition_t_no_transl
-                sample['rot_aug'] = rot_aug
-                inputs = {'img': functional.to_tensor(img)}
-                targets = sample
-                meta_info = {'root_joint_cam': rot_aug}
+            if 'mano_verts' in annot:
+                # GT MANO output packed by main/pack_pov_surgery.py, saves the model its GT forward
+                sample["mano_verts"] = annot['mano_verts']
+                sample["mano_joints"] = annot['mano_joints']
+            K = annot['K']
+            joints_uv = annot['joints_uv']
+            p2d = annot['p2d']
+            mano_param = annot['mano_param']
+            all_addition_g = annot['all_addition_g']
+            all_addition_t_no_transl = annot['all_addition_t_no_transl']
+
+            # K = self.K[idx]
+            # self.vis_kp(img, joints_uv)
+            joints_uv_orignal = joints_uv.copy()
+            variance_list = np.random.normal(0., 0.1, size=(1, 45))
+
+            if self.batch_augmentation is not None:
+                affinetrans, K, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.aug_coords(
+                    joints_uv, K, p2d, img.size, jitter=self.mode == 'train')
+            elif self.mode == 'train':
+                img, mano_param, K, obj_mask, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.data_aug(img,
+                                                                                                           mano_param,
+                                                                                                           joints_uv,
+                                                                                                           K,
+                                                                                                           gray,
+                                                                                                           p2d)
             else:
-                joints_uv_temp = self.base_info[self.set_list[idx]]['joints_uv']
-                p2d_temp = self.base_info[self.set_list[idx]]['p2d']
-                K = np.array([[1198.4395, 0.0000, 960.0000], [0.0000, 1198.4395, 175.2000], [0.0000, 0.0000, 1.0000]])
-                p2d = np.zeros_like(p2d_temp)
-                p2d[:, 0] = p2d_temp[:, 1]
-                p2d[:, 1] = p2d_temp[:, 0]
-
-                joints_uv = np.zeros_like(joints_uv_temp)
-                # joints_uv[:,0] = 1920 - joints_uv_temp[:,1]
-                joints_uv[:, 1] = joints_uv_temp[:, 0]
-                joints_uv[:, 0] = joints_uv_temp[:, 1]
-
-                # K = self.K[idx]
-                # self.vis_kp(img, joints_uv)
-                joints_uv_orignal = joints_uv.copy()
-
-                mano_param_temp = frame_anno['mano']
-                this_rot = frame_anno['cam_rot']
-                this_transl = frame_anno['cam_transl']
-                camera_pose = np.eye(4)
-                camera_pose[:3, 3] = this_transl
-                camera_pose[:3, :3] = this_rot
-                all_addition_g = frame_anno['grab2world_R'] @ np.linalg.inv(camera_pose)[:3, :3].T
-                all_addition_t = (frame_anno['grab2world_T'] @ np.linalg.inv(camera_pose)[:3, :3].T
-                                  + np.linalg.inv(camera_pose)[:3, 3])
-                temp_tl = mano_param_temp['transl']
-                all_addition_t_no_transl = temp_tl @ all_addition_g + all_addition_t
-                variance_list = np.random.normal(0., 0.1, size=(1, 45))
-                mano_param = \
-                    np.concatenate(
-                        (mano_param_temp['global_orient'], mano_param_temp['hand_pose'], mano_param_temp['betas']),
-                        1)[0]
-
-                # self.mano_params[idx]
-
-                # object information
-                gray = Image.open(os.path.join(BASE_DATA,'mask', seqName, id + '.png'))
-                gray = np.asarray(gray)
-                gray = gray.copy()
-                # if not (np.any(gray==100) and np.any(gray==200)):
-                #     return {}
-                gray[gray > 199] = 255
-                gray[gray < 199] = 0
-                gray = Image.fromarray(np.uint8(gray))
-                img_original = img.copy()
-                if self.mode == 'train':
-                    img, mano_param, K, obj_mask, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.data_aug(img,
+                img, mano_param, K, obj_mask, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.data_aug_val(img,
                                                                                                                mano_param,
                                                                                                                joints_uv,
                                                                                                                K,
                                                                                                                gray,
                                                                                                                p2d)
-                else:
-                    img, mano_param, K, obj_mask, p2d, joints_uv, bbox_hand, bbox_obj, rot_aug = self.data_aug_val(img,
-                                                                                                                   mano_param,
-                                                                                                                   joints_uv,
-                                                                                                                   K,
-                                                                                                                   gray,
-                                                                                                                   p2d)
-
+            # sample["img"] = functional.to_tensor(img) /255
+            sample["bbox_hand"] = bbox_hand
+            if self.mode != 'train':
                 # self.draw_box(img_original, dataset_util.get_bbox_joints(joints_uv_orignal, bbox_factor=1.5))
                 scale_temp = dataset_util.get_bbox_joints(joints_uv_orignal, bbox_factor=1.5)
                 scale_img = scale_temp[2] - scale_temp[0]
-                # sample["img"] = functional.to_tensor(img) /255
-                sample["bbox_hand"] = bbox_hand
                 sample["scale_img"] = scale_img
-                sample["bbox_obj"] = bbox_obj
-                sample["mano_param"] = mano_param
-                sample["cam_intr"] = K
-                sample["joints2d"] = joints_uv
-                # sample["obj_p2d"] = p2d
-                # sample["obj_mask"] = obj_mask
-                sample["all_addition_g"] = all_addition_g
-                sample["all_addition_t_no_transl"] = all_addition_t_no_transl
-                sample['rot_aug'] = rot_aug
+            sample["bbox_obj"] = bbox_obj
+            sample["mano_param"] = mano_param
+            sample["cam_intr"] = K
+            sample["joints2d"] = joints_uv
+            sample["joints_img"] = self.joints_img(joints_uv, bbox_hand)
+            # sample["obj_p2d"] = p2d
+            # sample["obj_mask"] = obj_mask
+            sample["all_addition_g"] = all_addition_g
+            sample["all_addition_t_no_transl"] = all_addition_t_no_transl
+            sample['rot_aug'] = rot_aug
+            targets = sample
+            meta_info = {'root_joint_cam': rot_aug}
+            if self.batch_augmentation is not None:
+                inputs = {'img': torch.from_numpy(np.array(img)).permute(2, 0, 1)}
+                meta_info['affinetrans'] = affinetrans
+            else:
                 inputs = {'img': functional.to_tensor(img)}
-                targets = sample
-                meta_info = {'root_joint_cam': rot_aug}
         else:
             this_image_name = self.set_list[idx]
 
@@ -413,11 +397,6 @@ class POVSURGERY(torch.utils.data.Dataset):
 
             sample["seqName"] = seqName
             sample["id"] = id
-            jointsMapManoToSimple = [0, 13, 14, 15, 16,
-                                          1, 2, 3, 17,
-                                          4, 5, 6, 18,
-                                          10, 11, 12, 19,
-                                          7, 8, 9, 20]
             jointsMapSimpleToMano = np.argsort(jointsMapManoToSimple)
             joints_uv_temp  = kp2d_this[jointsMapSimpleToMano,:2]
             p2d_temp = joints_uv_temp
@@ -489,6 +468,7 @@ class POVSURGERY(torch.utils.data.Dataset):
             sample["mano_param"] = mano_param
             sample["cam_intr"] = K
             sample["joints2d"] = joints_uv
+            sample["joints_img"] = self.joints_img(joints_uv, bbox_hand)
             # sample["obj_p2d"] = p2d
             # sample["obj_mask"] = obj_mask
             sample["all_addition_g"] = all_addition_g
@@ -558,41 +538,14 @@ class POVSURGERY(torch.utils.data.Dataset):
         return inputs, targets, meta_info
 
     def evaluate(self, outs, cur_sample_idx):
-        annots = self.datalist
-        sample_num = len(outs)
-        for n in range(sample_num):
-            annot = annots[cur_sample_idx + n]
-
-            out = outs[n]
-
-            verts_out = out['mesh_coord_cam']
-            joints_out = out['joints_coord_cam']
-
-            # root align
-            gt_root_joint_cam = annot['root_joint_cam']
-            verts_out = verts_out - joints_out[self.root_joint_idx] + gt_root_joint_cam
-            joints_out = joints_out - joints_out[self.root_joint_idx] + gt_root_joint_cam
-
-            # convert to openGL coordinate system.
-            verts_out *= np.array([1, -1, -1])
-            joints_out *= np.array([1, -1, -1])
-
-            # convert joint ordering from MANO to HO3D.
-            joints_out = transform_joint_to_other_db(joints_out, mano.joints_name, self.joints_name)
-
-            self.eval_result[0].append(joints_out.tolist())
-            self.eval_result[1].append(verts_out.tolist())
+        """Collects a batch of test outputs, numpy arrays keyed as in the 'test' mode of Model."""
+        batch_size = len(next(iter(outs.values())))
+        self.eval_result['keys'].extend(self.set_list[cur_sample_idx:cur_sample_idx + batch_size])
+        for k, v in outs.items():
+            self.eval_result.setdefault(k, []).append(v.astype(np.float32))
 
     def print_eval_result(self, test_epoch):
-        output_json_file = osp.join(cfg.result_dir, 'pred{}.json'.format(test_epoch))
-        output_zip_file = osp.join(cfg.result_dir, 'pred{}.zip'.format(test_epoch))
-
-        with open(output_json_file, 'w') as f:
-            json.dump(self.eval_result, f)
-        print('Dumped %d joints and %d verts predictions to %s' % (
-        len(self.eval_result[0]), len(self.eval_result[1]), output_json_file))
-
-        cmd = 'zip -j ' + output_zip_file + ' ' + output_json_file
-        print(cmd)
-        os.system(cmd)
-
+        output_file = osp.join(cfg.result_dir, 'pred{}.npz'.format(test_epoch))
+        result = {k: np.concatenate(v) for k, v in self.eval_result.items() if k != 'keys'}
+        np.savez(output_file, keys=np.array(self.eval_result['keys']), **result)
+        print('Dumped %d predictions (%s) to %s' % (len(self.eval_result['keys']), ', '.join(result), output_file))
@@ -0,0 +1,98 @@
+import os
+import os.path as osp
+import json
+import numpy as np
+
+# Packed POV-Surgery samples.
+#
+# A packed split is a directory with
+#   shard_XXXXX.bin    the encoded jpg and png files, concatenated as they are on disk
+#   index.npy          one record per sample: shard number, offset and size of the image and the mask
+#   keys.npy           the 'seqName/id' key of every sample, in index order
+#   <field>.npy        one array per annotation field, stacked over the samples
+#   meta.json          the field names and the number of shards
+# index.npy and the field arrays are opened memory-mapped, so the workers of a
+# DataLoader share them through the page cache instead of each holding a copy.
+
+INDEX_DTYPE = np.dtype([('shard', np.int32),
+                        ('img_offset', np.int64), ('img_size', np.int64),
+                        ('mask_offset', np.int64), ('mask_size', np.int64)])
+
+
+def shard_path(shard_dir, shard):
+    return osp.join(shard_dir, 'shard_%05d.bin' % shard)
+
+
+class ShardWriter(object):
+    def __init__(self, shard_dir, shard_bytes=2 ** 30):
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = shard_dir
+        self.shard_bytes = shard_bytes
+        self.shard = -1
+        self.file = None
+        self.records = []
+        self.keys = []
+        self.annots = {}
+        self._next_shard()
+
+    def _next_shard(self):
+        if self.file is not None:
+            self.file.close()
+        self.shard += 1
+        self.file = open(shard_path(self.shard_dir, self.shard), 'wb')
+
+    def add(self, key, img_bytes, mask_bytes, annot):
+        if self.file.tell() > 0 and self.file.tell() + len(img_bytes) + len(mask_bytes) > self.shard_bytes:
+            self._next_shard()
+        img_offset = self.file.tell()
+        self.file.write(img_bytes)
+        mask_offset = self.file.tell()
+        self.file.write(mask_bytes)
+        self.records.append((self.shard, img_offset, len(img_bytes), mask_offset, len(mask_bytes)))
+
+        self.keys.append(key)
+        for k, v in annot.items():
+            self.annots.setdefault(k, []).append(v)
+
+    def close(self):
+        self.file.close()
+        np.save(osp.join(self.shard_dir, 'index.npy'), np.array(self.records, dtype=INDEX_DTYPE))
+        np.save(osp.join(self.shard_dir, 'keys.npy'), np.array(self.keys))
+        for k, v in self.annots.items():
+            np.save(osp.join(self.shard_dir, k + '.npy'), np.stack(v))
+        with open(osp.join(self.shard_dir, 'meta.json'), 'w') as f:
+            json.dump({'fields': sorted(self.annots.keys()), 'num_shards': self.shard + 1, 'num_samples': len(self.keys)}, f)
+
+
+class ShardReader(object):
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        with open(osp.join(shard_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.index = np.load(osp.join(shard_dir, 'index.npy'), mmap_mode='r')
+        self.keys = np.load(osp.join(shard_dir, 'keys.npy'))
+        self.key_to_row = {str(k): i for i, k in enumerate(self.keys)}
+        self.annots = {k: np.load(osp.join(shard_dir, k + '.npy'), mmap_mode='r') for k in self.meta['fields']}
+        # the shards are mapped on first use, i.e. inside each DataLoader worker
+        self.shards = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.key_to_row
+
+    def _shard(self, shard):
+        if shard not in self.shards:
+            self.shards[shard] = np.memmap(shard_path(self.shard_dir, shard), dtype=np.uint8, mode='r')
+        return self.shards[shard]
+
+    def read(self, key):
+        """Returns the encoded image, the encoded mask and a dict of writable annotation arrays."""
+        row = self.key_to_row[key]
+        rec = self.index[row]
+        data = self._shard(int(rec['shard']))
+        img_bytes = data[rec['img_offset']:rec['img_offset'] + rec['img_size']].tobytes()
+        mask_bytes = data[rec['mask_offset']:rec['mask_offset'] + rec['mask_size']].tobytes()
+        annot = {k: np.array(v[row]) for k, v in self.annots.items()}
+        return img_bytes, mask_bytes, annot
@@ -0,0 +1,44 @@
+import argparse
+import sys
+import time
+sys.path.append('.')
+sys.path.append('..')
+import torch
+from config import cfg
+from utils.checkpoint import load_network
+from model import get_model
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='CPU batch inference throughput of HandOccNet')
+    parser.add_argument('--ckpt', type=str, default='', help='optional snapshot, random weights otherwise')
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--iters', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    cfg.set_args(None, device='cpu')
+
+    model = get_model('test')
+    if args.ckpt:
+        ckpt = torch.load(args.ckpt, map_location='cpu')
+        load_network(model, ckpt['network'])
+    model.eval()
+
+    inputs = {'img': torch.rand(args.batch_size, 3, cfg.input_img_shape[0], cfg.input_img_shape[1])}
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        with torch.no_grad():
+            for _ in range(args.warmup):
+                model(inputs, {}, {}, 'test')
+            start = time.perf_counter()
+            for _ in range(args.iters):
+                model(inputs, {}, {}, 'test')
+            elapsed = time.perf_counter() - start
+        print('threads %2d: %.2f img/s (%.1f ms per batch of %d)' % (
+            threads, args.iters * args.batch_size / elapsed, 1000 * elapsed / args.iters, args.batch_size))
+
+if __name__ == "__main__":
+    main()
@@ -37,8 +37,13 @@ class Config:
 
     ## others
     num_thread = 20
+    pov_shard_dir = None # packed POV-Surgery samples from main/pack_pov_surgery.py, None reads the loose files
+    batch_aug = False # warp, blur and colour jitter whole batches on the GPU instead of per sample in the loader
+    snapshot_train_prob = 0.01 # chance of a debug snapshot per training step, 0 disables
+    snapshot_val_every = 10 # debug snapshot every n validation steps, 0 disables
     gpu_ids = '0'
     num_gpus = 1
+    device = 'cuda' # 'cpu' runs the model without DataParallel
     continue_train = False
     
     ## directory
@@ -54,12 +59,18 @@ class Config:
     mano_path = osp.join(root_dir, 'common', 'utils', 'manopth')
     pretrained_chpt = osp.join(root_root, 'data', 'snapshot_demo.pth.tar')
     debug_dir = osp.join(root_dir, 'debug')
+    snapshot_dir = osp.join(root_dir, 'debg') # skeleton overlays and meshes of utils.snapshot
     # pretrained_chpt = osp.join(root_dir, 'common', 'utils', 'manopth')
     
-    def set_args(self, gpu_ids, continue_train=False):
+    def set_args(self, gpu_ids, continue_train=False, device='cuda'):
+        self.device = device
+        self.continue_train = continue_train
+        if device == 'cpu':
+            self.num_gpus = 1
+            print('>>> Using CPU')
+            return
         self.gpu_ids = gpu_ids
         self.num_gpus = len(self.gpu_ids.split(','))
-        self.continue_train = continue_train
         os.environ["CUDA_VISIBLE_DEVICES"] = self.gpu_ids
         print('>>> Using GPU: {}'.format(self.gpu_ids))
 
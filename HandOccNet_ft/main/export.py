@@ -0,0 +1,90 @@
+import argparse
+import os
+import os.path as osp
+import sys
+import time
+sys.path.append('.')
+sys.path.append('..')
+import numpy as np
+import torch
+from config import cfg
+from utils.checkpoint import load_network
+from model import get_model, InferenceModel
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+OUTPUT_NAMES = ['verts3d', 'joints3d', 'joints_img']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export the inference graph of HandOccNet to TorchScript and ONNX')
+    parser.add_argument('--ckpt', type=str, default='', help='snapshot to export, random weights otherwise')
+    parser.add_argument('--out', type=str, default=osp.join(cfg.output_dir, 'export'))
+    parser.add_argument('--batch_size', type=int, default=4)
+    parser.add_argument('--opset', type=int, default=13)
+    parser.add_argument('--atol', type=float, default=1e-4, help='max abs difference allowed against eager mode')
+    parser.add_argument('--iters', type=int, default=20, help='timed runs of the latency comparison')
+    return parser.parse_args()
+
+def latency(fn, img, iters):
+    fn(img)
+    times = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        fn(img)
+        times.append(time.perf_counter() - start)
+    return 1000 * np.median(times)
+
+def main():
+    args = parse_args()
+    cfg.set_args(None, device='cpu')
+    os.makedirs(args.out, exist_ok=True)
+
+    model = get_model('test')
+    if args.ckpt:
+        ckpt = torch.load(args.ckpt, map_location='cpu')
+        load_network(model, ckpt['network'])
+    model = InferenceModel(model).eval()
+
+    img = torch.rand(args.batch_size, 3, cfg.input_img_shape[0], cfg.input_img_shape[1])
+    with torch.no_grad():
+        # TorchScript
+        script_path = osp.join(args.out, 'handoccnet.pt')
+        scripted = torch.jit.trace(model, img)
+        scripted.save(script_path)
+        scripted = torch.jit.load(script_path)
+        runners = {'eager': model, 'torchscript': scripted}
+
+        # ONNX, with a dynamic batch dimension
+        onnx_path = osp.join(args.out, 'handoccnet.onnx')
+        torch.onnx.export(model, img, onnx_path, input_names=['img'], output_names=OUTPUT_NAMES,
+                          dynamic_axes={name: {0: 'batch'} for name in ['img'] + OUTPUT_NAMES},
+                          opset_version=args.opset)
+        print('Exported %s and %s' % (script_path, onnx_path))
+
+    if onnxruntime is not None:
+        session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+        runners['onnxruntime'] = lambda x: [torch.from_numpy(out) for out in session.run(None, {'img': x.numpy()})]
+    else:
+        print('onnxruntime is not installed, the ONNX graph is not checked')
+
+    # parity against eager mode, on a fresh batch of another size for the traced graphs
+    test_img = torch.rand(args.batch_size + 1, 3, cfg.input_img_shape[0], cfg.input_img_shape[1])
+    with torch.no_grad():
+        ref = [out.numpy() for out in model(test_img)]
+        for name, runner in runners.items():
+            if name == 'eager':
+                continue
+            outs = [out.numpy() for out in runner(test_img)]
+            for out_name, out, r in zip(OUTPUT_NAMES, outs, ref):
+                err = np.abs(out - r).max()
+                print('%-12s %-10s max abs error %.2e' % (name, out_name, err))
+                assert err <= args.atol, '%s output %s differs from eager mode' % (name, out_name)
+
+        for name, runner in runners.items():
+            print('%-12s %.1f ms per batch of %d' % (name, latency(runner, img, args.iters), args.batch_size))
+
+if __name__ == "__main__":
+    main()
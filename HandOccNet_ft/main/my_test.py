@@ -1,12 +1,14 @@
 import os
+import os.path as osp
 
 import torch
 import argparse
 from tqdm import tqdm
-import numpy as np
 import torch.backends.cudnn as cudnn
 from config import cfg
 from base import Tester, MY_VAL
+from utils.metrics import EvalAccumulator
+from utils.snapshot import SnapshotWriter
 
 
 def parse_args():
@@ -37,52 +39,42 @@ def main(path1):
     tester._make_batch_generator()
     tester._make_model(path1)
 
-    eval_result = {}
-    cur_sample_idx = 0
-
-    vert_box = []
-    j2t_box = []
-    j3d_box = []
-    j3d_pa = []
-    v3d_pa = []
+    snapshot_writer = SnapshotWriter(cfg.snapshot_dir, osp.join(cfg.root_root, 'data', 'rh_face.mat'),
+                                     train_prob=cfg.snapshot_train_prob, val_every=cfg.snapshot_val_every)
+    accumulator = EvalAccumulator()
+    j2d_per_sample = []
 
     for itr, (inputs, targets, meta_info) in enumerate(tqdm(tester.batch_generator)):
 
+        if tester.batch_augmentation is not None:
+            inputs['img'] = tester.batch_augmentation(inputs['img'].to(cfg.device, non_blocking=True), meta_info['affinetrans'])
+
         # forward
+        snapshot = snapshot_writer.wants('my_val', itr)
         with torch.no_grad():
-            out = tester.model(inputs, targets, meta_info, 'my_val',this_name=str(itr).zfill(6))
-
-        # save output
-        out = {k: v.cpu().numpy() for k, v in out.items()}
-        vert_box.append(out['mano_verts'].item())
-        j3d_box.append(out['mano_joints'].item())
-        j2t_box.append(out['joints_img'].item())
-        j3d_pa.append(out['j3d_pa'].item())
-        v3d_pa.append(out['v3d_pa'].item())
-    print('J2D : ', np.mean(j2t_box))
-    print('J3D : ', np.mean(j3d_box))
-    print('VERT : ', np.mean(vert_box))
-    print('J3D_PA: ', np.mean(j3d_pa))
-    print('VERT_PA: ', np.mean(v3d_pa))
+            errors = tester.model(inputs, targets, meta_info, 'my_val', snapshot=snapshot)
+        if snapshot:
+            errors, debug = errors
+            snapshot_writer.submit(debug, osp.join('val', '0'), str(itr).zfill(6))
+        accumulator.update(errors)
+        j2d_per_sample.append(errors['joints2d'].mean(dim=-1))
+
+    snapshot_writer.close()
+    result = accumulator.summary()
+    for name, value in result.items():
+        print('%s: %.4f' % (name, value))
     import pickle
     with open(os.path.join('/media/rui/data/demo_statistics/HANDOCCNET.pkl'), 'wb') as f:
-        pickle.dump({'J2D': j2t_box}, f)
+        pickle.dump({'J2D': torch.cat(j2d_per_sample).cpu().numpy().tolist()}, f)
 
     OUT_PATH_SCORE = '/home/rui/projects/sp2_ws/HandOccNet/output/eval/ft_ver.txt'
     os.makedirs(os.path.dirname(OUT_PATH_SCORE), exist_ok=True)
     text_file = open(OUT_PATH_SCORE, "a+")
     n = text_file.write('======================================================================================================================================')
     n = text_file.write(path1)
-    n = text_file.write('J2D: ' + str(np.mean(j2t_box)))
-    n = text_file.write('\n')
-    n = text_file.write('J3D: ' + str(np.mean(j3d_box)))
-    n = text_file.write('\n')
-    n = text_file.write('VERT: ' + str(np.mean(vert_box)))
-    n = text_file.write('\n')
-    n = text_file.write('J3d_PA: ' + str(np.mean(j3d_pa)))
-    n = text_file.write('\n')
-    n = text_file.write('V3d_PA: ' + str(np.mean(v3d_pa)))
-    n = text_file.write('\n')
+    for name, value in result.items():
+        n = text_file.write(name + ': ' + str(value))
+        n = text_file.write('\n')
 
     text_file.close()
         # for k, v in out.items(): batch_size = out[k].shape[0]
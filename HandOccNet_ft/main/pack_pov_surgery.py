@@ -0,0 +1,68 @@
+import argparse
+import os.path as osp
+import sys
+sys.path.append('.')
+sys.path.append('..')
+import numpy as np
+import torch
+from tqdm import tqdm
+from config import cfg
+from data.pov_surgery.pov_surgery import POVSURGERY
+from data.pov_surgery.shards import ShardWriter
+from nets.mano_head import canonical_gt_mano, mano
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', type=str, required=True, help='output directory, set it as cfg.pov_shard_dir')
+    parser.add_argument('--split', type=str, nargs='+', default=['train', 'validation'])
+    parser.add_argument('--shard_gb', type=float, default=1.0, help='approximate size of one shard')
+    parser.add_argument('--verify', type=int, default=100, help='number of samples compared with the loose files')
+    parser.add_argument('--mano_batch', type=int, default=256, help='samples per GT MANO forward')
+    return parser.parse_args()
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def gt_mano(dataset, annots):
+    """GT verts and joints of the annotations before the rotation augmentation, as used by mano_regHead."""
+    stack = lambda k: torch.from_numpy(np.stack([annot[k] for annot in annots]))
+    with torch.no_grad():
+        verts, joints = canonical_gt_mano(mano.layer, stack('mano_param'), stack('all_addition_g'),
+                                          stack('all_addition_t_no_transl'), torch.from_numpy(dataset.coord_change_mat))
+    return verts.numpy(), joints.numpy()
+
+def pack(dataset, out_dir, shard_bytes, mano_batch):
+    writer = ShardWriter(out_dir, shard_bytes)
+    for start in tqdm(range(0, len(dataset), mano_batch)):
+        indices = range(start, min(start + mano_batch, len(dataset)))
+        annots = [dataset.load_annot(idx) for idx in indices]
+        verts, joints = gt_mano(dataset, annots)
+        for idx, annot, mano_verts, mano_joints in zip(indices, annots, verts, joints):
+            img_path, mask_path = dataset.sample_files(idx)
+            annot = dict(annot, mano_verts=mano_verts, mano_joints=mano_joints)
+            writer.add(dataset.set_list[idx], read_bytes(img_path), read_bytes(mask_path), annot)
+    writer.close()
+    print('Packed %d samples into %d shards in %s' % (len(writer.keys), writer.shard + 1, out_dir))
+
+def verify(loose, packed, num):
+    for idx in np.linspace(0, len(loose) - 1, min(num, len(loose))).astype(int):
+        img_l, gray_l, annot_l = loose.load_sample(idx)
+        img_p, gray_p, annot_p = packed.load_sample(idx)
+        assert np.array_equal(np.asarray(img_l), np.asarray(img_p)), 'image %s differs' % loose.set_list[idx]
+        assert np.array_equal(np.asarray(gray_l), np.asarray(gray_p)), 'mask %s differs' % loose.set_list[idx]
+        for k, v in annot_l.items():
+            assert v.dtype == annot_p[k].dtype and np.array_equal(v, annot_p[k]), \
+                '%s of %s differs' % (k, loose.set_list[idx])
+
+def main():
+    args = parse_args()
+    for split in args.split:
+        loose = POVSURGERY(None, split)
+        pack(loose, osp.join(args.out, split), int(args.shard_gb * 2 ** 30), args.mano_batch)
+        if args.verify > 0:
+            verify(loose, POVSURGERY(None, split, shard_dir=args.out), args.verify)
+            print('Packed %s samples match the loose files' % split)
+
+if __name__ == "__main__":
+    main()
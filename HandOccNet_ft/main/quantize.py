@@ -0,0 +1,116 @@
+import argparse
+import copy
+import os
+import os.path as osp
+import sys
+import time
+sys.path.append('.')
+sys.path.append('..')
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Subset
+from tqdm import tqdm
+from config import cfg
+from utils.checkpoint import load_network
+from model import get_model, InferenceModel
+from data.pov_surgery.pov_surgery import POVSURGERY
+from utils.metrics import pose_errors, EvalAccumulator
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Post-training int8 quantisation of HandOccNet for CPU inference')
+    parser.add_argument('--ckpt', type=str, required=True)
+    parser.add_argument('--out', type=str, default=osp.join(cfg.output_dir, 'export', 'handoccnet_int8.pt'))
+    parser.add_argument('--calib', type=int, default=256, help='validation samples used for calibration')
+    parser.add_argument('--eval', type=int, default=2000, help='other validation samples used for the accuracy report')
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--qengine', type=str, default='fbgemm', help='fbgemm on x86, qnnpack on ARM')
+    return parser.parse_args()
+
+def quantize(model, calib_loader, qengine):
+    """
+    Returns an int8 copy of model: static quantisation of the FPN backbone (up to its attention module)
+    calibrated on calib_loader, dynamic quantisation of the linears of the transformers and the regressor.
+    """
+    torch.backends.quantized.engine = qengine
+    qmodel = copy.deepcopy(model).eval()
+
+    backbone = qmodel.backbone
+    backbone.fuse_model()
+    backbone.qconfig = torch.quantization.get_default_qconfig(qengine)
+    backbone.attention_module.qconfig = None
+    torch.quantization.prepare(backbone, inplace=True)
+    with torch.no_grad():
+        for inputs, _, _ in tqdm(calib_loader, desc='calibration'):
+            backbone(inputs['img'])
+    torch.quantization.convert(backbone, inplace=True)
+
+    for name in ['FIT', 'SET', 'regressor']:
+        setattr(qmodel, name, torch.quantization.quantize_dynamic(getattr(qmodel, name), {nn.Linear}, dtype=torch.qint8))
+    return qmodel
+
+def evaluate(model, loader):
+    """MPJPE and PA-MPJPE in mm of the 3D joints, as in the 'my_val' mode of Model."""
+    key_l = ['all_addition_g', 'all_addition_t_no_transl', 'rot_aug', 'joints2d', 'mano_param', 'bbox_hand']
+    accumulator = EvalAccumulator()
+    with torch.no_grad():
+        for inputs, targets, meta_info in tqdm(loader, desc='evaluation'):
+            for key in key_l:
+                targets[key] = targets[key].float()
+            p_feats, s_feats = model.backbone(inputs['img'])
+            feats = model.FIT(s_feats, p_feats)
+            feats = model.SET(feats, feats)
+            pred, gt, _ = model.regressor(feats, targets)
+            accumulator.update(pose_errors(pred, gt))
+    result = accumulator.summary()
+    return result['MPJPE'], result['PA-MPJPE']
+
+def throughput(model, batch_size, iters=10):
+    model = InferenceModel(model).eval()
+    img = torch.rand(batch_size, 3, cfg.input_img_shape[0], cfg.input_img_shape[1])
+    with torch.no_grad():
+        model(img)
+        start = time.perf_counter()
+        for _ in range(iters):
+            model(img)
+    return iters * batch_size / (time.perf_counter() - start)
+
+def main():
+    args = parse_args()
+    cfg.set_args(None, device='cpu')
+
+    model = get_model('test')
+    ckpt = torch.load(args.ckpt, map_location='cpu')
+    load_network(model, ckpt['network'])
+    model.eval()
+
+    # calibration and evaluation samples are disjoint, spread over the validation sequences
+    dataset = POVSURGERY(None, 'validation', shard_dir=cfg.pov_shard_dir)
+    order = np.random.RandomState(0).permutation(len(dataset))
+    calib_set = Subset(dataset, order[:args.calib].tolist())
+    eval_set = Subset(dataset, order[args.calib:args.calib + args.eval].tolist())
+    calib_loader = DataLoader(calib_set, batch_size=args.batch_size, num_workers=cfg.num_thread)
+    eval_loader = DataLoader(eval_set, batch_size=args.batch_size, num_workers=cfg.num_thread)
+
+    qmodel = quantize(model, calib_loader, args.qengine)
+    os.makedirs(osp.dirname(args.out), exist_ok=True)
+    torch.jit.save(torch.jit.trace(InferenceModel(qmodel).eval(),
+                                   torch.rand(1, 3, cfg.input_img_shape[0], cfg.input_img_shape[1])), args.out)
+    print('Saved the int8 model to %s' % args.out)
+
+    fp32_mpjpe, fp32_pa = evaluate(model, eval_loader)
+    int8_mpjpe, int8_pa = evaluate(qmodel, eval_loader)
+    print('%-6s MPJPE %.2f mm  PA-MPJPE %.2f mm' % ('fp32', fp32_mpjpe, fp32_pa))
+    print('%-6s MPJPE %.2f mm  PA-MPJPE %.2f mm' % ('int8', int8_mpjpe, int8_pa))
+    print('change MPJPE %+.2f mm  PA-MPJPE %+.2f mm' % (int8_mpjpe - fp32_mpjpe, int8_pa - fp32_pa))
+
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        fp32_ips = throughput(model, args.batch_size)
+        int8_ips = throughput(qmodel, args.batch_size)
+        print('threads %2d: fp32 %.2f img/s, int8 %.2f img/s, speed-up x%.2f' % (
+            threads, fp32_ips, int8_ips, int8_ips / fp32_ips))
+
+if __name__ == "__main__":
+    main()
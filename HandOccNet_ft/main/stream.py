@@ -0,0 +1,156 @@
+import argparse
+import io
+import os
+import os.path as osp
+import sys
+import time
+sys.path.append('.')
+sys.path.append('..')
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision.transforms import functional
+from tqdm import tqdm
+from config import cfg
+from utils.checkpoint import load_network
+from model import get_model
+from data.pov_surgery.pov_surgery import POVSURGERY
+import data.pov_surgery.datautil as dataset_util
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Streaming HandOccNet inference over POV-Surgery sequences')
+    parser.add_argument('--ckpt', type=str, required=True)
+    parser.add_argument('--split', type=str, default='validation')
+    parser.add_argument('--seq', type=str, nargs='*', default=[], help='sequences to run, all of the split by default')
+    parser.add_argument('--out', type=str, default=osp.join(cfg.result_dir, 'stream'))
+    parser.add_argument('--device', type=str, default='cuda', choices=['cuda', 'cpu'])
+    parser.add_argument('--skip_thresh', type=float, default=0.,
+                        help='reuse the previous MANO output when the 2D joints moved less than this many pixels on average')
+    parser.add_argument('--reinit_every', type=int, default=0,
+                        help='re-crop from the annotation every N frames, 0 only on the first frame')
+    parser.add_argument('--decode_workers', type=int, default=2)
+    return parser.parse_args()
+
+class FrameReader(Dataset):
+    """Decodes the frames of one sequence, from the loose files or the packed shards of the dataset."""
+    def __init__(self, dataset, indices):
+        self.dataset = dataset
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        idx = self.indices[i]
+        if self.dataset.shards is not None:
+            img_file = io.BytesIO(self.dataset.shards.read(self.dataset.set_list[idx])[0])
+        else:
+            img_file = self.dataset.sample_files(idx)[0]
+        return np.array(Image.open(img_file).convert("RGB"))
+
+class SequenceStreamer(object):
+    """
+    Runs HandOccNet frame by frame over a sequence. The hand crop of a frame is built from the 2D joints
+    predicted on the previous frame, the same way data_aug_val builds it from the annotated ones, so only
+    the first frame (and every reinit_every frames) needs an annotation.
+    """
+    def __init__(self, model, device, inp_res=256, skip_thresh=0.):
+        self.model = model
+        self.device = device
+        self.inp_res = inp_res
+        self.skip_thresh = skip_thresh
+        self.reset()
+
+    def reset(self, joints_uv=None):
+        self.joints_uv = joints_uv
+        # 2D joints of the last frame the MANO head ran on, what the motion is measured against
+        self.regressed_uv = None
+        self.last_mano = None
+
+    def crop(self, frame):
+        img = Image.fromarray(frame)
+        crop_hand = dataset_util.get_bbox_joints(self.joints_uv, bbox_factor=1.5)
+        center, scale = dataset_util.fuse_bbox(crop_hand, crop_hand, img.size)
+        affinetrans, _ = dataset_util.get_affine_transform(center, scale, [self.inp_res, self.inp_res], rot=1e-9)
+        img = dataset_util.transform_img(img, affinetrans, [self.inp_res, self.inp_res])
+        return functional.to_tensor(img), affinetrans
+
+    @torch.no_grad()
+    def step(self, frame):
+        img, affinetrans = self.crop(frame)
+        img = img.unsqueeze(0).to(self.device)
+
+        p_feats, s_feats = self.model.backbone(img)
+        feats = self.model.FIT(s_feats, p_feats)
+        feats = self.model.SET(feats, feats)
+        out_hm, encoding, preds_joints_img = self.model.regressor.hand_regHead(feats)
+
+        # back to the pixels of the full frame
+        joints_crop = preds_joints_img[0][0].cpu().numpy() * self.inp_res
+        joints_uv = dataset_util.transform_coords(joints_crop, np.linalg.inv(affinetrans))
+
+        motion = np.inf if self.last_mano is None else np.linalg.norm(joints_uv - self.regressed_uv, axis=1).mean()
+        regressed = motion >= self.skip_thresh
+        if regressed:
+            mano_encoding = self.model.regressor.hand_Encoder(out_hm, encoding)
+            pred_mano_results, _ = self.model.regressor.mano_regHead(mano_encoding)
+            self.last_mano = (pred_mano_results['verts3d'][0].cpu().numpy(),
+                              pred_mano_results['joints3d'][0].cpu().numpy())
+            self.regressed_uv = joints_uv
+
+        self.joints_uv = joints_uv
+        return {'verts3d': self.last_mano[0], 'joints3d': self.last_mano[1], 'joints2d': joints_uv,
+                'affinetrans': affinetrans, 'regressed': regressed}
+
+def init_joints_uv(dataset, idx):
+    """Annotated 2D joints the crop starts from, from the shards when the dataset reads them."""
+    if dataset.shards is not None:
+        return dataset.shards.read(dataset.set_list[idx])[2]['joints_uv']
+    return dataset.load_annot(idx)['joints_uv']
+
+def main():
+    args = parse_args()
+    cfg.set_args(cfg.gpu_ids, device=args.device)
+    device = torch.device(args.device)
+    os.makedirs(args.out, exist_ok=True)
+
+    model = get_model('test')
+    ckpt = torch.load(args.ckpt, map_location='cpu')
+    load_network(model, ckpt['network'])
+    model = model.to(device).eval()
+
+    dataset = POVSURGERY(None, args.split, shard_dir=cfg.pov_shard_dir)
+    sequences = {}
+    for idx, key in enumerate(dataset.set_list):
+        seq_name, frame_id = key.split('/')
+        sequences.setdefault(seq_name, []).append((frame_id, idx))
+    streamer = SequenceStreamer(model, device, inp_res=dataset.inp_res, skip_thresh=args.skip_thresh)
+
+    total_frames, total_time = 0, 0.
+    for seq_name in (args.seq or sorted(sequences)):
+        frames = sorted(sequences[seq_name])
+        indices = [idx for _, idx in frames]
+        # decoding runs in the loader workers while the model processes the previous frame
+        reader = DataLoader(FrameReader(dataset, indices), batch_size=None, num_workers=args.decode_workers)
+
+        outputs = []
+        start = time.perf_counter()
+        for i, frame in enumerate(tqdm(reader, desc=seq_name)):
+            if i == 0 or (args.reinit_every > 0 and i % args.reinit_every == 0):
+                streamer.reset(init_joints_uv(dataset, indices[i]))
+            outputs.append(streamer.step(frame.numpy()))
+        elapsed = time.perf_counter() - start
+        total_frames += len(outputs)
+        total_time += elapsed
+
+        np.savez(osp.join(args.out, seq_name + '.npz'),
+                 ids=np.array([frame_id for frame_id, _ in frames]),
+                 **{k: np.stack([out[k] for out in outputs]) for k in outputs[0]})
+        print('%s: %d frames, %.1f fps, MANO regressed on %d' % (
+            seq_name, len(outputs), len(outputs) / elapsed, sum(out['regressed'] for out in outputs)))
+
+    print('%d frames at %.1f fps' % (total_frames, total_frames / total_time))
+
+if __name__ == "__main__":
+    main()
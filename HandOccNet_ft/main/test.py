@@ -10,8 +10,14 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--gpu', type=str, dest='gpu_ids')
     parser.add_argument('--test_epoch', type=str, dest='test_epoch')
+    parser.add_argument('--device', type=str, default='cuda', choices=['cuda', 'cpu'])
+    parser.add_argument('--threads', type=int, default=0, help='intra-op threads on the CPU, 0 keeps the default')
     args = parser.parse_args()
 
+    if args.device == 'cpu':
+        assert args.test_epoch, 'Test epoch is required.'
+        return args
+
     if not args.gpu_ids:
         assert 0, "Please set propoer gpu ids"
 
@@ -27,8 +33,10 @@ def parse_args():
 def main():
 
     args = parse_args()
-    cfg.set_args(args.gpu_ids)
+    cfg.set_args(args.gpu_ids, device=args.device)
     cudnn.benchmark = True
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
 
     tester = Tester(args.test_epoch)
     tester._make_batch_generator()
@@ -44,12 +52,10 @@ def main():
        
         # save output
         out = {k: v.cpu().numpy() for k,v in out.items()}
-        for k,v in out.items(): batch_size = out[k].shape[0]
-        out = [{k: v[bid] for k,v in out.items()} for bid in range(batch_size)]
 
         # evaluate
         tester._evaluate(out, cur_sample_idx)
-        cur_sample_idx += len(out)
+        cur_sample_idx += len(inputs['img'])
     
     tester._print_eval_result(args.test_epoch)
 
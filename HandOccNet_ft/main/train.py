@@ -1,10 +1,12 @@
 import argparse
+import os.path as osp
 import sys
 sys.path.append('.')
 sys.path.append('..')
 from config import cfg
 import torch
 from base import Trainer
+from utils.snapshot import SnapshotWriter
 import torch.backends.cudnn as cudnn
 from torch.utils.tensorboard import SummaryWriter
 
@@ -41,6 +43,8 @@ def main():
     trainer = Trainer()
     trainer._make_batch_generator()
     trainer._make_model_continue()
+    snapshot_writer = SnapshotWriter(cfg.snapshot_dir, osp.join(cfg.root_root, 'data', 'rh_face.mat'),
+                                     train_prob=cfg.snapshot_train_prob, val_every=cfg.snapshot_val_every)
     train_global_step = 0
     # train
     for epoch in range(trainer.start_epoch, cfg.end_epoch):
@@ -51,7 +55,6 @@ def main():
         for itr, (inputs, targets, meta_info) in enumerate(trainer.batch_generator):
             trainer.read_timer.toc()
             trainer.gpu_timer.tic()
-            this_name = str(epoch)+'_'+str(itr)
             # if itr%1000== 0:
             #     trainer.save_modelmy({
             #         'epoch': epoch,
@@ -59,9 +62,16 @@ def main():
             #         'optimizer': trainer.optimizer.state_dict(),
             #     }, epoch , itr)
 
+            if trainer.batch_augmentation is not None:
+                inputs['img'] = trainer.batch_augmentation(inputs['img'].to(cfg.device, non_blocking=True), meta_info['affinetrans'])
+
             # forward
             trainer.optimizer.zero_grad()
-            loss = trainer.model(inputs, targets, meta_info, 'train', this_name=this_name)
+            snapshot = snapshot_writer.wants('train', itr)
+            loss = trainer.model(inputs, targets, meta_info, 'train', snapshot=snapshot)
+            if snapshot:
+                loss, debug = loss
+                snapshot_writer.submit(debug, osp.join('train', str(epoch)), str(itr))
             loss = {k:loss[k].mean() for k in loss}
 
             # backward
@@ -95,7 +105,7 @@ def main():
                 'network': trainer.model.state_dict(),
                 'optimizer': trainer.optimizer.state_dict(),
             }, epoch+1)
-        
+    snapshot_writer.close()
 
 if __name__ == "__main__":
     main()
@@ -15,3 +15,4 @@
 # Contact: ps-license@tuebingen.mpg.de
 
 from .model import load, MANO
+from .utils import cache_model_data
@@ -21,11 +21,6 @@ from __future__ import division
 import os
 import os.path as osp
 
-try:
-    import cPickle as pickle
-except ImportError:
-    import pickle
-
 import numpy as np
 
 from collections import namedtuple
@@ -33,8 +28,8 @@ from collections import namedtuple
 import torch
 import torch.nn as nn
 
-from .lbs import lbs
-from .utils import Struct, to_np, to_tensor
+from .lbs import lbs, batch_rodrigues
+from .utils import Struct, to_np, to_tensor, load_model_data
 from .utils import Mesh,points2sphere, colors
 from .joints_info import TIP_IDS
 
@@ -127,7 +122,9 @@ class MANO(nn.Module):
             flat_hand_mean: bool, optional
                 If False, then the pose of the hand is initialized to False.
             batch_size: int, optional
-                The batch size used for creating the member variables
+                The batch size used for creating the member variables. The
+                forward pass broadcasts them to the batch of its inputs, so
+                the default of 1 serves any batch size
             dtype: torch.dtype, optional
                 The data type for the created variables
             vertex_ids: dict, optional
@@ -149,13 +146,7 @@ class MANO(nn.Module):
             assert osp.exists(mano_path), 'Path {} does not exist!'.format(
                 mano_path)
 
-            if ext == 'pkl':
-                with open(mano_path, 'rb') as mano_file:
-                    model_data = pickle.load(mano_file, encoding='latin1')
-            elif ext == 'npz':
-                model_data = np.load(mano_path, allow_pickle=True)
-            else:
-                raise ValueError('Unknown extension: {}'.format(ext))
+            model_data = load_model_data(mano_path, ext=ext)
             data_struct = Struct(**model_data)
 
 
@@ -300,6 +291,17 @@ class MANO(nn.Module):
         msg += '\nFlat hand mean: {}'.format(self.flat_hand_mean)
         return msg
 
+    @staticmethod
+    def expand_to_batch(var, batch_size):
+        ''' Broadcasts a Bx... tensor with B == 1 to batch_size without copying
+        '''
+        if var.shape[0] == batch_size:
+            return var
+        if var.shape[0] != 1:
+            raise ValueError('Cannot broadcast a batch of {} to a batch of {}'.format(
+                var.shape[0], batch_size))
+        return var.expand(batch_size, *var.shape[1:])
+
     def add_joints(self,vertices,joints, joint_ids = None):
 
         dev = vertices.device
@@ -315,8 +317,30 @@ class MANO(nn.Module):
     def forward(self, betas=None, global_orient=None, hand_pose=None, transl=None,
                 return_verts=True, return_tips = False, return_full_pose=False, pose2rot=True,
                 **kwargs):
+        ''' Runs the hand model
+
+            Any of betas, global_orient, hand_pose and transl that is not
+            passed is taken from the module. The module parameters are
+            broadcast to the batch size of the passed tensors, so a model
+            created with batch_size=1 can be called with any batch.
+
+            With pose2rot=False, global_orient (Bx1x3x3) and hand_pose
+            (Bx15x3x3) are rotation matrices that are skinned directly,
+            without going through axis-angle. They are the final joint
+            rotations, i.e. the hand mean is not added, which matches the
+            axis-angle input for models with flat_hand_mean=True.
         '''
-        '''
+        if not pose2rot and self.use_pca:
+            raise ValueError('Rotation matrix input requires use_pca=False')
+
+        # The batch size is given by the tensors passed along, the module
+        # parameters only define it when nothing is passed
+        batch_size = max([var.shape[0] for var in (betas, global_orient, hand_pose, transl)
+                          if var is not None] or [self.batch_size])
+
+        # The parameters of the module are always in axis-angle
+        default_orient, default_hand_pose = global_orient is None, hand_pose is None
+
         # If no shape and pose parameters are passed along, then use the
         # ones from the module
         global_orient = (global_orient if global_orient is not None else self.global_orient)
@@ -328,12 +352,26 @@ class MANO(nn.Module):
             if hasattr(self, 'transl'):
                 transl = self.transl
 
+        global_orient = self.expand_to_batch(global_orient, batch_size)
+        betas = self.expand_to_batch(betas, batch_size)
+        hand_pose = self.expand_to_batch(hand_pose, batch_size)
+        if apply_trans:
+            transl = self.expand_to_batch(transl, batch_size)
+
         if self.use_pca:
             hand_pose = torch.einsum('bi,ij->bj', [hand_pose, self.hand_components])
 
-        full_pose = torch.cat([global_orient,
-                               hand_pose], dim=1)
-        full_pose += self.pose_mean
+        if pose2rot:
+            full_pose = torch.cat([global_orient,
+                                   hand_pose], dim=1)
+            full_pose += self.pose_mean
+        else:
+            if default_orient:
+                global_orient = batch_rodrigues(global_orient.reshape(-1, 3))
+            if default_hand_pose:
+                hand_pose = batch_rodrigues(hand_pose.reshape(-1, 3))
+            full_pose = torch.cat([global_orient.reshape(batch_size, -1, 3, 3),
+                                   hand_pose.reshape(batch_size, -1, 3, 3)], dim=1)
 
         if return_verts:
             vertices, joints = lbs(betas, full_pose, self.v_template,
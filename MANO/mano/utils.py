@@ -18,6 +18,13 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 
+import os.path as osp
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 import numpy as np
 import torch
 import trimesh
@@ -45,6 +52,63 @@ def to_np(array, dtype=np.float32):
     return array.astype(dtype)
 
 
+def model_cache_path(model_path):
+    ''' Returns the path of the pre-parsed cache of a model file, keyed on
+        its full name so MODEL.pkl and MODEL.npz get separate caches,
+        e.g. MANO_RIGHT.pkl -> MANO_RIGHT.pkl.cache.npz
+    '''
+    return model_path + '.cache.npz'
+
+
+def load_model_data(model_path, ext='pkl', use_cache=True):
+    ''' Loads the raw data of a model file
+
+        If a cache written by cache_model_data exists next to the model and
+        is newer than it, the plain float32 arrays are read from the cache
+        instead of unpickling the chumpy / scipy objects of the original file.
+    '''
+    cache_path = model_cache_path(model_path)
+    if use_cache and osp.exists(cache_path) and \
+            osp.getmtime(cache_path) >= osp.getmtime(model_path):
+        with np.load(cache_path) as cache_data:
+            return dict(cache_data)
+
+    if ext == 'pkl':
+        with open(model_path, 'rb') as model_file:
+            model_data = pickle.load(model_file, encoding='latin1')
+    elif ext == 'npz':
+        model_data = np.load(model_path, allow_pickle=True)
+    else:
+        raise ValueError('Unknown extension: {}'.format(ext))
+    return model_data
+
+
+def cache_model_data(model_path, ext='pkl'):
+    ''' Converts a model file once into an uncompressed npz of plain arrays
+
+        Sparse matrices are densified, chumpy arrays converted to numpy and
+        floating point data cast to float32. Entries that cannot be stored
+        without pickling are dropped, the models do not use them.
+    '''
+    model_data = load_model_data(model_path, ext=ext, use_cache=False)
+
+    arrays = {}
+    for key in model_data.keys():
+        data = model_data[key]
+        if 'scipy.sparse' in str(type(data)):
+            data = data.todense()
+        data = np.array(data)
+        if data.dtype == object:
+            continue
+        if np.issubdtype(data.dtype, np.floating):
+            data = data.astype(np.float32)
+        arrays[key] = data
+
+    cache_path = model_cache_path(model_path)
+    np.savez(cache_path, **arrays)
+    return cache_path
+
+
 def rot_mat_to_euler(rot_mats):
     # Calculates rotation matrix to euler angles
     # Careful for extreme cases of eular angles like [0.0, pi, 0.0]
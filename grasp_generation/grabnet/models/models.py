@@ -19,9 +19,9 @@ import torch
 
 from torch import nn
 from torch.nn import functional as F
-from grabnet.tools.utils import rotmat2aa
-from grabnet.tools.utils import CRot2rotmat
+from grabnet.tools.rotations import crot_to_rotmat, rotmat_to_aa
 from grabnet.tools.train_tools import point2point_signed
+from grabnet.tools.nn_search import NNIndex
 
 
 class ResBlock(nn.Module):
@@ -221,9 +221,12 @@ class RefineNet(nn.Module):
         self.actvf = nn.LeakyReLU(.2, inplace=True)
         self.tanh = nn.Tanh()
 
-    def forward(self, h2o_dist, fpose_rhand_rotmat_f, trans_rhand_f, global_orient_rhand_rotmat_f, verts_object, **kwargs):
+    def forward(self, h2o_dist, fpose_rhand_rotmat_f, trans_rhand_f, global_orient_rhand_rotmat_f, verts_object, obj_index=None, **kwargs):
 
         bs = h2o_dist.shape[0]
+        # the object is rigid, its nearest neighbour structure serves all iterations
+        if obj_index is None:
+            obj_index = NNIndex(verts_object)
         init_pose = fpose_rhand_rotmat_f[..., :2].reshape(bs, -1)
         init_rpose = global_orient_rhand_rotmat_f[..., :2].reshape(bs, -1)
         init_pose = torch.cat([init_rpose, init_pose], dim=1)
@@ -232,9 +235,9 @@ class RefineNet(nn.Module):
         for i in range(self.n_iters):
 
             if i != 0:
-                hand_parms = parms_decode(init_pose, init_trans)
-                verts_rhand = self.rhm_train(**hand_parms).vertices
-                _, h2o_dist, _ = point2point_signed(verts_rhand, verts_object)
+                hand_parms = parms_decode_rotmat(init_pose, init_trans)
+                verts_rhand = self.rhm_train(**hand_parms, pose2rot=False).vertices
+                _, h2o_dist, _ = point2point_signed(verts_rhand, verts_object, one_sided=True, y_index=obj_index)
 
             h2o_dist = self.bn1(h2o_dist)
             X0 = torch.cat([h2o_dist, init_pose, init_trans], dim=1)
@@ -258,14 +261,26 @@ def parms_decode(pose,trans):
 
     bs = trans.shape[0]
 
-    pose_full = CRot2rotmat(pose)
-    pose = pose_full.view([bs, 1, -1, 9])
-    pose = rotmat2aa(pose).view(bs, -1)
+    pose_full = crot_to_rotmat(pose.view(bs, -1, 6))
+    pose = rotmat_to_aa(pose_full).view(bs, -1)
 
     global_orient = pose[:, :3]
     hand_pose = pose[:, 3:]
-    pose_full = pose_full.view([bs, -1, 3, 3])
 
     hand_parms = {'global_orient': global_orient, 'hand_pose': hand_pose, 'transl': trans, 'fullpose': pose_full}
 
-    return hand_parms
\ No newline at end of file
+    return hand_parms
+
+def parms_decode_rotmat(pose, trans):
+    '''
+    Decodes the 6D pose straight to the rotation matrix inputs of the hand
+    model (called with pose2rot=False), skipping the axis-angle round trip
+    of parms_decode.
+    '''
+    bs = trans.shape[0]
+
+    pose_full = crot_to_rotmat(pose.view(bs, -1, 6))
+
+    hand_parms = {'global_orient': pose_full[:, :1], 'hand_pose': pose_full[:, 1:], 'transl': trans, 'fullpose': pose_full}
+
+    return hand_parms
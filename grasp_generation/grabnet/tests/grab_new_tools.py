@@ -19,14 +19,13 @@ import numpy as np
 import torch
 import os, time
 import argparse
-import mano
 
 from grabnet.tools.utils import euler
 from grabnet.tools.cfg_parser import Config
 from grabnet.tests.tester import Tester
 from psbody.mesh.colors import name_to_rgb
 from grabnet.tools.train_tools import point2point_signed
-from grabnet.tools.utils import aa2rotmat
+from grabnet.tools.nn_search import NNIndex
 from grabnet.tools.utils import makepath
 from grabnet.tools.utils import to_cpu
 from grabnet.tools.vis_tools import points_to_spheres
@@ -103,18 +102,26 @@ def get_meshes(object_data, coarse_net, refine_net, rh_model, save=False, save_d
         # Sample poses using CoarseNet
         coarse_net_output, zgen = coarse_net.sample_poses(object_data['bps_object'])
 
-        # Generate hand vertices of the MANO right hand model using the sampled poses
-        verts_rh_gen_cnet = rh_model(**coarse_net_output).vertices
+        # Generate hand vertices of the MANO right hand model using the sampled poses,
+        # directly from the decoded rotation matrices
+        coarse_fullpose = coarse_net_output['fullpose']
+        verts_rh_gen_cnet = rh_model(global_orient=coarse_fullpose[:, :1],
+                                     hand_pose=coarse_fullpose[:, 1:],
+                                     transl=coarse_net_output['transl'],
+                                     pose2rot=False).vertices
         zgen = zgen.cpu().float().numpy()
 
-         # Compute point-to-point signed distances
-        _, h2o, _ = point2point_signed(verts_rh_gen_cnet, object_data['verts_object'].to(device))
+         # Compute point-to-point signed distances, only the hand side is needed
+        verts_object = object_data['verts_object'].to(device)
+        obj_index = NNIndex(verts_object)
+        _, h2o, _ = point2point_signed(verts_rh_gen_cnet, verts_object, one_sided=True, y_index=obj_index)
 
         # Prepare data for RefineNet
         coarse_net_output['trans_rhand_f'] = coarse_net_output['transl']
-        coarse_net_output['global_orient_rhand_rotmat_f'] = aa2rotmat(coarse_net_output['global_orient']).view(-1, 3, 3)
-        coarse_net_output['fpose_rhand_rotmat_f'] = aa2rotmat(coarse_net_output['hand_pose']).view(-1, 15, 3, 3)
-        coarse_net_output['verts_object'] = object_data['verts_object'].to(device)
+        coarse_net_output['global_orient_rhand_rotmat_f'] = coarse_fullpose[:, 0]
+        coarse_net_output['fpose_rhand_rotmat_f'] = coarse_fullpose[:, 1:]
+        coarse_net_output['verts_object'] = verts_object
+        coarse_net_output['obj_index'] = obj_index
         coarse_net_output['h2o_dist'] = h2o.abs()
 
         # Refine the poses using RefineNet
@@ -126,7 +133,11 @@ def get_meshes(object_data, coarse_net, refine_net, rh_model, save=False, save_d
             save_dict[this_key] = refine_net_output[this_key].detach().cpu().numpy()
 
         # Generate final hand vertices and joints using the refined poses  
-        out_1= rh_model(**refine_net_output)
+        refine_fullpose = refine_net_output['fullpose']
+        out_1= rh_model(global_orient=refine_fullpose[:, :1],
+                        hand_pose=refine_fullpose[:, 1:],
+                        transl=refine_net_output['transl'],
+                        pose2rot=False)
         verts_rh_gen_rnet = out_1.vertices
         save_dict['joints'] = out_1.joints.cpu().numpy()
         save_dict['vert'] = out_1.vertices.cpu().numpy()
@@ -189,15 +200,8 @@ def grab_new_objs(grabnet, objs_path, rotation_angles, rot=True, n_samples=10, s
     grabnet.coarse_net.eval()
     grabnet.refine_net.eval()
 
-    # Load the MANO right hand model
-    rh_model = mano.load(model_path=grabnet.cfg.rhm_path,
-                         model_type='mano',
-                         num_pca_comps=45,
-                         batch_size=n_samples,
-                         flat_hand_mean=True).to(grabnet.device)
-
-    # Assign the hand model to the refinement network
-    grabnet.refine_net.rhm_train = rh_model
+    # The MANO right hand model is preloaded by the Tester and shared with the refinement network
+    rh_model = grabnet.rh_model
 
     # Log the start of the object grabbing process
     grabnet.logger(f'################# \n'
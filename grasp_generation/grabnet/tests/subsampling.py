@@ -22,7 +22,6 @@ import torch
 import os, time
 import argparse
 
-import mano
 
 from grabnet.tools.utils import euler
 from grabnet.tools.cfg_parser import Config
@@ -51,7 +50,7 @@ def get_meshes(dorig, coarse_net, refine_net, rh_model, save=False, save_dir=Non
         verts_rh_gen_cnet = rh_model(**drec_cnet).vertices
         zgen = zgen.cpu().float().numpy()
 
-        _, h2o, _ = point2point_signed(verts_rh_gen_cnet, dorig['verts_object'].to(device))
+        _, h2o, _ = point2point_signed(verts_rh_gen_cnet, dorig['verts_object'].to(device), one_sided=True)
         drec_cnet['trans_rhand_f'] = torch.from_numpy(np.repeat(this_transl.reshape(1,3),n_samples,0)).to(device)
 
         # import ipdb
@@ -120,13 +119,7 @@ def grab_new_objs(grabnet, objs_path, rot=True, n_samples=10, scale=1., save_nam
     grabnet.coarse_net.eval()
     grabnet.refine_net.eval()
 
-    rh_model = mano.load(model_path=grabnet.cfg.rhm_path,
-                         model_type='mano',
-                         num_pca_comps=45,
-                         batch_size=n_samples,
-                         flat_hand_mean=True).to(grabnet.device)
-
-    grabnet.refine_net.rhm_train = rh_model
+    rh_model = grabnet.rh_model
 
     grabnet.logger(f'################# \n'
                    f'Grabbing the object!'
@@ -19,7 +19,6 @@ import sys
 sys.path.append('.')
 sys.path.append('..')
 
-import mano
 from psbody.mesh import MeshViewers, Mesh
 from psbody.mesh.colors import name_to_rgb
 from grabnet.tools.vis_tools import vis_results
@@ -38,13 +37,7 @@ def inference(grabnet):
     ds_test = LoadData(dataset_dir=grabnet.cfg.dataset_dir, ds_name=ds_name)
     n_samples = 5
 
-    rh_model = mano.load(model_path=grabnet.cfg.rhm_path,
-                         model_type='mano',
-                         num_pca_comps=45,
-                         batch_size=n_samples,
-                         flat_hand_mean=True).to(grabnet.device)
-
-    grabnet.refine_net.rhm_train = rh_model
+    rh_model = grabnet.rhm_train
     test_obj_names = np.unique(ds_test.frame_objs)
 
     grabnet.logger(f'################# \n'
@@ -14,6 +14,7 @@
 import os
 import numpy as np
 import torch
+import mano
 
 from grabnet.tools.utils import makepath, makelogger
 from grabnet.models.models import CoarseNet, RefineNet
@@ -50,6 +51,17 @@ class Tester:
 
         self.bps = torch.from_numpy(np.load(cfg.bps_dir)['basis']).to(self.dtype)
 
+        # one hand model is shared by CoarseNet, RefineNet and the mesh export,
+        # it broadcasts to the number of generated samples
+        self.rh_model = None
+        if cfg.get('rhm_path') is not None:
+            with torch.no_grad():
+                self.rh_model = mano.load(model_path=cfg.rhm_path,
+                                          model_type='mano',
+                                          num_pca_comps=45,
+                                          flat_hand_mean=True).to(self.device)
+            self.refine_net.rhm_train = self.rh_model
+
     def _get_cnet_model(self):
         return self.coarse_net.module if isinstance(self.coarse_net, torch.nn.DataParallel) else self.coarse_net
 
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG),
+# acting on behalf of its Max Planck Institute for Intelligent Systems and the
+# Max Planck Institute for Biological Cybernetics. All rights reserved.
+#
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is holder of all proprietary rights
+# on this computer program. You can only use this computer program if you have closed a license agreement
+# with MPG or you get the right to use the computer program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and liable to prosecution.
+# Contact: ps-license@tuebingen.mpg.de
+#
+
+# Nearest neighbour search between batches of point clouds.
+#
+# Only the indices of the nearest points are searched for, the distances are
+# recomputed with gather by the callers so gradients flow as before. Three
+# backends are available:
+#   - 'chamfer': the compiled chamfer_distance extension, if installed
+#   - 'kdtree':  one scipy cKDTree per cloud, for large clouds on the CPU
+#   - 'cdist':   pure torch, blocked torch.cdist on any device
+
+import numpy as np
+import torch
+
+try:
+    import chamfer_distance as chd
+except ImportError:
+    chd = None
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+BACKENDS = ('auto', 'chamfer', 'kdtree', 'cdist')
+
+# reference clouds with at least this many points use a KD-tree on the CPU
+KDTREE_MIN_POINTS = 2048
+
+_chamfer_distance = None
+
+
+def select_backend(y, backend='auto'):
+    '''
+    :param y: (N, P, D) reference clouds
+    :param backend: one of BACKENDS
+    :return: the backend that will be used for y
+    '''
+    if backend not in BACKENDS:
+        raise ValueError('Unknown nearest neighbour backend: %s' % backend)
+    if backend == 'chamfer' and chd is None:
+        raise ImportError('The chamfer_distance extension is not installed')
+    if backend == 'kdtree' and cKDTree is None:
+        raise ImportError('scipy is required for the kdtree backend')
+    if backend != 'auto':
+        return backend
+
+    if chd is not None and y.is_cuda:
+        return 'chamfer'
+    if cKDTree is not None and not y.is_cuda and y.shape[1] >= KDTREE_MIN_POINTS:
+        return 'kdtree'
+    return 'cdist'
+
+
+def chamfer_indices(x, y):
+    '''
+    :return: the indices of the nearest y for each x (N, P1) and of the nearest x for each y (N, P2)
+    '''
+    global _chamfer_distance
+    if _chamfer_distance is None:
+        _chamfer_distance = chd.ChamferDistance()
+    _, _, xidx_near, yidx_near = _chamfer_distance(x, y)
+    return xidx_near.to(torch.long), yidx_near.to(torch.long)
+
+
+class NNIndex(object):
+    '''
+    A search structure over a batch of reference clouds y, built once and
+    queried many times, e.g. for a rigid object while the hand moves.
+    '''
+
+    def __init__(self, y, backend='auto', block_size=2048):
+        '''
+        :param y: (N, P2, D) reference clouds
+        :param backend: one of BACKENDS
+        :param block_size: number of query points per torch.cdist block
+        '''
+        self.y = y
+        self.backend = select_backend(y, backend)
+        self.block_size = block_size
+
+        self.trees = None
+        if self.backend == 'kdtree':
+            self.trees = [cKDTree(y_i) for y_i in y.detach().cpu().numpy()]
+
+    def query(self, x):
+        '''
+        :param x: (N, P1, D) query clouds
+        :return: (N, P1) long, the index of the nearest point of y for each point of x
+        '''
+        N, P1, D = x.shape
+        if self.y.shape[0] != N or self.y.shape[2] != D:
+            raise ValueError("y does not have the correct shape.")
+
+        with torch.no_grad():
+            if self.backend == 'chamfer':
+                return chamfer_indices(x, self.y)[0]
+
+            if self.backend == 'kdtree':
+                x_np = x.detach().cpu().numpy()
+                idx = np.stack([tree.query(x_i)[1] for tree, x_i in zip(self.trees, x_np)])
+                return torch.from_numpy(idx).to(device=x.device, dtype=torch.long)
+
+            idx = [torch.cdist(x[:, start:start + self.block_size], self.y).argmin(dim=2)
+                   for start in range(0, P1, self.block_size)]
+            return torch.cat(idx, dim=1)
+
+    def query_both(self, x, backend='auto'):
+        '''
+        :return: the nearest y for each x (N, P1) and the nearest x for each y (N, P2)
+        '''
+        if self.backend == 'chamfer':
+            with torch.no_grad():
+                return chamfer_indices(x, self.y)
+        return self.query(x), NNIndex(x, backend=backend, block_size=self.block_size).query(self.y)
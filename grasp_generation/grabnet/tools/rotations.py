@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG),
+# acting on behalf of its Max Planck Institute for Intelligent Systems and the
+# Max Planck Institute for Biological Cybernetics. All rights reserved.
+#
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is holder of all proprietary rights
+# on this computer program. You can only use this computer program if you have closed a license agreement
+# with MPG or you get the right to use the computer program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and liable to prosecution.
+# Contact: ps-license@tuebingen.mpg.de
+#
+
+# Rotation conversions between the continuous 6D representation (CRot),
+# rotation matrices, quaternions and axis-angle vectors.
+#
+# All functions work on arbitrary leading dimensions, e.g. the [B, 16, ...]
+# hand poses of GrabNet, and on plain 3x3 matrices: nothing is padded to 3x4
+# or 4x4 and no per-element identity matrices are allocated. The conversions
+# follow the torchgeometry functions in grabnet.tools.utils, which they
+# replace on the decoding path; run `python -m grabnet.tools.rotations` to
+# compare the two.
+
+import torch
+import torch.nn.functional as F
+
+
+def crot_to_rotmat(crot):
+    '''
+    :param crot: [...,6], the first two columns of the rotation matrices
+    :return: [...,3,3]
+    '''
+    reshaped_input = crot.view(*crot.shape[:-1], 3, 2)
+
+    b1 = F.normalize(reshaped_input[..., 0], dim=-1)
+
+    dot_prod = torch.sum(b1 * reshaped_input[..., 1], dim=-1, keepdim=True)
+    b2 = F.normalize(reshaped_input[..., 1] - dot_prod * b1, dim=-1)
+    b3 = torch.cross(b1, b2, dim=-1)
+
+    return torch.stack([b1, b2, b3], dim=-1)
+
+
+def rotmat_to_crot(rotmat):
+    '''
+    :param rotmat: [...,3,3]
+    :return: [...,6], the first two columns of the rotation matrices
+    '''
+    return rotmat[..., :2].reshape(*rotmat.shape[:-2], 6)
+
+
+def rotmat_to_quat(rotmat, eps=1e-6):
+    '''
+    Picks the same of the four numerically stable candidates as
+    grabnet.tools.utils.rotation_matrix_to_quaternion, selected with an index
+    instead of summing masked copies.
+
+    :param rotmat: [...,3,3]
+    :return: [...,4] as (w, x, y, z)
+    '''
+    m00, m01, m02 = rotmat[..., 0, 0], rotmat[..., 0, 1], rotmat[..., 0, 2]
+    m10, m11, m12 = rotmat[..., 1, 0], rotmat[..., 1, 1], rotmat[..., 1, 2]
+    m20, m21, m22 = rotmat[..., 2, 0], rotmat[..., 2, 1], rotmat[..., 2, 2]
+
+    mask_d2 = m22 < eps
+    mask_d0_d1 = m00 > m11
+    mask_d0_nd1 = m00 < -m11
+
+    t = torch.stack([1 + m00 - m11 - m22,
+                     1 - m00 + m11 - m22,
+                     1 - m00 - m11 + m22,
+                     1 + m00 + m11 + m22], dim=-1)
+    q = torch.stack([
+        torch.stack([m21 - m12, t[..., 0], m10 + m01, m02 + m20], dim=-1),
+        torch.stack([m02 - m20, m10 + m01, t[..., 1], m21 + m12], dim=-1),
+        torch.stack([m10 - m01, m02 + m20, m21 + m12, t[..., 2]], dim=-1),
+        torch.stack([t[..., 3], m21 - m12, m02 - m20, m10 - m01], dim=-1)], dim=-2)
+
+    # index of the candidate: 0/1 if m22 < eps, otherwise 2/3
+    case = 2 * (~mask_d2).long() + torch.where(mask_d2, ~mask_d0_d1, ~mask_d0_nd1).long()
+    case = case.unsqueeze(-1)
+
+    t = t.gather(-1, case)
+    q = q.gather(-2, case.unsqueeze(-1).expand(*case.shape, 4)).squeeze(-2)
+
+    return q / torch.sqrt(t) * 0.5
+
+
+def quat_to_aa(quat):
+    '''
+    :param quat: [...,4] as (w, x, y, z)
+    :return: [...,3]
+    '''
+    xyz = quat[..., 1:]
+    sin_squared_theta = (xyz * xyz).sum(-1)
+
+    sin_theta = torch.sqrt(sin_squared_theta)
+    cos_theta = quat[..., 0]
+    two_theta = 2.0 * torch.where(cos_theta < 0.0,
+                                  torch.atan2(-sin_theta, -cos_theta),
+                                  torch.atan2(sin_theta, cos_theta))
+
+    k = torch.where(sin_squared_theta > 0.0,
+                    two_theta / sin_theta,
+                    torch.full_like(sin_theta, 2.0))
+
+    return xyz * k.unsqueeze(-1)
+
+
+def rotmat_to_aa(rotmat):
+    '''
+    :param rotmat: [...,3,3]
+    :return: [...,3]
+    '''
+    return quat_to_aa(rotmat_to_quat(rotmat))
+
+
+def aa_to_quat(aa):
+    '''
+    :param aa: [...,3]
+    :return: [...,4] as (w, x, y, z)
+    '''
+    theta = aa.norm(dim=-1, keepdim=True)
+    half_theta = 0.5 * theta
+    # sin(theta/2)/theta tends to 1/2 for small angles
+    k = torch.where(theta > 1e-6,
+                    torch.sin(half_theta) / theta.clamp(min=1e-6),
+                    torch.full_like(theta, 0.5))
+
+    return torch.cat([torch.cos(half_theta), aa * k], dim=-1)
+
+
+def quat_to_rotmat(quat):
+    '''
+    :param quat: [...,4] as (w, x, y, z), does not need to be normalised
+    :return: [...,3,3]
+    '''
+    quat = F.normalize(quat, dim=-1)
+    w, x, y, z = quat.unbind(-1)
+
+    rotmat = torch.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+                          2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+                          2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], dim=-1)
+
+    return rotmat.view(*quat.shape[:-1], 3, 3)
+
+
+def aa_to_rotmat(aa, eps=1e-6):
+    '''
+    Rodrigues' formula with the first order Taylor expansion for small angles,
+    as grabnet.tools.utils.angle_axis_to_rotation_matrix but without the 4x4
+    padding.
+
+    :param aa: [...,3]
+    :return: [...,3,3]
+    '''
+    rx, ry, rz = aa.unbind(-1)
+    theta2 = (aa * aa).sum(-1)
+
+    # the clamp keeps the gradient of the unused branch finite at zero
+    theta = torch.sqrt(theta2.clamp(min=eps))
+    wx, wy, wz = (aa / (theta + eps).unsqueeze(-1)).unbind(-1)
+    cos_theta = torch.cos(theta)
+    sin_theta = torch.sin(theta)
+    one_cos = 1.0 - cos_theta
+
+    rotmat_normal = torch.stack([
+        cos_theta + wx * wx * one_cos, wx * wy * one_cos - wz * sin_theta, wy * sin_theta + wx * wz * one_cos,
+        wz * sin_theta + wx * wy * one_cos, cos_theta + wy * wy * one_cos, -wx * sin_theta + wy * wz * one_cos,
+        -wy * sin_theta + wx * wz * one_cos, wx * sin_theta + wy * wz * one_cos, cos_theta + wz * wz * one_cos],
+        dim=-1)
+
+    ones = torch.ones_like(rx)
+    rotmat_taylor = torch.stack([ones, -rz, ry,
+                                 rz, ones, -rx,
+                                 -ry, rx, ones], dim=-1)
+
+    rotmat = torch.where((theta2 > eps).unsqueeze(-1), rotmat_normal, rotmat_taylor)
+
+    return rotmat.view(*aa.shape[:-1], 3, 3)
+
+
+if __name__ == '__main__':
+
+    from grabnet.tools.utils import angle_axis_to_rotation_matrix, rotation_matrix_to_angle_axis
+    from grabnet.tools.utils import rotation_matrix_to_quaternion, CRot2rotmat
+
+    torch.manual_seed(0)
+    bs = 1024
+
+    crot = torch.randn(bs, 16, 6, dtype=torch.float64)
+    rotmat = crot_to_rotmat(crot)
+
+    homogen = F.pad(rotmat.view(-1, 3, 3), [0, 1])
+    aa = torch.cat([rotmat_to_aa(rotmat).view(-1, 3),
+                    torch.randn(bs, 3, dtype=torch.float64) * 1e-4,
+                    torch.zeros(1, 3, dtype=torch.float64)])
+
+    errors = {
+        'crot_to_rotmat': (rotmat.view(-1, 3, 3) - CRot2rotmat(crot)).abs().max(),
+        'rotmat_to_quat': (rotmat_to_quat(rotmat).view(-1, 4) - rotation_matrix_to_quaternion(homogen)).abs().max(),
+        'rotmat_to_aa': (rotmat_to_aa(rotmat).view(-1, 3) - rotation_matrix_to_angle_axis(homogen)).abs().max(),
+        'aa_to_rotmat': (aa_to_rotmat(aa) - angle_axis_to_rotation_matrix(aa)[:, :3, :3]).abs().max(),
+        'quat_to_rotmat': (quat_to_rotmat(rotmat_to_quat(rotmat)) - rotmat).abs().max(),
+        'aa_to_quat': (quat_to_rotmat(aa_to_quat(aa)) - aa_to_rotmat(aa)).abs().max(),
+        'rotmat_to_crot': (crot_to_rotmat(rotmat_to_crot(rotmat)) - rotmat).abs().max(),
+    }
+    for name, error in errors.items():
+        print('%-15s max abs error %.3e' % (name, error))
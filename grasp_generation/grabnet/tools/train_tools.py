@@ -15,13 +15,17 @@
 
 import torch
 import numpy as np
-import chamfer_distance as chd
+
+from grabnet.tools.nn_search import NNIndex
 
 def point2point_signed(
         x,
         y,
         x_normals=None,
         y_normals=None,
+        one_sided=False,
+        y_index=None,
+        backend='auto',
 ):
     """
     signed distance between two pointclouds
@@ -35,6 +39,11 @@ def point2point_signed(
             dimension D.
         x_normals: Optional FloatTensor of shape (N, P1, D).
         y_normals: Optional FloatTensor of shape (N, P2, D).
+        one_sided: If True, only the distances from x to y are computed and
+            None is returned for the two values that belong to y.
+        y_index: Optional NNIndex built from y, reused across calls when y
+            does not change, e.g. a rigid object during refinement.
+        backend: The nearest neighbour backend, see grabnet.tools.nn_search.
 
     Returns:
 
@@ -54,17 +63,32 @@ def point2point_signed(
     if y.shape[0] != N or y.shape[2] != D:
         raise ValueError("y does not have the correct shape.")
 
-    ch_dist = chd.ChamferDistance()
+    if y_index is None:
+        y_index = NNIndex(y, backend=backend)
 
-    x_near, y_near, xidx_near, yidx_near = ch_dist(x,y)
+    if one_sided:
+        xidx_near = y_index.query(x)
+    else:
+        xidx_near, yidx_near = y_index.query_both(x, backend=backend)
 
     xidx_near_expanded = xidx_near.view(N, P1, 1).expand(N, P1, D).to(torch.long)
     x_near = y.gather(1, xidx_near_expanded)
 
+    x2y = x - x_near
+
+    if y_normals is not None:
+        x_nn = y_normals.gather(1, xidx_near_expanded)
+        in_out_x = torch.bmm(x_nn.view(-1, 1, 3), x2y.view(-1, 3, 1)).view(N, -1).sign()
+        x2y_signed = x2y.norm(dim=2) * in_out_x
+    else:
+        x2y_signed = x2y.norm(dim=2)
+
+    if one_sided:
+        return None, x2y_signed, None
+
     yidx_near_expanded = yidx_near.view(N, P2, 1).expand(N, P2, D).to(torch.long)
     y_near = x.gather(1, yidx_near_expanded)
 
-    x2y = x - x_near
     y2x = y - y_near
 
     if x_normals is not None:
@@ -75,13 +99,6 @@ def point2point_signed(
     else:
         y2x_signed = y2x.norm(dim=2)
 
-    if y_normals is not None:
-        x_nn = y_normals.gather(1, xidx_near_expanded)
-        in_out_x = torch.bmm(x_nn.view(-1, 1, 3), x2y.view(-1, 3, 1)).view(N, -1).sign()
-        x2y_signed = x2y.norm(dim=2) * in_out_x
-    else:
-        x2y_signed = x2y.norm(dim=2)
-
     return y2x_signed, x2y_signed, yidx_near
 
 
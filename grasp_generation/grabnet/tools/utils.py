@@ -19,6 +19,8 @@ import logging
 
 import torch.nn.functional as F
 
+from grabnet.tools.rotations import rotmat_to_aa, aa_to_rotmat
+
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 to_cpu = lambda tensor: tensor.detach().cpu().numpy()
@@ -141,16 +143,13 @@ def rotmul(rotmat,R):
     rot = torch.matmul(torch.from_numpy(R).to(device),torch.from_numpy(rotmat).to(device))
     return rot.cpu().numpy().reshape(shape)
 
-# import torchgeometry as tgm
-# borrowed from the torchgeometry package
 def rotmat2aa(rotmat):
     '''
     :param rotmat: Nx1xnum_jointsx9
     :return: Nx1xnum_jointsx3
     '''
     batch_size = rotmat.size(0)
-    homogen_matrot = F.pad(rotmat.view(-1, 3, 3), [0,1])
-    pose = rotation_matrix_to_angle_axis(homogen_matrot).view(batch_size, 1, -1, 3).contiguous()
+    pose = rotmat_to_aa(rotmat.view(batch_size, -1, 3, 3)).view(batch_size, 1, -1, 3)
     return pose
 
 def aa2rotmat(axis_angle):
@@ -159,9 +158,13 @@ def aa2rotmat(axis_angle):
     :return: pose_matrot: Nx1xnum_jointsx9
     '''
     batch_size = axis_angle.size(0)
-    pose_body_matrot = angle_axis_to_rotation_matrix(axis_angle.reshape(-1, 3))[:, :3, :3].contiguous().view(batch_size, 1, -1, 9)
+    pose_body_matrot = aa_to_rotmat(axis_angle.reshape(batch_size, -1, 3)).view(batch_size, 1, -1, 9)
     return pose_body_matrot
 
+# import torchgeometry as tgm
+# borrowed from the torchgeometry package, kept as the reference for
+# grabnet.tools.rotations
+
 def angle_axis_to_rotation_matrix(angle_axis):
     """Convert 3d vector of axis-angle rotation to 4x4 rotation matrix
 
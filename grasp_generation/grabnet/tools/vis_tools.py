@@ -36,7 +36,7 @@ def vis_results(dorig, coarse_net, refine_net, rh_model, show_gen=True, show_rec
             drec_cnet = coarse_net(**dorig)
             verts_rh_rec_cnet = rh_model(**drec_cnet).vertices
 
-            _, h2o, _ = point2point_signed(verts_rh_rec_cnet, dorig['verts_object'])
+            _, h2o, _ = point2point_signed(verts_rh_rec_cnet, dorig['verts_object'], one_sided=True)
 
             drec_cnet['trans_rhand_f'] = drec_cnet['transl']
             drec_cnet['global_orient_rhand_rotmat_f'] = aa2rotmat(drec_cnet['global_orient']).view(-1, 3, 3)
@@ -87,7 +87,7 @@ def vis_results(dorig, coarse_net, refine_net, rh_model, show_gen=True, show_rec
             drec_cnet = coarse_net.sample_poses(dorig['bps_object'])
             verts_rh_gen_cnet = rh_model(**drec_cnet).vertices
 
-            _, h2o, _ = point2point_signed(verts_rh_gen_cnet, dorig['verts_object'].to(device))
+            _, h2o, _ = point2point_signed(verts_rh_gen_cnet, dorig['verts_object'].to(device), one_sided=True)
 
             drec_cnet['trans_rhand_f'] = drec_cnet['transl']
             drec_cnet['global_orient_rhand_rotmat_f'] = aa2rotmat(drec_cnet['global_orient']).view(-1, 3, 3)
@@ -75,22 +75,17 @@ class Trainer:
         self.load_data(cfg, inference)
 
 
+        # a single hand model serves every batch size, it broadcasts its
+        # default parameters to the batch of the incoming poses
         with torch.no_grad():
             self.rhm_train = mano.load(model_path=cfg.rhm_path,
                                        model_type='mano',
                                        num_pca_comps=45,
-                                       batch_size=cfg.batch_size,
                                        flat_hand_mean=True).to(self.device)
-            
-            rhm_train_rn = mano.load(model_path=cfg.rhm_path,
-                                       model_type='mano',
-                                       num_pca_comps=45,
-                                       batch_size=cfg.batch_size // gpu_count,
-                                       flat_hand_mean=True).to(self.device)
-            
+
         self.coarse_net = CoarseNet().to(self.device)
         self.refine_net = RefineNet().to(self.device)
-        self.refine_net.rhm_train = rhm_train_rn
+        self.refine_net.rhm_train = self.rhm_train
 
         self.LossL1 = torch.nn.L1Loss(reduction='mean')
         self.LossL2 = torch.nn.MSELoss(reduction='mean')
@@ -101,7 +96,8 @@ class Trainer:
             logger("Training on Multiple GPU's")
 
         vars_cnet = [var[1] for var in self.coarse_net.named_parameters()]
-        vars_rnet = [var[1] for var in self.refine_net.named_parameters()]
+        # the default parameters of the hand model are not trained
+        vars_rnet = [var[1] for var in self.refine_net.named_parameters() if 'rhm_train.' not in var[0]]
 
         cnet_n_params = sum(p.numel() for p in vars_cnet if p.requires_grad)
         rnet_n_params = sum(p.numel() for p in vars_rnet if p.requires_grad)
@@ -123,7 +119,10 @@ class Trainer:
             self._get_cnet_model().load_state_dict(torch.load(cfg.best_cnet, map_location=self.device), strict=False)
             logger('Restored CoarseNet model from %s' % cfg.best_cnet)
         if cfg.best_rnet is not None:
-            self._get_rnet_model().load_state_dict(torch.load(cfg.best_rnet, map_location=self.device), strict=False)
+            # the hand model comes from rhm_path, older snapshots stored it with a fixed batch size
+            rnet_state = torch.load(cfg.best_rnet, map_location=self.device)
+            rnet_state = {k: v for k, v in rnet_state.items() if not k.startswith('rhm_train.')}
+            self._get_rnet_model().load_state_dict(rnet_state, strict=False)
             logger('Restored RefineNet model from %s' % cfg.best_rnet)
 
         # weights for contact, penetration and distance losses
@@ -321,9 +320,8 @@ class Trainer:
         out_put = self.rhm_train(**drec)
         verts_rhand = out_put.vertices
 
-        rh_mesh = Meshes(verts=verts_rhand, faces=self.rh_f).to(self.device).verts_normals_packed().view(-1, 778, 3)
         h2o_gt = dorig['h2o_gt']
-        o2h_signed, h2o, _ = point2point_signed(verts_rhand, dorig['verts_object'], rh_mesh)
+        _, h2o, _ = point2point_signed(verts_rhand, dorig['verts_object'], one_sided=True)
         ######### dist loss
         loss_dist_h = 35 * (1. - self.cfg.kl_coef) * torch.mean(torch.einsum('ij,j->ij', torch.abs(h2o.abs() - h2o_gt.abs()), self.v_weights2))
         ########## verts loss
@@ -11,7 +11,8 @@ import cv2
 import mano
 import pickle
 from utils import utils
-from torch.utils.data import DataLoader
+from scipy.spatial.transform import Rotation
+import argparse
 
 
 class HO3D_diversity(data.Dataset):
@@ -27,6 +28,8 @@ class HO3D_diversity(data.Dataset):
         self.nPoint = 3000
 
         self.obj_list = list(self.obj_pc_dict.keys())
+        # [num_obj, 4, nPoint] resampled clouds with the scale channel, built once for all the grasps
+        self.obj_pc_cache = torch.stack([self[idx][1] for idx in range(len(self.obj_list))])
 
         with torch.no_grad():
             self.rh_mano = mano.load(model_path='../data/bodymodel/mano/MANO_RIGHT.pkl',
@@ -56,8 +59,76 @@ class HO3D_diversity(data.Dataset):
         return obj_id, obj_pc, origin_verts, origin_faces
 
 
+def generate_diverse_grasps(dataset, model, rh_mano, device, num_grasp=100, batch_size=256, out_dir=None):
+    '''
+    Generates num_grasp grasps for every object of dataset. Each grasp is on a randomly rotated and
+    translated copy of the resampled object cloud, as aug_translation_HO3D does for one object; the
+    (object, augmentation) pairs of all the objects are packed into batches of batch_size for
+    affordanceNet and MANO, however many objects there are.
+    :return: {obj_name: {'recon_params': [num_grasp, 61], 'rotmat': [num_grasp, 3, 3], 'trans': [num_grasp, 3],
+              'hand_verts': [num_grasp, 778, 3]}}, also written to out_dir/<obj_name>.npz when out_dir is set
+    '''
+    obj_pc_cache = dataset.obj_pc_cache.to(device)
+    obj_idx = np.repeat(np.arange(len(dataset.obj_list)), num_grasp)
+    rotmat = torch.from_numpy(Rotation.random(len(obj_idx)).as_matrix()).float()
+    trans = 0.1 * (torch.rand((len(obj_idx), 3)) - 0.5)  # range [-0.05, 0.05], as aug_translation_HO3D
+
+    recon_params, hand_verts = [], []
+    model.eval()
+    with torch.no_grad():
+        for start in range(0, len(obj_idx), batch_size):
+            idx = torch.from_numpy(obj_idx[start:start + batch_size]).to(device)
+            R = rotmat[start:start + batch_size].to(device)
+            t = trans[start:start + batch_size].to(device)
+            obj_pc = obj_pc_cache[idx]  # [B, 4, N]
+            obj_xyz = torch.bmm(R, obj_pc[:, :3]) + t.unsqueeze(2)
+            obj_pc = torch.cat((obj_xyz, obj_pc[:, 3:]), dim=1)
+            recon = model.inference(obj_pc)  # [B, 61]
+            recon_mano = rh_mano(betas=recon[:, :10], global_orient=recon[:, 10:13],
+                                 hand_pose=recon[:, 13:58], transl=recon[:, 58:])
+            recon_params.append(recon.cpu())
+            hand_verts.append(recon_mano.vertices.cpu())
+    recon_params = torch.cat(recon_params).numpy()
+    hand_verts = torch.cat(hand_verts).numpy()
+
+    results = {}
+    for k, obj_name in enumerate(dataset.obj_list):
+        rows = obj_idx == k
+        results[obj_name] = {'recon_params': recon_params[rows], 'rotmat': rotmat.numpy()[rows],
+                             'trans': trans.numpy()[rows], 'hand_verts': hand_verts[rows]}
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            np.savez(os.path.join(out_dir, obj_name + '.npz'), **results[obj_name])
+    return results
+
+
 if __name__ == '__main__':
+    # python -m dataset.HO3D_diversity_generation --affordance_model_path checkpoints/model_affordance_best_full.pth
+    from network.affordanceNet_obman_mano_vertex import affordanceNet
+    parser = argparse.ArgumentParser(description='Batched diverse grasp generation on the HO3D objects')
+    parser.add_argument("--affordance_model_path", type=str, default='checkpoints/model_affordance_best_full.pth')
+    parser.add_argument("--num_grasp", type=int, default=100)  # number of grasps per object
+    parser.add_argument("--batch_size", type=int, default=256)  # grasps per forward, across objects
+    parser.add_argument("--out_dir", type=str, default='./diverse_grasp_HO3D/')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no_cuda", action='store_true')
+    args = parser.parse_args()
+    torch.manual_seed(args.seed)
+    np.random.seed(args.seed)
+    device = torch.device("cuda" if torch.cuda.is_available() and not args.no_cuda else "cpu")
+
     dataset = HO3D_diversity()
-    dataloader = DataLoader(dataset=dataset, batch_size=1, shuffle=False, num_workers=1)
-    for idx, (obj_id, obj_pc, origin_obj_xyz, origin_obj_faces) in enumerate(dataloader):
-        print(obj_id)
\ No newline at end of file
+    model = affordanceNet(obj_inchannel=4, cvae_encoder_sizes=[1024, 512, 256], cvae_latent_size=64,
+                          cvae_decoder_sizes=[1024, 256, 61], cvae_condition_size=1024)
+    model.load_state_dict(torch.load(args.affordance_model_path, map_location=torch.device('cpu'))['network'])
+    model = model.to(device)
+    with torch.no_grad():
+        rh_mano = mano.load(model_path='../data/bodymodel/mano/MANO_RIGHT.pkl',
+                            model_type='mano',
+                            num_pca_comps=45,
+                            batch_size=1,
+                            flat_hand_mean=True).to(device)
+    results = generate_diverse_grasps(dataset, model, rh_mano, device, num_grasp=args.num_grasp,
+                                      batch_size=args.batch_size, out_dir=args.out_dir)
+    for obj_name, result in results.items():
+        print(obj_name, result['recon_params'].shape)
@@ -11,7 +11,9 @@ def load_objects_HO3D(obj_root):
     for obj_name in object_names:
         texture_path = os.path.join(obj_root, obj_name, 'textured_simple.obj')
         texture = utils.fast_load_obj(open(texture_path))[0]
-        resample_obj_xyz(texture['vertices'], texture['faces'], texture_path)
+        # resampled once and then read back from the cache next to the model
+        if not resampled_cache_valid(texture_path):
+            resample_obj_xyz(texture['vertices'], texture['faces'], texture_path)
         obj_pc[obj_name] = texture['vertices']
         obj_face[obj_name] = texture['faces']
         obj_scale[obj_name] = get_diameter(texture['vertices'])
@@ -20,12 +22,21 @@ def load_objects_HO3D(obj_root):
         
     return obj_pc, obj_face, obj_scale, obj_pc_resampled, obj_resampled_faceid
 
+def resampled_cache_valid(path):
+    """Whether the resampled points and face ids next to the model can be reused. The face id file
+    written by older versions held a second copy of the points, those are regenerated."""
+    xyz_path = path.replace('textured_simple.obj', 'resampled.npy')
+    face_id_path = path.replace('textured_simple.obj', 'resample_face_id.npy')
+    if not (os.path.exists(xyz_path) and os.path.exists(face_id_path)):
+        return False
+    return np.load(face_id_path, mmap_mode='r').ndim == 1
+
 def resample_obj_xyz(verts, faces, path):
     obj_mesh = trimesh.Trimesh(vertices=verts,
                                faces=faces)
     obj_xyz_resampled, face_id = trimesh.sample.sample_surface(obj_mesh, 3000)
     np.save(path.replace('textured_simple.obj', 'resampled.npy'), obj_xyz_resampled)
-    np.save(path.replace('textured_simple.obj', 'resample_face_id.npy'), obj_xyz_resampled)
+    np.save(path.replace('textured_simple.obj', 'resample_face_id.npy'), face_id)
 
 def get_diameter(vp):
     x = vp[:, 0].reshape((1, -1))
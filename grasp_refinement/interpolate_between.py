@@ -364,6 +364,10 @@ def main(args, model, cmap_model, device, rh_mano, rh_faces,using_contactnet=Fal
                 # verts_obj = verts_obj @ np.linalg.inv(all_generated['rotmat'][index_temp])
                 obj_pc_TTT = np.concatenate((verts_obj, np.ones((3000, 1)) * 0.2248), 1)
                 obj_pc_TTT = torch.from_numpy(obj_pc_TTT).permute(1, 0).view(1, 4, 3000).float().to(device)
+                if using_contactnet:
+                    # the object does not change during the optimisation, encode it once
+                    with torch.no_grad():
+                        obj_feat = cmap_model.encode_object(obj_pc_TTT[:, :3, :])
 
                 this_global_orient = all_generated['global_orient'][[source_frame], :]
                 # this_fullpose = all_generated['fullpose'][[index_temp], :]
@@ -458,7 +462,8 @@ def main(args, model, cmap_model, device, rh_mano, rh_faces,using_contactnet=Fal
 
                     # predict target cmap by ContactNet
                     if using_contactnet:
-                        recon_cmap = cmap_model(obj_pc_TTT[:, :3, :], recon_xyz.permute(0, 2, 1).contiguous())  # [B,3000]
+                        with torch.no_grad():
+                            recon_cmap = cmap_model.decode(obj_feat, recon_xyz.permute(0, 2, 1).contiguous())  # [B,3000]
                         recon_cmap = (recon_cmap / torch.max(recon_cmap, dim=1)[0]).detach()
                     else:
                         recon_cmap = torch.zeros((1, 3000)).to(device)
@@ -346,6 +346,10 @@ def main(args, model, cmap_model, device, rh_mano, rh_faces, inmat=None,using_co
             # Original code that causes error if .ply file has inconsistent number of vertices that are != 3000
             obj_pc_TTT = np.concatenate((verts_obj, np.ones((3000, 1)) * 0.2248), 1)
             obj_pc_TTT = torch.from_numpy(obj_pc_TTT).permute(1, 0).view(1, 4, 3000).float().to(device)
+            if using_contactnet:
+                # the object does not change during the optimisation, encode it once
+                with torch.no_grad():
+                    obj_feat = cmap_model.encode_object(obj_pc_TTT[:, :3, :])
 
             """   
             # ---  Modified code to handle dynamic number of vertices ----
@@ -409,7 +413,8 @@ def main(args, model, cmap_model, device, rh_mano, rh_faces, inmat=None,using_co
                 # predict target cmap by ContactNet
 
                 if using_contactnet:
-                    recon_cmap = cmap_model(obj_pc_TTT[:, :3, :], recon_xyz.permute(0, 2, 1).contiguous())  # [B,3000]
+                    with torch.no_grad():
+                        recon_cmap = cmap_model.decode(obj_feat, recon_xyz.permute(0, 2, 1).contiguous())  # [B,3000]
                     recon_cmap = (recon_cmap / torch.max(recon_cmap, dim=1)[0]).detach()
                 else:
                     recon_cmap = torch.zeros([1,3000]).to(device)
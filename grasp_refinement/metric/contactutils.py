@@ -47,9 +47,9 @@ def ray_triangle_intersection(ray_near, ray_dir, v123):
     return ret, retval
 
 
-def batch_mesh_contains_points(ray_origins, obj_triangles,
-                               direction=torch.Tensor([0.4395064455, 0.617598629942, 0.652231566745])):
-    """Times efficient but memory greedy !
+def batch_mesh_contains_points_dense(ray_origins, obj_triangles,
+                                     direction=torch.Tensor([0.4395064455, 0.617598629942, 0.652231566745])):
+    """Times efficient but memory greedy ! Reference for batch_mesh_contains_points.
     Computes ALL ray/triangle intersections and then counts them to determine
     if point inside mesh
     Args:
@@ -142,3 +142,120 @@ def batch_mesh_contains_points(ray_origins, obj_triangles,
     exterior = final_intersections.sum(2) % 2 == 0
     return exterior
 
+
+
+def _ray_hits_boxes(points, direction, box_min, box_max):
+    """Slab test of the rays points + t * direction, t >= 0, against boxes: (point_nb, box_nb) bool."""
+    inv_dir = 1 / direction
+    t1 = (box_min[None] - points[:, None]) * inv_dir
+    t2 = (box_max[None] - points[:, None]) * inv_dir
+    t_near = torch.min(t1, t2).max(dim=2)[0]
+    t_far = torch.max(t1, t2).min(dim=2)[0]
+    return t_far >= t_near.clamp(min=0)
+
+
+def _grid_order(triangles, grid_size):
+    """Triangle order by the cell of their centroid in a grid_size^3 grid over the mesh, so that
+    consecutive triangles are close to each other and a chunk of them has a tight bounding box."""
+    centroids = triangles.mean(dim=1)
+    low = centroids.min(dim=0)[0]
+    extent = (centroids.max(dim=0)[0] - low).clamp(min=1e-12)
+    cells = ((centroids - low) / extent * (grid_size - 1)).round().long()
+    return torch.argsort((cells[:, 0] * grid_size + cells[:, 1]) * grid_size + cells[:, 2])
+
+
+def batch_mesh_contains_points(ray_origins, obj_triangles,
+                               direction=torch.Tensor([0.4395064455, 0.617598629942, 0.652231566745]),
+                               max_pairs=2 ** 22, triangle_chunk=256, cull=True, grid_size=16):
+    """Same result as batch_mesh_contains_points_dense, in bounded memory.
+    The triangles are processed in chunks of triangle_chunk, and the points against a chunk in
+    blocks of at most max_pairs point/triangle pairs. With cull, the rays that miss the bounding box
+    of a chunk (grown by a margin well above the rounding of the intersection test) skip it, and with
+    grid_size > 0 the triangles are first ordered along a uniform grid so the chunk boxes are tight.
+    The intersection test of the remaining pairs is the dense one, operation for operation, so the
+    crossing counts and the result are the same on CPU.
+    Args:
+    ray_origins: (batch_size x point_nb x 3)
+    obj_triangles: (batch_size, triangle_nb, vertex_nb=3, vertex_coords=3)
+    Returns:
+    exterior: (batch_size, point_nb) 1 if the point is outside mesh, 0 else
+    """
+    tol_thresh = 0.0000001
+    batch_size = obj_triangles.shape[0]
+    point_nb = ray_origins.shape[1]
+    direction = direction.to(ray_origins.device)
+    # the slab test needs a finite 1 / direction
+    cull = cull and bool((direction != 0).all())
+
+    crossings = torch.zeros(batch_size, point_nb, dtype=torch.long, device=ray_origins.device)
+    for b in range(batch_size):
+        triangles = obj_triangles[b]
+        if cull and grid_size > 0:
+            triangles = triangles[_grid_order(triangles, grid_size)]
+        points = ray_origins[b]
+        margin = 1e-4 * (triangles.max() - triangles.min()).abs().item() + 1e-6
+
+        # per triangle terms, as in the dense version
+        v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        v0v1 = v1 - v0
+        v0v2 = v2 - v0
+        tri_direction = direction.view(1, 3).expand(len(triangles), 3)
+        pvec = torch.cross(tri_direction, v0v2, dim=1)
+        dets = torch.bmm(v0v1.view(-1, 1, 3), pvec.view(-1, 3, 1)).view(-1)
+        parallel = abs(dets) < tol_thresh
+        invdet = 1 / (dets + 0.1 * tol_thresh)
+
+        for start in range(0, len(triangles), triangle_chunk):
+            chunk = slice(start, start + triangle_chunk)
+            if cull:
+                chunk_tris = triangles[chunk].reshape(-1, 3)
+                box_min = chunk_tris.min(dim=0)[0] - margin
+                box_max = chunk_tris.max(dim=0)[0] + margin
+                active = torch.nonzero(_ray_hits_boxes(points, direction, box_min[None], box_max[None])[:, 0])[:, 0]
+            else:
+                active = torch.arange(point_nb, device=points.device)
+            tri_nb = len(v0[chunk])
+            point_block = max(1, max_pairs // tri_nb)
+            for p_start in range(0, len(active), point_block):
+                idx = active[p_start:p_start + point_block]
+                pair_nb = len(idx) * tri_nb
+                tvec = (points[idx, None] - v0[None, chunk]).reshape(pair_nb, 3)
+                u_val = torch.bmm(tvec.view(pair_nb, 1, 3),
+                                  pvec[chunk].repeat(len(idx), 1).view(pair_nb, 3, 1)).view(-1) \
+                    * invdet[chunk].repeat(len(idx))
+                u_correct = (u_val > 0) * (u_val < 1)
+                qvec = torch.cross(tvec, v0v1[chunk].repeat(len(idx), 1), dim=1)
+                v_val = torch.bmm(tri_direction[:1].expand(pair_nb, 3).reshape(pair_nb, 1, 3),
+                                  qvec.view(pair_nb, 3, 1)).view(-1) * invdet[chunk].repeat(len(idx))
+                v_correct = (v_val > 0) * (u_val + v_val < 1)
+                t = torch.bmm(v0v2[chunk].repeat(len(idx), 1).view(pair_nb, 1, 3),
+                              qvec.view(pair_nb, 3, 1)).view(-1) * invdet[chunk].repeat(len(idx))
+                t_pos = t >= tol_thresh
+                not_parallel = ~parallel[chunk].repeat(len(idx))
+                final_inter = v_correct * u_correct * not_parallel * t_pos
+                crossings[b].index_add_(0, idx, final_inter.view(len(idx), tri_nb).sum(1))
+    # Check if intersection number accross mesh is odd to determine if point is
+    # outside of mesh
+    return crossings % 2 == 0
+
+
+if __name__ == '__main__':
+    # checks batch_mesh_contains_points against the dense version
+    import time
+    import trimesh
+    torch.manual_seed(0)
+    meshes = [trimesh.creation.icosphere(subdivisions=3, radius=0.05),
+              trimesh.creation.box(extents=[0.1, 0.05, 0.02]),
+              trimesh.creation.capsule(height=0.08, radius=0.02)]
+    for mesh in meshes:
+        triangles = torch.from_numpy(mesh.vertices[mesh.faces]).float()[None].repeat(2, 1, 1, 1)
+        points = (torch.rand(2, 3000, 3) - 0.5) * 0.15
+        start = time.perf_counter()
+        dense = batch_mesh_contains_points_dense(points, triangles)
+        dense_time = time.perf_counter() - start
+        for kwargs in [{}, {'cull': False}, {'grid_size': 0}, {'max_pairs': 10000, 'triangle_chunk': 64}]:
+            start = time.perf_counter()
+            chunked = batch_mesh_contains_points(points, triangles, **kwargs)
+            assert torch.equal(dense, chunked), kwargs
+            print('%d faces, %s: %.3fs, dense %.3fs' % (len(mesh.faces), kwargs, time.perf_counter() - start,
+                                                       dense_time))
@@ -1,5 +1,7 @@
+from itertools import combinations
 import numpy as np
 import cvxopt as cvx
+from scipy.spatial import cKDTree
 
 
 bigfinger_vertices = [697, 698, 699, 700, 701, 702, 703, 704, 705, 706, 707,
@@ -67,12 +69,8 @@ def get_normal_face(p1, p2, p3):
 
 
 def get_distance_vertices(obj, hand):
-    n1 = len(hand)
-    n2 = len(obj)
-    matrix1 = hand[np.newaxis].repeat(n2, 0)
-    matrix2 = obj[:, np.newaxis].repeat(n1, 1)
-    dists = np.sqrt(((matrix1-matrix2)**2).sum(-1))
-    return dists.min(0)
+    """Distance of every hand vertex to its closest object vertex."""
+    return cKDTree(obj).query(hand)[0]
 
 
 def grasp_matrix(forces, torques, normals, soft_fingers=False,
@@ -162,7 +160,7 @@ def min_norm_vector_in_facet(facet, wrench_regularizer=1e-10):
     A = cvx.matrix(np.ones((1, dim)))  # sum constraint to enforce convex
     b = cvx.matrix(np.ones(1))         # combinations of vertices
 
-    sol = cvx.solvers.qp(P, q, G, h, A, b)
+    sol = cvx.solvers.qp(P, q, G, h, A, b, options={'show_progress': False})
     v = np.array(sol['x'])
     min_norm = np.sqrt(sol['primal objective'])
 
@@ -170,3 +168,133 @@ def min_norm_vector_in_facet(facet, wrench_regularizer=1e-10):
 
 
 
+
+
+# Batched versions of the functions above, for N grasps at once.
+
+FINGER_VERTICES = [indexfinger_vertices, middlefinger_vertices, fourthfinger_vertices,
+                   smallfinger_vertices, bigfinger_vertices]
+FINGER_INDEX = np.concatenate(FINGER_VERTICES)
+FINGER_STARTS = np.cumsum([0] + [len(f) for f in FINGER_VERTICES[:-1]])
+
+
+def vertex_normals(verts, faces):
+    """
+    Unit vertex normals of N meshes sharing faces, verts N x V x 3: the normalised sum of the
+    normals of the faces around each vertex, the direction get_contact_points averages.
+    """
+    tris = verts[:, faces]
+    face_normals = np.cross(tris[:, :, 1] - tris[:, :, 0], tris[:, :, 2] - tris[:, :, 0])
+    normals = np.zeros(verts.shape)
+    for k in range(3):
+        np.add.at(normals, (slice(None), faces[:, k]), face_normals)
+    return normals / np.linalg.norm(normals, axis=-1, keepdims=True)
+
+
+def get_contact_points_batch(hand_verts, hand_faces, obj_verts, threshold=0.004):
+    """
+    Contacts of N grasps, as get_contact_points.
+    Parameters
+    ----------
+    hand_verts : Nx778x3 :obj:`numpy.ndarray`
+    hand_faces : Fx3 :obj:`numpy.ndarray`
+    obj_verts : list of N Mx3 :obj:`numpy.ndarray`, the objects may have different vertex counts
+    Returns
+    -------
+    Nx5x3 :obj:`numpy.ndarray`
+        normal at the hand vertex closest to the object, for each finger
+    Nx5 :obj:`numpy.ndarray`
+        whether the finger is within threshold of the object
+    """
+    finger_verts = hand_verts[:, FINGER_INDEX]
+    dists = np.stack([cKDTree(obj).query(fingers)[0] for obj, fingers in zip(obj_verts, finger_verts)])
+    min_dists = np.minimum.reduceat(dists, FINGER_STARTS, axis=1)
+    closest = np.stack([np.asarray(finger)[np.argmin(dists[:, start:start + len(finger)], axis=1)]
+                        for finger, start in zip(FINGER_VERTICES, FINGER_STARTS)], axis=1)
+    normals = np.take_along_axis(vertex_normals(hand_verts, hand_faces), closest[:, :, np.newaxis], axis=1)
+    return normals, min_dists < threshold
+
+
+def grasp_matrices(forces, torques):
+    """Grasp matrices of N grasps, 6xK each, from Nx K x3 forces and torques (hard fingers)."""
+    if forces.shape != torques.shape:
+        raise ValueError('Need same number of forces and torques')
+    return np.concatenate([forces, torques], axis=2).transpose(0, 2, 1)
+
+
+def min_norm_vectors_in_facets(facets, mask=None, wrench_regularizer=1e-10):
+    """ Batched min_norm_vector_in_facet for the small facets of grasp quality, solved exactly by
+    enumerating the supports of the solution: on a support S the minimiser of x'Qx with sum(x) = 1 is
+    Q_SS^-1 1 / (1' Q_SS^-1 1), with value 1 / (1' Q_SS^-1 1), and the optimum is the smallest value
+    among the supports where it is non-negative. That is 2^K - 1 batched solves, fine up to K ~ 10.
+    Parameters
+    ----------
+    facets : Nx6xK :obj:`numpy.ndarray`
+        vectors forming the facets
+    mask : NxK :obj:`numpy.ndarray`
+        columns taking part in each facet, all by default
+    wrench_regularizer : float
+        small float to make quadratic program positive semidefinite
+    Returns
+    -------
+    N :obj:`numpy.ndarray`
+        minimum norm of any point in the convex hull of each facet, nan for empty facets
+    NxK :obj:`numpy.ndarray`
+        coefficients that achieve the minimum
+    """
+    num, _, dim = facets.shape
+    if mask is None:
+        mask = np.ones((num, dim), dtype=bool)
+    Q = facets.transpose(0, 2, 1) @ facets + wrench_regularizer * np.eye(dim)
+
+    best = np.full(num, np.inf)
+    coefs = np.zeros((num, dim))
+    for size in range(1, dim + 1):
+        for support in combinations(range(dim), size):
+            support = list(support)
+            y = np.linalg.solve(Q[:, support][:, :, support], np.ones((num, size, 1)))[:, :, 0]
+            value = 1 / y.sum(axis=1)
+            x = y * value[:, np.newaxis]
+            # tolerance for the supports that are only independent through the regulariser
+            better = (x >= -1e-9).all(axis=1) & mask[:, support].all(axis=1) & (value < best)
+            best[better] = value[better]
+            coefs[better] = 0
+            coefs[np.ix_(better, support)] = np.maximum(x[better], 0)
+    best[np.isinf(best)] = np.nan
+    return np.sqrt(best), coefs
+
+
+def graspit_measures(hand_verts, hand_faces, obj_verts):
+    """graspit_measure of N grasps, nan where no finger touches the object."""
+    normals, finger_is_touching = get_contact_points_batch(hand_verts, hand_faces, obj_verts)
+    G = grasp_matrices(normals, np.zeros_like(normals))
+    return min_norm_vectors_in_facets(G, finger_is_touching)[0], finger_is_touching
+
+
+if __name__ == '__main__':
+    # checks the batched functions against the per-grasp ones and cvxopt
+    import trimesh
+    rng = np.random.RandomState(0)
+    num = 50
+
+    facets = rng.randn(num, 6, 5)
+    mask = rng.rand(num, 5) < 0.7
+    mask[:, 0] = True
+    batched, _ = min_norm_vectors_in_facets(facets, mask)
+    reference = np.array([min_norm_vector_in_facet(f[:, m])[0] for f, m in zip(facets, mask)])
+    print('min norm, max abs difference to cvxopt: %.2e' % np.abs(batched - reference).max())
+    assert np.allclose(batched, reference, atol=1e-5)
+
+    # a sphere stands in for the hand, the finger vertex ids only need to exist
+    sphere = trimesh.creation.icosphere(subdivisions=4, radius=0.05)
+    hand_verts = sphere.vertices[np.newaxis] + 0.002 * rng.randn(num, len(sphere.vertices), 3)
+    obj_verts = [rng.randn(rng.randint(500, 1500), 3) * 0.05 for _ in range(num)]
+    normals, touching = get_contact_points_batch(hand_verts, sphere.faces, obj_verts)
+    measures, _ = graspit_measures(hand_verts, sphere.faces, obj_verts)
+    for i in range(num):
+        forces, torques, normals_i, touching_i = get_contact_points(hand_verts[i], sphere.faces, obj_verts[i])
+        assert np.array_equal(touching_i.astype(bool), touching[i])
+        assert np.allclose(np.array(normals_i).reshape(-1, 3), normals[i][touching[i]], atol=1e-6)
+        if len(forces):
+            assert np.isclose(graspit_measure(forces, torques, normals_i), measures[i], atol=1e-5)
+    print('contacts and measures of %d grasps match, %d with contact' % (num, np.isfinite(measures).sum()))
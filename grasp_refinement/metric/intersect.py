@@ -1,3 +1,4 @@
+import hashlib
 import json
 import numpy as np
 import trimesh
@@ -18,8 +19,8 @@ def intersect(obj_mesh, hand_mesh, engine="auto"):
     return inter_mesh
 
 
-def get_all_volumes(sample_infos, save_results_path, workers=8):
-    volumes = get_volumes_from_samples(sample_infos, workers=workers)
+def get_all_volumes(sample_infos, save_results_path, workers=8, mode="voxels"):
+    volumes = get_volumes_from_samples(sample_infos, workers=workers, mode=mode)
     volumes_clean = [volume for volume in volumes if volume is not None]
     skipped = len(volumes) - len(volumes_clean)
     with open(save_results_path, "w") as j_f:
@@ -39,9 +40,11 @@ def get_all_volumes(sample_infos, save_results_path, workers=8):
         print("Skipped {}, kept {}".format(skipped, len(volumes_clean)))
 
 
-def get_volumes_from_samples(sample_infos, workers=8):
+def get_volumes_from_samples(sample_infos, workers=8, mode="voxels"):
+    if mode == "fast":
+        return get_volumes_fast(sample_infos, workers=workers)
     volumes = Parallel(n_jobs=workers, verbose=5)(
-        delayed(get_sample_intersect_volume)(sample_info)
+        delayed(get_sample_intersect_volume)(sample_info, mode=mode)
         for sample_info in sample_infos
     )
     return volumes
@@ -75,3 +78,91 @@ def get_sample_intersect_volume(sample_info, mode="voxels"):
         volume = intersect_vox(obj_mesh, hand_mesh, pitch=0.005)
     return volume
 
+
+
+def winding_numbers(points, verts, faces, chunk=256):
+    """Generalized winding number of the mesh at each point (1 inside, 0 outside for a closed mesh,
+    close to that for the MANO hand which is open at the wrist), from the solid angles of the faces."""
+    tris = verts[faces]
+    winding = np.zeros(len(points))
+    for start in range(0, len(points), chunk):
+        rel = tris[np.newaxis] - points[start:start + chunk, np.newaxis, np.newaxis]  # [P, F, 3, 3]
+        a, b, c = rel[:, :, 0], rel[:, :, 1], rel[:, :, 2]
+        la, lb, lc = np.linalg.norm(a, axis=-1), np.linalg.norm(b, axis=-1), np.linalg.norm(c, axis=-1)
+        det = (a * np.cross(b, c)).sum(-1)
+        den = la * lb * lc + (a * b).sum(-1) * lc + (b * c).sum(-1) * la + (c * a).sum(-1) * lb
+        winding[start:start + chunk] = np.arctan2(det, den).sum(1) / (2 * np.pi)
+    return winding
+
+
+def mesh_contains_fast(verts, faces, points):
+    """Inside test of points against the mesh by winding number, only for the points in its bounding box."""
+    inside = np.zeros(len(points), dtype=bool)
+    in_box = np.all((points >= verts.min(0)) & (points <= verts.max(0)), axis=1)
+    if in_box.any():
+        inside[in_box] = np.abs(winding_numbers(points[in_box], verts, faces)) > 0.5
+    return inside
+
+
+def _volumes_chunk(hand_verts, hand_faces, obj_points, obj_offsets, obj_index, samples, pitch):
+    return [float(mesh_contains_fast(hand_verts[i], hand_faces,
+                                     obj_points[obj_offsets[obj_index[i]]:obj_offsets[obj_index[i] + 1]]).sum()
+                  * np.power(pitch, 3)) for i in samples]
+
+
+def get_volumes_fast(sample_infos, workers=8, pitch=0.005):
+    """
+    Same volumes as the "voxels" mode of get_sample_intersect_volume, for many samples:
+    - the object is voxelized once per distinct object mesh (object and rotation), not per sample,
+    - the voxel centres are tested against the hand by winding number instead of ray casting,
+    - the workers get the hands and voxel centres as stacked arrays, which joblib passes as shared
+      memory maps, and a chunk of sample indices each instead of pickled sample dicts.
+    All the samples need the same hand faces (MANO).
+    """
+    hand_faces = np.asarray(sample_infos[0]["hand_faces"])
+    if not all(np.array_equal(sample_info["hand_faces"], hand_faces) for sample_info in sample_infos):
+        raise ValueError("get_volumes_fast needs the same hand faces for all the samples")
+    hand_verts = np.stack([sample_info["hand_verts"] for sample_info in sample_infos]).astype(np.float64)
+
+    obj_keys, obj_points, obj_index = {}, [], []
+    for sample_info in sample_infos:
+        obj_verts = np.ascontiguousarray(sample_info["obj_verts"])
+        obj_faces = np.ascontiguousarray(sample_info["obj_faces"])
+        key = hashlib.sha1(obj_verts.tobytes() + obj_faces.tobytes()).hexdigest()
+        if key not in obj_keys:
+            obj_keys[key] = len(obj_points)
+            obj_mesh = trimesh.Trimesh(vertices=obj_verts, faces=obj_faces)
+            obj_points.append(obj_mesh.voxelized(pitch=pitch).points)
+        obj_index.append(obj_keys[key])
+    obj_offsets = np.cumsum([0] + [len(points) for points in obj_points])
+    obj_points = np.concatenate(obj_points).astype(np.float64)
+    obj_index = np.array(obj_index)
+
+    chunks = np.array_split(np.arange(len(sample_infos)), max(1, min(len(sample_infos), workers * 4)))
+    volumes = Parallel(n_jobs=workers, verbose=5, max_nbytes="1M", mmap_mode="r")(
+        delayed(_volumes_chunk)(hand_verts, hand_faces, obj_points, obj_offsets, obj_index, chunk, pitch)
+        for chunk in chunks
+    )
+    return [volume for chunk_volumes in volumes for volume in chunk_volumes]
+
+
+if __name__ == "__main__":
+    # checks the fast mode against the voxels mode, on spheres standing in for the hand and boxes for the object
+    import time
+    rng = np.random.RandomState(0)
+    hand = trimesh.creation.icosphere(subdivisions=3, radius=0.04)
+    objects = [trimesh.creation.box(extents=extents) for extents in [[0.1, 0.04, 0.02], [0.05, 0.05, 0.15]]]
+    sample_infos = []
+    for i in range(40):
+        obj = objects[i % len(objects)]
+        sample_infos.append({"hand_verts": hand.vertices + rng.uniform(-0.05, 0.05, 3), "hand_faces": hand.faces,
+                             "obj_verts": obj.vertices, "obj_faces": obj.faces})
+    start = time.perf_counter()
+    voxels = get_volumes_from_samples(sample_infos, workers=4)
+    voxels_time = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = get_volumes_from_samples(sample_infos, workers=4, mode="fast")
+    fast_time = time.perf_counter() - start
+    diff = np.abs(np.array(voxels) - np.array(fast))
+    print("voxels %.2fs, fast %.2fs, max abs difference %g m3, %d of %d samples differ"
+          % (voxels_time, fast_time, diff.max(), (diff > 0).sum(), len(diff)))
@@ -32,10 +32,27 @@ class pointnet_reg(nn.Module):
         :param hand: hand pc [B, D, 778]
         :return: regressed cmap
         '''
-        batchsize = x.size()[0]
+        return self.decode(self.encode_object(x), hand)
+
+    def encode_object(self, x):
+        '''
+        Object half of forward, it only depends on the object: compute it once per object and pass it
+        to decode for every hand of the refinement.
+        :param x: obj pc [B, D, N]
+        :return: global+point feature of object [B, 1088, N]
+        '''
+        x, trans, trans_feat = self.feat_o(x)
+        return x
+
+    def decode(self, x, hand):
+        '''
+        :param x: object feature from encode_object [B, 1088, N], or [1, 1088, N] shared by all the hands
+        :param hand: hand pc [B, D, 778]
+        :return: regressed cmap [B, N]
+        '''
+        batchsize = hand.size()[0]
         n_pts = x.size()[2]
-        # for obj
-        x, trans, trans_feat = self.feat_o(x)  # x: [B, 1088, N] global+point feature of object
+        x = x.expand(batchsize, -1, -1)
         # for hand
         hand, trans2, trans_feat2 = self.feat_h(hand)  # hand: [B, 1088, 778] global+point feature of hand
         # fuse feature of object and hand
@@ -52,3 +69,37 @@ class pointnet_reg(nn.Module):
         x = x.view(batchsize, n_pts)  # n_pts  [B, N]
         return x
 
+
+if __name__ == '__main__':
+    # python -m network.cmapnet_objhand: cached object features against the fused forward, as in the
+    # test-time refinement (one object, the hand changing every step)
+    import time
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = pointnet_reg(with_rgb=False).to(device).eval()
+    obj_pc = torch.randn(1, 3, 3000, device=device)
+    hands = torch.randn(50, 1, 3, 778, device=device)
+
+    def timed(step):
+        with torch.no_grad():
+            step(hands[0])
+            if device == 'cuda':
+                torch.cuda.synchronize()
+            start = time.perf_counter()
+            outs = [step(hand) for hand in hands]
+            if device == 'cuda':
+                torch.cuda.synchronize()
+        return torch.cat(outs), (time.perf_counter() - start) / len(hands) * 1000
+
+    fused, fused_ms = timed(lambda hand: model(obj_pc, hand))
+    with torch.no_grad():
+        obj_feat = model.encode_object(obj_pc)
+    cached, cached_ms = timed(lambda hand: model.decode(obj_feat, hand))
+    print('max abs difference: %g' % (fused - cached).abs().max().item())
+    print('per step on %s: fused %.2f ms, cached object features %.2f ms' % (device, fused_ms, cached_ms))
+
+    # all the grasps of an object in one batch against the one object feature
+    batch_hands = hands[:, 0]
+    with torch.no_grad():
+        fused = model(obj_pc.expand(len(batch_hands), -1, -1), batch_hands)
+        cached = model.decode(obj_feat, batch_hands)
+    print('batch of %d hands, max abs difference: %g' % (len(batch_hands), (fused - cached).abs().max().item()))
@@ -2,6 +2,8 @@ import torch
 from pytorch3d.ops.knn import knn_gather, knn_points
 import numpy as np
 import time
+# chunked, memory-bounded version of the ray casting test that used to be copied here
+from metric.contactutils import batch_mesh_contains_points
 
 
 def get_NN(src_xyz, trg_xyz, k=1):
@@ -68,103 +70,3 @@ def get_faces_xyz(faces_idx, xyz):
     xyz_replicated = xyz.cpu().unsqueeze(1).repeat(1,N1,1,1)  # use cpu to save CUDA memory
     faces_idx_replicated = faces_idx.unsqueeze(-1).repeat(1,1,1,D).type(torch.LongTensor)
     return torch.gather(xyz_replicated, dim=2, index=faces_idx_replicated).to(faces_idx.device)
-
-def batch_mesh_contains_points(
-    ray_origins, # point cloud as origin of rays
-    obj_triangles,
-    direction=torch.Tensor([0.4395064455, 0.617598629942, 0.652231566745]),
-):
-    """Times efficient but memory greedy !
-    Computes ALL ray/triangle intersections and then counts them to determine
-    if point inside mesh
-    Args:
-    ray_origins: (batch_size x point_nb x 3)
-    obj_triangles: (batch_size, triangle_nb, vertex_nb=3, vertex_coords=3)
-    tol_thresh: To determine if ray and triangle are //
-    Returns:
-    exterior: (batch_size, point_nb) 1 if the point is outside mesh, 0 else
-    """
-    tol_thresh = 0.0000001
-    batch_size = obj_triangles.shape[0]
-    triangle_nb = obj_triangles.shape[1]
-    point_nb = ray_origins.shape[1]
-
-    # Batch dim and triangle dim will flattened together
-    batch_points_size = batch_size * triangle_nb
-    # Direction is random but shared
-    v0, v1, v2 = obj_triangles[:, :, 0], obj_triangles[:, :, 1], obj_triangles[:, :, 2]
-    # Get edges
-    v0v1 = v1 - v0
-    v0v2 = v2 - v0
-
-    direction = direction.to(ray_origins.device)
-    # Expand needed vectors
-    batch_direction = direction.view(1, 1, 3).expand(batch_size, triangle_nb, 3)
-
-    # Compute ray/triangle intersections
-    pvec = torch.cross(batch_direction, v0v2, dim=2)
-    dets = torch.bmm(
-        v0v1.view(batch_points_size, 1, 3), pvec.view(batch_points_size, 3, 1)
-    ).view(batch_size, triangle_nb)
-
-    # Check if ray and triangle are parallel
-    parallel = abs(dets) < tol_thresh
-    invdet = 1 / (dets + 0.1 * tol_thresh)
-
-    # Repeat mesh info as many times as there are rays
-    triangle_nb = v0.shape[1]
-    v0 = v0.repeat(1, point_nb, 1)
-    v0v1 = v0v1.repeat(1, point_nb, 1)
-    v0v2 = v0v2.repeat(1, point_nb, 1)
-    hand_verts_repeated = (
-        ray_origins.view(batch_size, point_nb, 1, 3)
-        .repeat(1, 1, triangle_nb, 1)
-        .view(ray_origins.shape[0], triangle_nb * point_nb, 3)
-    )
-    pvec = pvec.repeat(1, point_nb, 1)
-    invdet = invdet.repeat(1, point_nb)
-    tvec = hand_verts_repeated - v0
-    u_val = (
-        torch.bmm(
-            tvec.view(batch_size * tvec.shape[1], 1, 3),
-            pvec.view(batch_size * tvec.shape[1], 3, 1),
-        ).view(batch_size, tvec.shape[1])
-        * invdet
-    )
-    # Check ray intersects inside triangle
-    u_correct = (u_val > 0) * (u_val < 1)
-    qvec = torch.cross(tvec, v0v1, dim=2)
-
-    batch_direction = batch_direction.repeat(1, point_nb, 1)
-    v_val = (
-        torch.bmm(
-            batch_direction.view(batch_size * qvec.shape[1], 1, 3),
-            qvec.view(batch_size * qvec.shape[1], 3, 1),
-        ).view(batch_size, qvec.shape[1])
-        * invdet
-    )
-    v_correct = (v_val > 0) * (u_val + v_val < 1)
-    t = (
-        torch.bmm(
-            v0v2.view(batch_size * qvec.shape[1], 1, 3),
-            qvec.view(batch_size * qvec.shape[1], 3, 1),
-        ).view(batch_size, qvec.shape[1])
-        * invdet
-    )
-    # Check triangle is in front of ray_origin along ray direction
-    t_pos = t >= tol_thresh
-    parallel = parallel.repeat(1, point_nb)
-    # # Check that all intersection conditions are met
-    try:
-        not_parallel = 1 - parallel
-    except:
-        not_parallel = parallel==False
-    final_inter = v_correct * u_correct * not_parallel * t_pos
-    # Reshape batch point/vertices intersection matrix
-    # final_intersections[batch_idx, point_idx, triangle_idx] == 1 means ray
-    # intersects triangle
-    final_intersections = final_inter.view(batch_size, point_nb, triangle_nb)
-    # Check if intersection number accross mesh is odd to determine if point is
-    # outside of mesh
-    exterior = final_intersections.sum(2) % 2 == 0
-    return exterior
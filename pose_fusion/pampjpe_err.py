@@ -46,7 +46,6 @@ def compute_similarity_transform(S1, S2):
 
     # 5. Recover scale.
     scale = 1#np.trace(R.dot(K)) / var1
-    print(scale)
 
     # 6. Recover translation.
     t = mu2 - scale*(R.dot(mu1))
@@ -59,13 +58,70 @@ def compute_similarity_transform(S1, S2):
 
     return S1_hat
 
-def compute_similarity_transform_batch(S1, S2):
-    """Batched version of compute_similarity_transform."""
+def compute_similarity_transform_batch_loop(S1, S2):
+    """Batched version of compute_similarity_transform, one sample at a time. Reference for
+    compute_similarity_transform_batch."""
     S1_hat = np.zeros_like(S1)
     for i in range(S1.shape[0]):
         S1_hat[i] = compute_similarity_transform(S1[i], S2[i])
     return S1_hat
 
+def compute_similarity_transform_batch(S1, S2, S3=None, with_scale=False):
+    """Batched version of compute_similarity_transform, as array operations over
+    S1, S2 (B x N x 3). The transform taking S1 to S2 is applied to S3 (B x M x 3)
+    when given, as compute_similarity_transform_as3 does. Like the single-sample
+    version the scale is fixed to 1 unless with_scale.
+    """
+    if S3 is None:
+        S3 = S1
+    # 1. Remove mean.
+    mu1 = S1.mean(axis=1, keepdims=True)
+    mu2 = S2.mean(axis=1, keepdims=True)
+    X1 = S1 - mu1
+    X2 = S2 - mu2
+
+    # 2. The outer products of X1 and X2, B x 3 x 3.
+    K = np.einsum('bni,bnj->bij', X1, X2)
+
+    # 3. R = V*Z*U' from the singular vectors of K, Z fixing det(R)=1.
+    U, s, Vh = np.linalg.svd(K)
+    V = Vh.transpose(0, 2, 1)
+    Z = np.tile(np.eye(U.shape[1]), (len(K), 1, 1))
+    Z[:, -1, -1] *= np.sign(np.linalg.det(U @ Vh))
+    R = V @ Z @ U.transpose(0, 2, 1)
+
+    # 4. Recover scale.
+    if with_scale:
+        scale = np.trace(R @ K, axis1=1, axis2=2) / np.sum(X1 ** 2, axis=(1, 2))
+        scale = scale[:, None, None]
+    else:
+        scale = 1
+
+    # 5. Recover translation, t = mu2 - scale*R*mu1, and apply.
+    return scale * (S3 - mu1) @ R.transpose(0, 2, 1) + mu2
+
+def compute_similarity_transform_batch_torch(S1, S2, S3=None, with_scale=False):
+    """compute_similarity_transform_batch for torch tensors B x N x 3, on their device."""
+    import torch
+    if S3 is None:
+        S3 = S1
+    mu1 = S1.mean(dim=1, keepdim=True)
+    mu2 = S2.mean(dim=1, keepdim=True)
+    X1 = S1 - mu1
+    X2 = S2 - mu2
+    K = X1.transpose(1, 2) @ X2
+    U, s, Vh = torch.linalg.svd(K)
+    V = Vh.transpose(1, 2)
+    Z = torch.eye(U.shape[1], dtype=K.dtype, device=K.device).repeat(len(K), 1, 1)
+    Z[:, -1, -1] *= torch.sign(torch.linalg.det(U @ Vh))
+    R = V @ Z @ U.transpose(1, 2)
+    if with_scale:
+        scale = (R @ K).diagonal(dim1=1, dim2=2).sum(-1) / (X1 ** 2).sum(dim=(1, 2))
+        scale = scale[:, None, None]
+    else:
+        scale = 1
+    return scale * (S3 - mu1) @ R.transpose(1, 2) + mu2
+
 def reconstruction_error(S1, S2, reduction='mean'):
     """Do Procrustes alignment and compute reconstruction error."""
     S1_hat = compute_similarity_transform_batch(S1, S2)
@@ -136,7 +192,6 @@ def compute_similarity_transform_as3(S1, S2, S3):
 
     # 5. Recover scale.
     scale = 1#np.trace(R.dot(K)) / var1
-    print(scale)
 
     # 6. Recover translation.
     t = mu2 - scale*(R.dot(mu1))
@@ -154,4 +209,71 @@ def get_alignMesh_as2(S1, S2, S3):
     S1_hat = compute_similarity_transform_as3(S1, S2, S3)
 
 
-    return S1_hat
\ No newline at end of file
+    return S1_hat
+
+
+def pose_errors_batch(pred_joints, gt_joints, pred_verts=None, gt_verts=None, with_scale=False):
+    """Per-sample MPJPE, PA-MPJPE and, with the meshes, MPVPE and PA-MPVPE (B arrays, in the input unit)
+    of B x N x 3 predictions against the ground truth."""
+    errors = {
+        'mpjpe': np.sqrt(((pred_joints - gt_joints) ** 2).sum(axis=-1)).mean(axis=-1),
+        'pa_mpjpe': np.sqrt(((compute_similarity_transform_batch(pred_joints, gt_joints, with_scale=with_scale)
+                              - gt_joints) ** 2).sum(axis=-1)).mean(axis=-1),
+    }
+    if pred_verts is not None:
+        errors['mpvpe'] = np.sqrt(((pred_verts - gt_verts) ** 2).sum(axis=-1)).mean(axis=-1)
+        errors['pa_mpvpe'] = np.sqrt(((compute_similarity_transform_batch(pred_verts, gt_verts, with_scale=with_scale)
+                                       - gt_verts) ** 2).sum(axis=-1)).mean(axis=-1)
+    return errors
+
+def evaluate_files(pred_joints, gt_joints, pred_verts=None, gt_verts=None, chunk=4096, with_scale=False):
+    """Streams the .npy files (B x N x 3, memory mapped) through pose_errors_batch chunk by chunk and
+    returns the mean of every error over all the samples."""
+    arrays = [np.load(path, mmap_mode='r') if path is not None else None
+              for path in [pred_joints, gt_joints, pred_verts, gt_verts]]
+    sums, num = {}, 0
+    for start in range(0, len(arrays[0]), chunk):
+        batch = [np.asarray(a[start:start + chunk], dtype=np.float64) if a is not None else None for a in arrays]
+        for name, err in pose_errors_batch(*batch, with_scale=with_scale).items():
+            sums[name] = sums.get(name, 0.) + err.sum()
+        num += len(batch[0])
+    return {name: value / num for name, value in sums.items()}
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='MPJPE, PA-MPJPE and PA-MPVPE of predictions saved as .npy files')
+    parser.add_argument('--pred_joints', type=str)
+    parser.add_argument('--gt_joints', type=str)
+    parser.add_argument('--pred_verts', type=str, default=None)
+    parser.add_argument('--gt_verts', type=str, default=None)
+    parser.add_argument('--chunk', type=int, default=4096)
+    parser.add_argument('--with_scale', action='store_true')
+    args = parser.parse_args()
+
+    if args.pred_joints is None:
+        # no inputs: check the batched versions against the loop on random poses
+        rng = np.random.RandomState(0)
+        S2 = rng.randn(2000, 21, 3)
+        S1 = S2 + 0.1 * rng.randn(2000, 21, 3)
+        start = time.time()
+        looped = compute_similarity_transform_batch_loop(S1, S2)
+        looped_time = time.time() - start
+        start = time.time()
+        batched = compute_similarity_transform_batch(S1, S2)
+        print('numpy: max abs difference %.2e, loop %.3fs, batched %.3fs'
+              % (np.abs(looped - batched).max(), looped_time, time.time() - start))
+        assert np.allclose(looped, batched, atol=1e-6)
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        if torch is not None:
+            batched = compute_similarity_transform_batch_torch(torch.from_numpy(S1), torch.from_numpy(S2)).numpy()
+            print('torch: max abs difference %.2e' % np.abs(looped - batched).max())
+            assert np.allclose(looped, batched, atol=1e-6)
+    else:
+        for name, value in evaluate_files(args.pred_joints, args.gt_joints, args.pred_verts, args.gt_verts,
+                                          chunk=args.chunk, with_scale=args.with_scale).items():
+            print('%s: %.6f' % (name, value))
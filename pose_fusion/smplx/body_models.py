@@ -36,7 +36,7 @@ from .utils import (
     SMPLXOutput,
     MANOOutput,
     FLAMEOutput,
-    find_joint_kin_chain)
+    find_joint_kin_chain, load_model_data)
 from .vertex_joint_selector import VertexJointSelector
 
 
@@ -133,9 +133,7 @@ class SMPL(nn.Module):
             assert osp.exists(smpl_path), 'Path {} does not exist!'.format(
                 smpl_path)
 
-            with open(smpl_path, 'rb') as smpl_file:
-                data_struct = Struct(**pickle.load(smpl_file,
-                                                   encoding='latin1'))
+            data_struct = Struct(**load_model_data(smpl_path, ext='pkl'))
 
         super(SMPL, self).__init__()
         self.batch_size = batch_size
@@ -575,13 +573,7 @@ class SMPLH(SMPL):
             assert osp.exists(smplh_path), 'Path {} does not exist!'.format(
                 smplh_path)
 
-            if ext == 'pkl':
-                with open(smplh_path, 'rb') as smplh_file:
-                    model_data = pickle.load(smplh_file, encoding='latin1')
-            elif ext == 'npz':
-                model_data = np.load(smplh_path, allow_pickle=True)
-            else:
-                raise ValueError('Unknown extension: {}'.format(ext))
+            model_data = load_model_data(smplh_path, ext=ext)
             data_struct = Struct(**model_data)
 
         if vertex_ids is None:
@@ -969,13 +961,7 @@ class SMPLX(SMPLH):
         assert osp.exists(smplx_path), 'Path {} does not exist!'.format(
             smplx_path)
 
-        if ext == 'pkl':
-            with open(smplx_path, 'rb') as smplx_file:
-                model_data = pickle.load(smplx_file, encoding='latin1')
-        elif ext == 'npz':
-            model_data = np.load(smplx_path, allow_pickle=True)
-        else:
-            raise ValueError('Unknown extension: {}'.format(ext))
+        model_data = load_model_data(smplx_path, ext=ext)
 
         data_struct = Struct(**model_data)
 
@@ -1557,13 +1543,7 @@ class MANO(SMPL):
             assert osp.exists(mano_path), 'Path {} does not exist!'.format(
                 mano_path)
 
-            if ext == 'pkl':
-                with open(mano_path, 'rb') as mano_file:
-                    model_data = pickle.load(mano_file, encoding='latin1')
-            elif ext == 'npz':
-                model_data = np.load(mano_path, allow_pickle=True)
-            else:
-                raise ValueError('Unknown extension: {}'.format(ext))
+            model_data = load_model_data(mano_path, ext=ext)
             data_struct = Struct(**model_data)
 
         if vertex_ids is None:
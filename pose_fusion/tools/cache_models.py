@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems and the Max Planck Institute for Biological
+# Cybernetics. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import argparse
+import os.path as osp
+
+from smplx.utils import cache_model_data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input-models', dest='input_models', nargs='+',
+                        required=True, type=str,
+                        help='The path to the models that will be cached')
+
+    args = parser.parse_args()
+
+    for input_model in args.input_models:
+        ext = osp.splitext(input_model)[1][1:]
+        cache_path = cache_model_data(input_model, ext=ext)
+        print('Cached {} to {}'.format(input_model, cache_path))
@@ -1,9 +1,10 @@
 
-import pyrender
+from overlay_renderer import OverlayRenderer, camera_pose, object_pose
 import torch
 import cv2
 from os.path import join, dirname
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 import os
 import trimesh
 import pandas
@@ -23,6 +24,10 @@ DARASET_ROOT = '/home/ray/code_release/pov_surgery_dataset/POV_Surgery_data'
 INFO_SHEET_PATH = join(DARASET_ROOT,'POV_Surgery_info.csv')
 MANO_PATH = '../data/bodymodel/mano/MANO_RIGHT.pkl'
 REPRO_DIR = '/home/ray/code_release/pov_surgery_dataset/temp_repro_pyrender'
+RENDER_SCALE = 1.0 # render at this fraction of 1920x1080, the overlay is upsampled to the image
+MANO_CHUNK = 64 # frames per MANO forward, also how far the loading runs ahead of the rendering
+IO_THREADS = 8 # threads reading the annotations and images
+WRITE_THREADS = 4 # threads encoding and writing the jpgs
 ###################################################################################
 info_sheet = pandas.read_csv(INFO_SHEET_PATH)
 SCALPE_OFFSET = [0.04805371, 0 ,0]
@@ -45,120 +50,102 @@ rh_faces = torch.from_numpy(rh_mano.faces.astype(np.int32)).view(1, -1, 3).to(de
 
 
 
-material_hand = pyrender.MetallicRoughnessMaterial(
-    metallicFactor=0.0,
-    alphaMode='OPAQUE',
-    baseColorFactor=(255 / 255, 153 / 255, 255/255 ,1.0)  # hand
-)
-material_object = pyrender.MetallicRoughnessMaterial(
-    metallicFactor=0.0,
-    alphaMode='OPAQUE',
-    baseColorFactor=(51/255, 255/255, 255/255, 1.0)  # object
-)
+# one GL context and scene for all the frames
+renderer = OverlayRenderer(rh_mano.faces, scale=RENDER_SCALE)
 
 
 
-for i_seq, rec_name in enumerate(info_sheet['Sequence Name']):
-
-
-    grasp_name, grasp_id = info_sheet['Grasp Sequence'][i_seq].split('/')
-
-
-    dataset_name = info_sheet['OUT_seq'][i_seq]
-    this_mano_dir = join(DARASET_ROOT,'annotation', dataset_name)
-
-    this_repro_dir = join(REPRO_DIR, dataset_name)
-    os.makedirs(this_repro_dir,exist_ok=True)
-
-    COLOR_NAME = dataset_name
-
-
-    for i in tqdm(range(1, 5000)):
-        this_pkl = join(this_mano_dir, str(i).zfill(5) + '.pkl')
-        if not os.path.exists(this_pkl):
-            continue
-        img_fn_cropped = join(this_repro_dir, str(i).zfill(5) + '.jpg')
-        if os.path.exists(img_fn_cropped):
-            continue
-        frame_anno = pickle.load(open(this_pkl,'rb'))
-
-        rot_unique = trimesh.transformations.rotation_matrix(
-            np.radians(90), [1, 0, 0])
-        rot_only = rot_unique[:3,:3]
+def load_frame(this_mano_dir, color_dir, frame_name):
+    frame_anno = pickle.load(open(join(this_mano_dir, frame_name + '.pkl'), 'rb'))
+    image = cv2.imread(join(color_dir, frame_name + '.jpg'))
+    return frame_anno, image
 
-        hand_dict = frame_anno['mano']
-        for key_i in hand_dict.keys():
-            hand_dict[key_i] = torch.from_numpy(hand_dict[key_i]).float().to(device)
 
-        this_hand = rh_mano(**hand_dict)
-        hand_vert = this_hand.vertices.detach().cpu().squeeze(0).numpy()
+def load_chunk(io_pool, this_mano_dir, color_dir, frame_names):
+    return io_pool.map(lambda frame_name: load_frame(this_mano_dir, color_dir, frame_name), frame_names)
 
 
+def hand_vertices(frame_annos):
+    """MANO vertices of a chunk of frames, in one forward."""
+    keys = frame_annos[0]['mano'].keys()
+    hand_dict = {key_i: torch.from_numpy(np.concatenate([anno['mano'][key_i] for anno in frame_annos])).float().to(device)
+                 for key_i in keys}
+    with torch.no_grad():
+        return rh_mano(**hand_dict).vertices.cpu().numpy()
 
-        transformed_mesh_shifted = hand_vert @ frame_anno['grab2world_R'] + frame_anno['grab2world_T']
 
-        mesh_hand = trimesh.Trimesh(vertices=transformed_mesh_shifted,
-                               faces=rh_mano.faces)
-        mesh_object = trimesh.load(join(DARASET_ROOT,'tool_mesh', grasp_name.split('_')[0] +'.stl'))
+def write_frame(path, image):
+    """Writes to a temporary name and renames it into place, so a jpg cut off by a crash is not taken as done."""
+    tmp_path = path[:-4] + '.part.jpg'
+    cv2.imwrite(tmp_path, image)
+    os.replace(tmp_path, path)
 
-        if 'diskplacer' in grasp_name:
-            mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(DISKPLACER_OFFSET)
-        elif 'friem' in grasp_name:
-            mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(FRIEM_OFFSET)
-        elif 'scalpel' in grasp_name:
-            mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(SCALPE_OFFSET)
 
-        mesh_object.vertices = mesh_object.vertices @ frame_anno['base_object_rot'].T
-        mesh_object.vertices = mesh_object.vertices @  frame_anno['grab2world_R'] + frame_anno['grab2world_T']
+io_pool = ThreadPoolExecutor(IO_THREADS)
+write_pool = ThreadPoolExecutor(WRITE_THREADS)
+pending_writes = []
 
-        this_rot = frame_anno['cam_rot']
-
-
-        this_transl = frame_anno['cam_transl']
-
-        if True:
-            mesh1 = pyrender.Mesh.from_trimesh(mesh_hand, material=material_hand)
-            mesh2 = pyrender.Mesh.from_trimesh(mesh_object, material=material_object)
-            scene = pyrender.Scene()
-            scene.add(mesh1)
-            scene.add(mesh2)
-
-            camera = pyrender.camera.IntrinsicsCamera(1198.4395, 1198.4395, 960, 175.2, znear=0.001, zfar=1000.0,
-                                                      name=None)
-
-            camera_pose = np.eye(4)
-            camera_pose[:3, 3] = this_transl
-            camera_pose[:3, :3] = this_rot
-
-            scene.add(camera, pose=camera_pose)
-
-            pl = pyrender.PointLight(color=[1.0, 1.0, 1.0], intensity=2.0)
-            sl = pyrender.SpotLight(color=[1.0, 1.0, 1.0], intensity=2.0, innerConeAngle=0.05, outerConeAngle=0.5)
-            dl = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=2.0)
-            scene.add(pl, camera_pose)
-            scene.add(sl, camera_pose)
-            scene.add(dl, camera_pose)
-            light = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=2)
-            light_pose = np.eye(4)
-
-            light_pose[:3, 3] = np.array([0, -1, 1])
-            scene.add(light, pose=light_pose)
-
-            light_pose[:3, 3] = np.array([0, 1, 1])
-            scene.add(light, pose=light_pose)
+for i_seq, rec_name in enumerate(info_sheet['Sequence Name']):
 
-            light_pose[:3, 3] = np.array([1, 1, 2])
-            scene.add(light, pose=light_pose)
 
-            r = pyrender.OffscreenRenderer(1920, 1080)
-            color, depth = r.render(scene)
-            # color = color.astype(np.float32) / 255.0
-            valid_mask = (depth > 0)[:, :, None]
-            image_1 = cv2.imread(join(DARASET_ROOT,'color', COLOR_NAME, str(i).zfill(5) + '.jpg'))
+    grasp_name, grasp_id = info_sheet['Grasp Sequence'][i_seq].split('/')
 
-            color = (color[:, :, :3] * valid_mask + (1 - valid_mask) * image_1)
 
-            img_fn_cropped = join(this_repro_dir, str(i).zfill(5) + '.jpg')
-            cv2.imwrite(img_fn_cropped, color)
+    dataset_name = info_sheet['OUT_seq'][i_seq]
+    this_mano_dir = join(DARASET_ROOT,'annotation', dataset_name)
 
+    this_repro_dir = join(REPRO_DIR, dataset_name)
+    os.makedirs(this_repro_dir,exist_ok=True)
 
+    COLOR_NAME = dataset_name
+    color_dir = join(DARASET_ROOT, 'color', COLOR_NAME)
+
+    # resume index: annotated frames without an output yet, from one listing of each directory
+    # (the .part.jpg left by an interrupted write do not match an annotated frame name)
+    if not os.path.isdir(this_mano_dir):
+        continue
+    annotated = set(fn[:-4] for fn in os.listdir(this_mano_dir) if fn.endswith('.pkl'))
+    done = set(fn[:-4] for fn in os.listdir(this_repro_dir) if fn.endswith('.jpg'))
+    todo = annotated - done
+    frame_names = [str(i).zfill(5) for i in range(1, 5000) if str(i).zfill(5) in todo]
+    if len(frame_names) == 0:
+        continue
+
+    # the tool is uploaded once per sequence and then only moved
+    mesh_object = trimesh.load(join(DARASET_ROOT,'tool_mesh', grasp_name.split('_')[0] +'.stl'))
+    if 'diskplacer' in grasp_name:
+        mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(DISKPLACER_OFFSET)
+    elif 'friem' in grasp_name:
+        mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(FRIEM_OFFSET)
+    elif 'scalpel' in grasp_name:
+        mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(SCALPE_OFFSET)
+    renderer.set_object(mesh_object)
+
+    chunks = [frame_names[k:k + MANO_CHUNK] for k in range(0, len(frame_names), MANO_CHUNK)]
+    next_chunk = load_chunk(io_pool, this_mano_dir, color_dir, chunks[0])
+    with tqdm(total=len(frame_names), desc=dataset_name) as progress:
+        for i_chunk, chunk in enumerate(chunks):
+            frames = list(next_chunk)
+            # the next chunk is read while this one is rendered
+            if i_chunk + 1 < len(chunks):
+                next_chunk = load_chunk(io_pool, this_mano_dir, color_dir, chunks[i_chunk + 1])
+            hand_verts = hand_vertices([frame_anno for frame_anno, _ in frames])
+
+            for frame_name, (frame_anno, image_1), hand_vert in zip(chunk, frames, hand_verts):
+                transformed_mesh_shifted = hand_vert @ frame_anno['grab2world_R'] + frame_anno['grab2world_T']
+                color, _ = renderer.render(transformed_mesh_shifted,
+                                           object_pose(frame_anno['base_object_rot'], frame_anno['grab2world_R'],
+                                                       frame_anno['grab2world_T']),
+                                           camera_pose(frame_anno['cam_rot'], frame_anno['cam_transl']), image_1)
+                pending_writes.append(write_pool.submit(write_frame, join(this_repro_dir, frame_name + '.jpg'), color))
+                progress.update()
+
+            # bound the images waiting for the writers
+            while len(pending_writes) > 2 * MANO_CHUNK:
+                pending_writes.pop(0).result()
+
+for future in pending_writes:
+    future.result()
+write_pool.shutdown()
+io_pool.shutdown()
+renderer.delete()
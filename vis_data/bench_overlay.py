@@ -0,0 +1,76 @@
+import argparse
+import time
+from overlay_renderer import OverlayRenderer, camera_pose, object_pose, IMG_WIDTH, IMG_HEIGHT, FX, FY, CX, CY
+import numpy as np
+import pyrender
+import trimesh
+
+# Frames per second of the overlay rendering, with synthetic meshes: a sphere the size of a hand
+# that deforms every frame and a box for the tool, half a metre in front of the camera.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Overlay rendering speed, per-frame scenes against OverlayRenderer')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--scale', type=float, nargs='+', default=[1.0, 0.5])
+    parser.add_argument('--skip_per_frame', action='store_true', help='do not time the per-frame scene rendering')
+    return parser.parse_args()
+
+
+def synthetic_frames(num):
+    rng = np.random.RandomState(0)
+    sphere = trimesh.creation.icosphere(subdivisions=3, radius=0.05)
+    cam_pose = camera_pose(np.eye(3), [0, 0, 0.5])
+    frames = []
+    for i in range(num):
+        hand_verts = sphere.vertices * (1 + 0.05 * rng.randn(len(sphere.vertices), 1)) + [0.05, 0, 0]
+        angle = 0.05 * i
+        rot = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+        frames.append((hand_verts, object_pose(np.eye(3), rot, [-0.05, 0, 0]), cam_pose))
+    background = rng.randint(0, 256, (IMG_HEIGHT, IMG_WIDTH, 3)).astype(np.uint8)
+    return sphere.faces, trimesh.creation.box(extents=[0.1, 0.02, 0.02]), frames, background
+
+
+def per_frame_scene(faces, mesh_object, frames, background):
+    """What the dataset scripts did before: a new scene, camera, lights and renderer for every frame."""
+    material = pyrender.MetallicRoughnessMaterial(metallicFactor=0.0, alphaMode='OPAQUE')
+    start = time.perf_counter()
+    for hand_verts, obj_pose, cam_pose in frames:
+        scene = pyrender.Scene()
+        scene.add(pyrender.Mesh.from_trimesh(trimesh.Trimesh(vertices=hand_verts, faces=faces), material=material))
+        scene.add(pyrender.Mesh.from_trimesh(mesh_object, material=material), pose=obj_pose)
+        scene.add(pyrender.camera.IntrinsicsCamera(FX, FY, CX, CY, znear=0.001, zfar=1000.0), pose=cam_pose)
+        for light in [pyrender.PointLight(color=[1.0, 1.0, 1.0], intensity=2.0),
+                      pyrender.SpotLight(color=[1.0, 1.0, 1.0], intensity=2.0, innerConeAngle=0.05, outerConeAngle=0.5),
+                      pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=2.0)]:
+            scene.add(light, pose=cam_pose)
+        r = pyrender.OffscreenRenderer(IMG_WIDTH, IMG_HEIGHT)
+        color, depth = r.render(scene)
+        valid_mask = (depth > 0)[:, :, None]
+        color = (color[:, :, :3] * valid_mask + (1 - valid_mask) * background)
+        r.delete()
+    return len(frames) / (time.perf_counter() - start)
+
+
+def overlay_renderer(faces, mesh_object, frames, background, scale):
+    with OverlayRenderer(faces, scale=scale) as renderer:
+        renderer.set_object(mesh_object)
+        renderer.render(*frames[0], background)
+        start = time.perf_counter()
+        for hand_verts, obj_pose, cam_pose in frames:
+            renderer.render(hand_verts, obj_pose, cam_pose, background)
+        return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_args()
+    faces, mesh_object, frames, background = synthetic_frames(args.frames)
+    if not args.skip_per_frame:
+        print('per-frame scene and renderer: %.1f fps' % per_frame_scene(faces, mesh_object, frames, background))
+    for scale in args.scale:
+        print('OverlayRenderer, scale %.2f:   %.1f fps' % (scale, overlay_renderer(faces, mesh_object, frames,
+                                                                                  background, scale)))
+
+
+if __name__ == "__main__":
+    main()
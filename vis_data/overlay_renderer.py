@@ -0,0 +1,109 @@
+import os
+# headless by default: EGL (also Mesa's software EGL), set PYOPENGL_PLATFORM=osmesa to use OSMesa instead
+if 'DISPLAY' not in os.environ:
+    os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+import cv2
+import numpy as np
+import pyrender
+import trimesh
+
+# POV-Surgery camera
+IMG_WIDTH, IMG_HEIGHT = 1920, 1080
+FX, FY, CX, CY = 1198.4395, 1198.4395, 960, 175.2
+
+HAND_COLOR = (255 / 255, 153 / 255, 255 / 255, 1.0)
+OBJECT_COLOR = (51 / 255, 255 / 255, 255 / 255, 1.0)
+
+
+def camera_pose(cam_rot, cam_transl):
+    pose = np.eye(4)
+    pose[:3, 3] = cam_transl
+    pose[:3, :3] = cam_rot
+    return pose
+
+
+def object_pose(base_object_rot, grab2world_R, grab2world_T):
+    """Pose of the tool node, the same transform as vertices @ base_object_rot.T @ grab2world_R + grab2world_T."""
+    pose = np.eye(4)
+    pose[:3, :3] = (base_object_rot.T @ grab2world_R).T
+    pose[:3, 3] = np.asarray(grab2world_T).reshape(3)
+    return pose
+
+
+class OverlayRenderer(object):
+    """
+    Renders the hand and tool of POV-Surgery frames over their images.
+
+    The GL context, the scene, the camera and the lights are created once and reused: per frame only
+    the hand vertices are uploaded again and the tool, camera and camera light nodes are moved. The
+    scene is rendered at scale times the image resolution and composited on the CPU, in the same way
+    as the per-frame scenes it replaces (the RGB render is written into the BGR image as is).
+    """
+    def __init__(self, hand_faces, scale=1.0, hand_color=HAND_COLOR, object_color=OBJECT_COLOR,
+                 camera_lights=True, width=IMG_WIDTH, height=IMG_HEIGHT):
+        self.width, self.height = width, height
+        self.render_width, self.render_height = int(round(width * scale)), int(round(height * scale))
+        self.hand_faces = hand_faces
+        self.material_hand = pyrender.MetallicRoughnessMaterial(metallicFactor=0.0, alphaMode='OPAQUE',
+                                                                baseColorFactor=hand_color)
+        self.material_object = pyrender.MetallicRoughnessMaterial(metallicFactor=0.0, alphaMode='OPAQUE',
+                                                                  baseColorFactor=object_color)
+
+        self.scene = pyrender.Scene()
+        camera = pyrender.camera.IntrinsicsCamera(FX * scale, FY * scale, CX * scale, CY * scale,
+                                                  znear=0.001, zfar=1000.0)
+        self.camera_nodes = [self.scene.add(camera)]
+        if camera_lights:
+            self.camera_nodes.append(self.scene.add(pyrender.PointLight(color=[1.0, 1.0, 1.0], intensity=2.0)))
+            self.camera_nodes.append(self.scene.add(pyrender.SpotLight(color=[1.0, 1.0, 1.0], intensity=2.0,
+                                                                       innerConeAngle=0.05, outerConeAngle=0.5)))
+            self.camera_nodes.append(self.scene.add(pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=2.0)))
+        light = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=2)
+        for position in [[0, -1, 1], [0, 1, 1], [1, 1, 2]]:
+            light_pose = np.eye(4)
+            light_pose[:3, 3] = position
+            self.scene.add(light, pose=light_pose)
+
+        self.hand_node = None
+        self.object_node = None
+        self.renderer = pyrender.OffscreenRenderer(self.render_width, self.render_height)
+
+    def set_object(self, mesh_object):
+        """Tool mesh in its canonical frame (offset and scaled), uploaded once and then only moved."""
+        if self.object_node is not None:
+            self.scene.remove_node(self.object_node)
+        self.object_node = self.scene.add(pyrender.Mesh.from_trimesh(mesh_object, material=self.material_object))
+
+    def render(self, hand_verts, obj_pose, cam_pose, background=None):
+        """
+        Returns the composited image (uint8, HxWx3) and the mask of the rendered pixels, both at the image
+        resolution. Without background the render is returned over black.
+        """
+        if self.hand_node is not None:
+            self.scene.remove_node(self.hand_node)
+        mesh_hand = trimesh.Trimesh(vertices=hand_verts, faces=self.hand_faces)
+        self.hand_node = self.scene.add(pyrender.Mesh.from_trimesh(mesh_hand, material=self.material_hand))
+        if self.object_node is not None:
+            self.scene.set_pose(self.object_node, obj_pose)
+        for node in self.camera_nodes:
+            self.scene.set_pose(node, cam_pose)
+
+        color, depth = self.renderer.render(self.scene)
+        valid_mask = depth > 0
+        if (self.render_width, self.render_height) != (self.width, self.height):
+            color = cv2.resize(color, (self.width, self.height), interpolation=cv2.INTER_LINEAR)
+            valid_mask = cv2.resize(valid_mask.astype(np.uint8), (self.width, self.height),
+                                    interpolation=cv2.INTER_NEAREST).astype(bool)
+        out = np.zeros((self.height, self.width, 3), dtype=np.uint8) if background is None else background.copy()
+        out[valid_mask] = color[valid_mask, :3]
+        return out, valid_mask
+
+    def delete(self):
+        self.renderer.delete()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.delete()
+
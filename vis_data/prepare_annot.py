@@ -1,17 +1,22 @@
-import pyrender
+from overlay_renderer import OverlayRenderer, camera_pose, object_pose
 import numpy as np
 import torch
 import cv2
 from os.path import join, dirname
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 import scipy.io as sio
 import trimesh
 import sys
-import os.path as os
+import os
+import os.path as osp
 import mano
 from scipy.spatial.transform import Rotation as R
 device = 'cuda'
-batch_size = 1
+batch_size = 64 # frames per hand model forward
+WRITE_PKL = True # also write the per-frame annotation pickles next to the per-sequence npz
+OVERLAY_EVERY = 10 # render the overlay of every n-th frame
+IO_THREADS = 8
 
 
 
@@ -29,17 +34,8 @@ import pandas
 import numpy as np
 import pickle
 
-material_hand = pyrender.MetallicRoughnessMaterial(
-    metallicFactor=0.0,
-    alphaMode='OPAQUE',
-    baseColorFactor=(255 / 255, 153 / 255, 255/255 ,1.0)  # pink, interactee
-)
-
-material_object = pyrender.MetallicRoughnessMaterial(
-    metallicFactor=0.0,
-    alphaMode='OPAQUE',
-    baseColorFactor=(255/255, 204/255, 153/255, 1.0)  # blue, camera_wearer
-)
+# one GL context and scene for all the overlays
+renderer = OverlayRenderer(rh_mano.faces, object_color=(255/255, 204/255, 153/255, 1.0), camera_lights=False)
 
 info_sheet = pandas.read_csv('/media/rui/mac_data/POV_surgery/info_batch_1.csv')
 
@@ -47,12 +43,37 @@ SCALPE_OFFSET = [0.04805371, 0 ,0]
 DISKPLACER_OFFSET = [0, 0.34612157 ,0]
 FRIEM_OFFSET = [0, 0.1145 ,0]
 
+ANNOT_DIR = '/media/rui/mac_data/POV_surgery/temp_test/'
+rot_unique = trimesh.transformations.rotation_matrix(
+    np.radians(90), [1, 0, 0])
+rot_only = rot_unique[:3,:3]
+
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def hand_vertices(mano_params):
+    """Vertices of the hand model for the stacked MANO parameters, in batches of batch_size frames."""
+    num = len(next(iter(mano_params.values())))
+    verts = [np.zeros((0, rh_mano.faces.max() + 1, 3), dtype=np.float32)]
+    with torch.no_grad():
+        for start in range(0, num, batch_size):
+            pb = {key_i: torch.from_numpy(v[start:start + batch_size]).float().to(device)
+                  for key_i, v in mano_params.items()}
+            verts.append(rh_mano(**pb).vertices.cpu().numpy())
+    return np.concatenate(verts)
+
+
+io_pool = ThreadPoolExecutor(IO_THREADS)
+
 for i_seq, rec_name in enumerate(info_sheet['Sequence Name']):
 
     grasp_name, grasp_id = info_sheet['Grasp Sequence'][i_seq].split('/')
     rec_base_dir, this_rec_dir = rec_name.split('/')
     dataset_name = info_sheet['OUT_seq'][i_seq]
-    this_mano_dir = join('/media/rui/mac_data/POV_surgery/temp_test/', dataset_name)
+    this_mano_dir = join(ANNOT_DIR, dataset_name)
     os.makedirs(this_mano_dir,exist_ok=True)
     this_repro_dir = join('/media/rui/mac_data/POV_surgery/temp_test_rep/', dataset_name)
     os.makedirs(this_repro_dir,exist_ok=True)
@@ -74,118 +95,56 @@ for i_seq, rec_name in enumerate(info_sheet['Sequence Name']):
     inmat_this = '/home/rui/projects/sp2_ws/GrabNet/samples_near/'+grasp_name+'/' + grasp_id + '/generate.mat'
     inmat = sio.loadmat(inmat_this)
     this_rot_object_base = inmat['rotmat'][0]
-    for i in tqdm(range(1, len(hand_path))):
-        frame_anno = {}
-
-        rot_unique = trimesh.transformations.rotation_matrix(
-            np.radians(90), [1, 0, 0])
-        rot_only = rot_unique[:3,:3]
-        additional_dict = pickle.load(open(osp.join(ROOT_DIR,'s_additional_RT_pkl',str(i).zfill(5)+'.pkl'),'rb'))
-        # indices = list(range(batch*batch_size, batch*batch_size+curr_batch_size))
-        pb = pickle.load(open(hand_path[i], 'rb'))
-        pc = pb.copy()
-
-        for key_i in pb.keys():
-            pb[key_i] = torch.from_numpy(pb[key_i]).float().to(device)
-
-        this_hand = rh_mano(**pb)
-        hand_vert = this_hand.vertices.detach().cpu().squeeze(0).numpy()
-
-        transformed_mesh_shifted = hand_vert @ additional_dict['R'] @ rot_only.T + additional_dict['T'] @ rot_only.T
-
-        mesh_hand = trimesh.Trimesh(vertices=transformed_mesh_shifted,
-                               faces=rh_mano.faces)
-        mesh_object = trimesh.load(join('/media/rui/mac_data/POV_surgery/tool_mesh', grasp_name.split('_')[0] +'.stl'))
-
-        if 'diskplacer' in grasp_name:
-            mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(DISKPLACER_OFFSET)
-        elif 'friem' in grasp_name:
-            mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(FRIEM_OFFSET)
-        elif 'scalpel' in grasp_name:
-            mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(SCALPE_OFFSET)
-
-        mesh_object.vertices = mesh_object.vertices @ this_rot_object_base.T
-        mesh_object.vertices = mesh_object.vertices @  additional_dict['R'] @ rot_only.T + additional_dict['T'] @ rot_only.T
-
-        this_rot = np.asarray(R.from_euler('xyz',camera_rot[i] / 180 * np.pi,degrees=False).as_matrix())
-        ########
-        frame_anno['mano'] = pc
-        frame_anno['grab2world_R'] = additional_dict['R'] @ rot_only.T
-        frame_anno['grab2world_T'] = additional_dict['T'] @ rot_only.T
-        frame_anno['base_object_rot'] = this_rot_object_base
-        frame_anno['cam_rot'] = this_rot # camera_rot[i]
-        frame_anno['cam_transl'] = camera_transl[i]
-        with open(join(this_mano_dir,str(i).zfill(5)+'.pkl'), 'wb') as f:
-            pickle.dump(frame_anno, f)
-
-
-        ########
-
-
-
-        # mesh_hand.export('/home/rui/Downloads/smpl_sfdsdftest/debug_1000.ply')
-        # mesh_object.vertices = mesh_object.vertices @  additional_dict['R'] + additional_dict['T']
-
-
-
-        # mesh_hand.apply_transform(rot_unique)
-        # mesh_object.apply_transform(rot_unique)
-
-
-        # pred_vertices = pred_vertices - camera_transl[this_i]
-        # pred_vertices = pred_vertices @ camera_rot[this_i]
-        this_transl = camera_transl[i]
-
-        if i%10 == 0:
-            mesh1= pyrender.Mesh.from_trimesh(mesh_hand, material=material_hand)
-            mesh2 = pyrender.Mesh.from_trimesh(mesh_object, material=material_object)
-            scene = pyrender.Scene()
-            scene.add(mesh1)
-            scene.add(mesh2)
-            # more_x = 10
-            # camera = pyrender.PerspectiveCamera(yfov=np.pi / 3.0, aspectRatio=1.0)
-            # camera = pyrender.camera.IntrinsicsCamera(1198.4395, 1198.4395, 1920/2, 175.2000, znear=0.05, zfar=100.0, name=None)
-            # camera = pyrender.camera.IntrinsicsCamera(1198.4395 , 1198.4395, 960, 175.2 , znear=0.001, zfar=1000.0, name=None)
-            camera = pyrender.camera.IntrinsicsCamera(1198.4395 , 1198.4395, 960, 175.2 , znear=0.001, zfar=1000.0, name=None)
-
-            camera_pose = np.eye(4)
-            camera_pose[:3, 3] = this_transl
-            camera_pose[:3, :3] = this_rot
-
-            scene.add(camera, pose=camera_pose)
-            # light = pyrender.SpotLight(color=np.ones(3), intensity=3.0,
-            #                            innerConeAngle=np.pi / 16.0,
-            #                            outerConeAngle=np.pi / 6.0)
-            # scene.add(light, pose=camera_pose)
-
-            light = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=2)
-            light_pose = np.eye(4)
-
-            light_pose[:3, 3] = np.array([0, -1, 1])
-            scene.add(light, pose=light_pose)
-
-            light_pose[:3, 3] = np.array([0, 1, 1])
-            scene.add(light, pose=light_pose)
-
-            light_pose[:3, 3] = np.array([1, 1, 2])
-            scene.add(light, pose=light_pose)
-
-            r = pyrender.OffscreenRenderer(1920, 1080)
-            color, depth = r.render(scene)
-            # color = color.astype(np.float32) / 255.0
-            valid_mask = (depth > 0)[:, :, None]
-            image_1 = cv2.imread('/media/rui/mac_data/POV_surgery/color/'+COLOR_NAME +'/' + str(i).zfill(5) + '.jpg')
-
-            # image_1 = cv2.imread('/home/rui/projects/blender_ws/test_data/data/01/rgb/' + str(i).zfill(5) + '.jpg')
-            color = (color[:, :, :3] * valid_mask + (1 - valid_mask) * image_1)
-            # color = (color[:, :, :3] * valid_mask * 0.5  + image_1[:, :, :3] * valid_mask * 0.5 + (1 - valid_mask) * image_1)
-
-        # rendered_body_overlay_cropped = renderer(verts, camera_translation, img, overlay=True, my_transl =this_transl, my_rot = this_rot)
-        # # rendered_body_overlay_cropped = renderer(verts, np.array([-100000,-10000,-10000]), img, overlay=True)
-            img_fn_cropped = join(this_repro_dir, str(i).zfill(5)+ '.jpg')
-            # os.makedirs(dirname(img_fn_cropped), exist_ok=True)
-            cv2.imwrite(img_fn_cropped, color)
-
-
-
-
+    mesh_object = trimesh.load(join('/media/rui/mac_data/POV_surgery/tool_mesh', grasp_name.split('_')[0] +'.stl'))
+    if 'diskplacer' in grasp_name:
+        mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(DISKPLACER_OFFSET)
+    elif 'friem' in grasp_name:
+        mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(FRIEM_OFFSET)
+    elif 'scalpel' in grasp_name:
+        mesh_object.vertices = mesh_object.vertices * 0.001 - np.array(SCALPE_OFFSET)
+    renderer.set_object(mesh_object)
+
+    # every frame of the sequence at once
+    frames = np.arange(1, len(hand_path))
+    additional = list(io_pool.map(load_pickle, [osp.join(ROOT_DIR, 's_additional_RT_pkl', str(i).zfill(5) + '.pkl')
+                                                for i in frames]))
+    hand_params = list(io_pool.map(load_pickle, [hand_path[i] for i in frames]))
+    mano_params = {key_i: np.concatenate([pb[key_i] for pb in hand_params]) for key_i in hand_params[0].keys()}
+
+    grab2world_R = np.stack([a['R'] for a in additional]) @ rot_only.T
+    grab2world_T = np.stack([a['T'] for a in additional]) @ rot_only.T
+    cam_rot = R.from_euler('xyz', camera_rot[frames] / 180 * np.pi, degrees=False).as_matrix()
+    cam_transl = camera_transl[frames]
+
+    # one columnar file per sequence, row k is frame frames[k]
+    np.savez(join(ANNOT_DIR, dataset_name + '.npz'), frame=frames, grab2world_R=grab2world_R,
+             grab2world_T=grab2world_T, base_object_rot=this_rot_object_base, cam_rot=cam_rot, cam_transl=cam_transl,
+             **{'mano_' + key_i: v for key_i, v in mano_params.items()})
+
+    if WRITE_PKL:
+        for k, i in enumerate(tqdm(frames, desc=dataset_name)):
+            frame_anno = {}
+            frame_anno['mano'] = hand_params[k]
+            frame_anno['grab2world_R'] = grab2world_R[k]
+            frame_anno['grab2world_T'] = grab2world_T[k]
+            frame_anno['base_object_rot'] = this_rot_object_base
+            frame_anno['cam_rot'] = cam_rot[k] # camera_rot[i]
+            frame_anno['cam_transl'] = cam_transl[k]
+            with open(join(this_mano_dir,str(i).zfill(5)+'.pkl'), 'wb') as f:
+                pickle.dump(frame_anno, f)
+
+    # the hand model only runs on the frames with an overlay
+    rendered = np.nonzero(frames % OVERLAY_EVERY == 0)[0]
+    hand_verts = hand_vertices({key_i: v[rendered] for key_i, v in mano_params.items()})
+    for k, hand_vert in zip(rendered, hand_verts):
+        i = frames[k]
+        transformed_mesh_shifted = hand_vert @ grab2world_R[k] + grab2world_T[k]
+        image_1 = cv2.imread('/media/rui/mac_data/POV_surgery/color/'+COLOR_NAME +'/' + str(i).zfill(5) + '.jpg')
+        color, _ = renderer.render(transformed_mesh_shifted,
+                                   object_pose(this_rot_object_base, grab2world_R[k], grab2world_T[k]),
+                                   camera_pose(cam_rot[k], cam_transl[k]), image_1)
+        img_fn_cropped = join(this_repro_dir, str(i).zfill(5)+ '.jpg')
+        cv2.imwrite(img_fn_cropped, color)
+
+io_pool.shutdown()
+renderer.delete()